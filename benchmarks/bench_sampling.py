@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Overhead of the sampling decorator on the calls that are not sampled.'''
+import os
+import sys
+import timeit
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import malloc_tracer
+
+
+def target(num):
+    l = [i for i in range(num)]
+    return len(l)
+
+
+def measure(function, number, repeat=5):
+    return min(timeit.repeat(lambda: function(10), number=number, repeat=repeat)) / number
+
+
+def main():
+    number = 100000
+
+    baseline = measure(target, number)
+    print('{:40s} {:8.1f} ns/call'.format('undecorated', baseline * 1e9))
+
+    for label, kwargs in (
+        ('rate=0.0', dict(rate=0.0)),
+        ('every=1000000', dict(every=1000000)),
+        ('interval=3600', dict(interval=3600.0)),
+    ):
+        sampled = malloc_tracer.sampling(**kwargs)(target)
+        if 'interval' in kwargs:
+            sampled(10)  # The first call is sampled.
+        elapsed = measure(sampled, number)
+        print('{:40s} {:8.1f} ns/call (+{:.1f} ns)'.format(
+            label,
+            elapsed * 1e9,
+            (elapsed - baseline) * 1e9
+        ))
+
+    sampled = malloc_tracer.sampling(every=1)(target)
+    elapsed = measure(sampled, 100, repeat=3)
+    print('{:40s} {:8.1f} us/call'.format('every=1 (all sampled)', elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
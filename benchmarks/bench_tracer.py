@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Overhead of the tracer itself as the target and the snapshot grow.
+
+The targets are generated with a number of lines, a nesting depth and
+a number of objects alive when the snapshot is taken. Each benchmark is
+the best of several rounds, in seconds per operation.
+
+    python bench_tracer.py --json current.json
+    python bench_tracer.py --compare current.json --threshold 1.5
+
+With `--compare`, the exit status is 1 if a benchmark is slower than
+the stored one by more than the threshold.
+'''
+import io
+import os
+import sys
+import json
+import timeit
+import argparse
+import tempfile
+import importlib.util
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import malloc_tracer
+from malloc_tracer.tracer import INSTRUMENTATION_CACHE
+
+
+LINE_COUNTS = (10, 100, 1000)
+DEPTHS = (1, 8)
+OBJECT_COUNTS = (100, 1000, 10000, 100000)
+
+
+def make_source(num_lines, depth):
+    '''Make the source of a target which keeps `num` objects alive.'''
+    lines = ['def target(num):']
+    indent = '    '
+    for level in range(depth - 1):
+        lines.append('{}if num >= {}:'.format(indent, -level - 1))
+        indent += '    '
+    for index in range(max(num_lines - depth - 2, 1)):
+        lines.append('{}v{} = [{}] * 2'.format(indent, index, index))
+    lines.append('{}live = [str(i) for i in range(num)]'.format(indent))
+    lines.append('{}return len(live)'.format(indent))
+    return '\n'.join(lines) + '\n'
+
+
+def make_target(dirpath, num_lines, depth):
+    '''Write the target to a module and import it, so that its source can be found.'''
+    name = 'target_{}_{}'.format(num_lines, depth)
+    path = os.path.join(dirpath, name + '.py')
+    with open(path, 'w') as f:
+        f.write(make_source(num_lines, depth))
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.target
+
+
+def measure(function, repeat=3):
+    '''Return the best time of a call in seconds.'''
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(number=number, repeat=repeat)) / number
+
+
+def construct(function):
+    INSTRUMENTATION_CACHE.clear()
+    return malloc_tracer.Tracer(function)
+
+
+def run_benchmarks(dirpath):
+    '''Run the benchmarks and return the seconds per operation of each.'''
+    timings = dict()
+
+    def record(name, seconds, unit=1e6, label='us'):
+        timings[name] = seconds
+        print('{:48s} {:10.1f} {}'.format(name, seconds * unit, label))
+
+    # Construction: parsing, instrumenting and compiling the target.
+    for num_lines in LINE_COUNTS:
+        for depth in DEPTHS:
+            target = make_target(dirpath, num_lines, depth)
+            record(
+                'construct lines={} depth={}'.format(num_lines, depth),
+                measure(lambda: construct(target))
+            )
+            record(
+                'construct cached lines={} depth={}'.format(num_lines, depth),
+                measure(lambda: malloc_tracer.Tracer(target))
+            )
+
+    # A call: the instrumented call and the snapshot against the original call.
+    target = make_target(dirpath, 10, 1)
+    tracer = malloc_tracer.Tracer(target)
+    probed = malloc_tracer.Tracer(target, enable_line_probe=True)
+    for num in OBJECT_COUNTS:
+        untraced = measure(lambda: target(num))
+        traced = measure(lambda: tracer._call(kwargs=dict(num=num)))
+        record('call untraced objects={}'.format(num), untraced)
+        record('call traced objects={}'.format(num), traced)
+        record(
+            'call probed objects={}'.format(num),
+            measure(lambda: probed._call(kwargs=dict(num=num)))
+        )
+        print('{:48s} {:10.1f} x'.format('overhead objects={}'.format(num), traced / untraced))
+
+    # Grouping: the traces of the snapshot recorded for each line.
+    for num in OBJECT_COUNTS:
+        _, capture = tracer._call(kwargs=dict(num=num))
+        record(
+            'record objects={}'.format(num),
+            measure(lambda: tracer._record(capture))
+        )
+
+    # Report: the result rendered as text.
+    for num_lines in LINE_COUNTS:
+        target = make_target(dirpath, num_lines, 1)
+        result = malloc_tracer.Tracer(target, nframe=5).run(target_args=dict(num=1000))
+        record(
+            'render lines={}'.format(num_lines),
+            measure(lambda: malloc_tracer.render_text(
+                result,
+                related_traces_output_mode=malloc_tracer.RelatedTracesOutputMode.IN_DESCENDING_ORDER,
+                file=io.StringIO()
+            ))
+        )
+
+    return timings
+
+
+def compare(timings, baseline, threshold):
+    '''Print the ratios to the baseline and return the names of the regressions.'''
+    regressions = list()
+    for name, seconds in sorted(timings.items()):
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        regressed = ratio > threshold
+        if regressed:
+            regressions.append(name)
+        print('{:48s} {:6.2f} x{}'.format(name, ratio, '  !' if regressed else ''))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--json', help='Store the timings to this file.')
+    parser.add_argument('--compare', help='Compare the timings with those stored in this file.')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=1.5,
+        help='Ratio to the stored timing above which a benchmark regressed.'
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        timings = run_benchmarks(dirpath)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(timings, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(timings, baseline, args.threshold)
+        if regressions:
+            print('{} benchmarks regressed.'.format(len(regressions)))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
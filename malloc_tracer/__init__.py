@@ -1,3 +1,18 @@
 # -*- coding: utf-8 -*-
 from .version import __version__, VERSION
 from .tracer import *
+from .result import *
+from .report import *
+from .sampling import *
+from .sweep import *
+from .scaling import *
+from .baseline import *
+from .multitracer import *
+from .domains import *
+from .process import *
+from .timeline import *
+from .dump import *
+from .writers import *
+from .stream import *
+from .engine import *
+from .leak import *
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Command line interface.
+
+Analyze a snapshot dumped by :meth:`Tracer.dump`::
+
+    python -m malloc_tracer analyze trace.dump --related in-descending-order
+'''
+import sys
+import argparse
+from .tracer import analyze_dump
+from .report import RelatedTracesOutputMode, render
+
+
+RELATED_TRACES_OUTPUT_MODES = {
+    'none': RelatedTracesOutputMode.NONE,
+    'for-each-file': RelatedTracesOutputMode.FOR_EACH_FILE,
+    'in-descending-order': RelatedTracesOutputMode.IN_DESCENDING_ORDER,
+}
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='python -m malloc_tracer')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    analyze = subparsers.add_parser('analyze', help='Analyze a dumped snapshot.')
+    analyze.add_argument('path', help='Path of the dump.')
+    analyze.add_argument(
+        '--related',
+        choices=sorted(RELATED_TRACES_OUTPUT_MODES),
+        default='none',
+        help='How the traces outside of the target are displayed.'
+    )
+    analyze.add_argument(
+        '--include',
+        action='append',
+        metavar='PATTERN',
+        help='Pattern of file paths to include in the output. Can be repeated.'
+    )
+    analyze.add_argument(
+        '--exclude',
+        action='append',
+        metavar='PATTERN',
+        help='Pattern of file paths to exclude in the output. Can be repeated.'
+    )
+    analyze.add_argument(
+        '--include-domain',
+        action='append',
+        type=int,
+        metavar='DOMAIN',
+        help='tracemalloc domain to include in the output. Can be repeated.'
+    )
+    analyze.add_argument(
+        '--exclude-domain',
+        action='append',
+        type=int,
+        metavar='DOMAIN',
+        help='tracemalloc domain to exclude in the output. Can be repeated.'
+    )
+    analyze.add_argument(
+        '--format',
+        choices=('text', 'markdown', 'html', 'json', 'ndjson', 'csv'),
+        default='text',
+        help='Output format.'
+    )
+    analyze.add_argument(
+        '-o', '--output',
+        default=None,
+        help='Path of the output. The standard output is used if omitted.'
+    )
+
+    return parser
+
+
+def analyze(args, file):
+    result = analyze_dump(
+        args.path,
+        include_patterns=set(args.include) if args.include else None,
+        exclude_patterns=set(args.exclude) if args.exclude else None,
+        include_domains=set(args.include_domain) if args.include_domain else None,
+        exclude_domains=set(args.exclude_domain) if args.exclude_domain else None
+    )
+
+    if args.format in ('text', 'markdown', 'html'):
+        render(
+            result,
+            format=args.format,
+            file=file,
+            related_traces_output_mode=RELATED_TRACES_OUTPUT_MODES[args.related]
+        )
+    elif args.format == 'json':
+        result.to_json(file)
+        file.write('\n')
+    elif args.format == 'ndjson':
+        result.to_ndjson(file)
+    else:
+        result.to_csv(file)
+
+
+def main(argv=None):
+    '''Run the command line interface.
+
+    Returns:
+        int: The exit status.
+    '''
+    args = make_parser().parse_args(argv)
+
+    try:
+        if args.output is None:
+            analyze(args, sys.stdout)
+        else:
+            with open(args.output, 'w', newline='') as f:
+                analyze(args, f)
+    except (OSError, ValueError) as e:
+        print('error: {}'.format(e), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import tempfile
+from collections import namedtuple, OrderedDict
+
+
+__all__ = ['Baseline', 'BaselineDiff', 'LineDiff', 'AllocationRegression']
+
+
+BASELINE_VERSION = 1
+
+# The fields of a target line which are kept in the baseline.
+BASELINE_FIELDS = ('size', 'count', 'peak', 'inclusive')
+
+
+class AllocationRegression(AssertionError):
+    '''Raised when the allocations of a target exceed its baseline.'''
+    def __init__(self, diff):
+        super().__init__(diff.describe())
+        self.diff = diff
+
+
+LineDiff = namedtuple(
+    'LineDiff',
+    ('contents', 'lineno', 'baseline', 'current')
+)
+LineDiff.__doc__ = '''A line compared with the baseline.
+
+`contents` is the stripped source line, and `lineno` is the line number
+in the current trace, or None if the line was removed.
+`baseline` and `current` are the values of the compared field,
+None if the line is not in the baseline or in the current trace.
+'''
+
+
+def make_line_keys(target_lines):
+    '''Key the target lines by their stripped contents and occurrence.
+
+    Identical lines are told apart by their order, so that the keys
+    survive the lines inserted or removed elsewhere in the target.
+
+    Returns:
+        list: (key, line) of the lines, in order.
+    '''
+    occurrences = dict()
+    keys = list()
+    for line in target_lines:
+        contents = line.contents.strip()
+        occurrence = occurrences.get(contents, 0)
+        occurrences[contents] = occurrence + 1
+        keys.append(('{}#{}'.format(contents, occurrence) if occurrence else contents, line))
+
+    return keys
+
+
+class BaselineDiff(object):
+    '''The difference between a trace and its baseline.
+
+    A line regresses if its value grows by more than `abs_threshold` bytes
+    and by more than `rel_threshold` of its baseline.
+    The lines which are not in the baseline are compared with 0.
+
+    Args:
+        name (str): Name of the target in the baseline.
+        field (str): The compared field of :class:`TargetLine`.
+        lines (iterable): :class:`LineDiff`.
+        baseline_total (int): Total of the field in the baseline.
+        current_total (int): Total of the field in the current trace.
+        abs_threshold (int):
+        rel_threshold (float):
+    '''
+    __slots__ = (
+        '_name', '_field', '_lines',
+        '_baseline_total', '_current_total',
+        '_abs_threshold', '_rel_threshold'
+    )
+
+    def __init__(
+        self,
+        name,
+        field,
+        lines,
+        baseline_total,
+        current_total,
+        abs_threshold=0,
+        rel_threshold=0.0
+    ):
+        self._name = name
+        self._field = field
+        self._lines = tuple(lines)
+        self._baseline_total = baseline_total
+        self._current_total = current_total
+        self._abs_threshold = abs_threshold
+        self._rel_threshold = rel_threshold
+
+    def __repr__(self):
+        return '<BaselineDiff {} regressions={}>'.format(self._name, len(self.regressions))
+
+    def __bool__(self):
+        return bool(self.regressions) or self.total_regressed
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def field(self):
+        return self._field
+
+    @property
+    def lines(self):
+        '''tuple: :class:`LineDiff` of the lines in the baseline or in the current trace.'''
+        return self._lines
+
+    @property
+    def baseline_total(self):
+        return self._baseline_total
+
+    @property
+    def current_total(self):
+        return self._current_total
+
+    def _exceeds(self, baseline, current):
+        baseline = baseline or 0
+        current = current or 0
+        growth = current - baseline
+        return growth > self._abs_threshold and growth > self._rel_threshold * abs(baseline)
+
+    @property
+    def regressions(self):
+        '''tuple: :class:`LineDiff` which grew beyond the thresholds.'''
+        return tuple(
+            line for line in self._lines
+            if self._exceeds(line.baseline, line.current)
+        )
+
+    @property
+    def improvements(self):
+        '''tuple: :class:`LineDiff` which shrank beyond the thresholds.'''
+        return tuple(
+            line for line in self._lines
+            if self._exceeds(line.current, line.baseline)
+        )
+
+    @property
+    def total_regressed(self):
+        '''bool: True if the total grew beyond the thresholds.'''
+        return self._exceeds(self._baseline_total, self._current_total)
+
+    def describe(self):
+        '''Describe the regressions in a few lines.'''
+        lines = ['Allocation regression in {} ({}): {} -> {} B'.format(
+            self._name,
+            self._field,
+            self._baseline_total,
+            self._current_total
+        )]
+        for line in self.regressions:
+            lines.append('  line {}: {} -> {} B: {}'.format(
+                line.lineno,
+                line.baseline or 0,
+                line.current or 0,
+                line.contents
+            ))
+
+        return '\n'.join(lines)
+
+    def check(self):
+        '''Raise :class:`AllocationRegression` if the trace regressed.'''
+        if self:
+            raise AllocationRegression(self)
+
+
+class Baseline(object):
+    '''Per-line allocation profiles of targets, stored as JSON.
+
+    The targets are keyed by their qualified name, and the lines by their
+    stripped contents, so that the baseline survives line shifts.
+
+    Args:
+        path (str): Path of the baseline file. It is created by :meth:`save`.
+    '''
+    def __init__(self, path):
+        self._path = path
+        self._entries = OrderedDict()
+        if os.path.exists(path):
+            self._load()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def path(self):
+        return self._path
+
+    def names(self):
+        return list(self._entries)
+
+    def _load(self):
+        with open(self._path, 'r') as f:
+            d = json.load(f)
+
+        version = d.get('version')
+        if version != BASELINE_VERSION:
+            raise ValueError('Unsupported baseline version: {}'.format(version))
+
+        self._entries = OrderedDict(sorted(d['targets'].items()))
+
+    def save(self):
+        '''Write the baseline atomically.'''
+        d = {
+            'version': BASELINE_VERSION,
+            'targets': OrderedDict(sorted(self._entries.items())),
+        }
+
+        dirpath = os.path.dirname(os.path.abspath(self._path))
+        fd, temppath = tempfile.mkstemp(dir=dirpath, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(d, f, indent=2)
+                f.write('\n')
+            os.replace(temppath, self._path)
+        except BaseException:
+            os.remove(temppath)
+            raise
+
+    def update(self, result, name=None):
+        '''Store the result as the baseline of the target.
+
+        Args:
+            result (:class:`TraceResult`):
+            name (str): Name of the target. The qualified name is used if None.
+        '''
+        lines = OrderedDict()
+        for key, line in make_line_keys(result.target_lines):
+            values = {
+                field: getattr(line, field) for field in BASELINE_FIELDS
+                if getattr(line, field) is not None
+            }
+            if values:
+                lines[key] = values
+
+        self._entries[name or result.qualname] = {
+            'qualname': result.qualname,
+            'lines': lines,
+        }
+
+    def remove(self, name):
+        del self._entries[name]
+
+    def diff(self, result, name=None, field='size', abs_threshold=0, rel_threshold=0.0):
+        '''Compare the result with the baseline of the target.
+
+        Args:
+            result (:class:`TraceResult`):
+            name (str): Name of the target. The qualified name is used if None.
+            field (str): One of 'size', 'count', 'peak' and 'inclusive'.
+            abs_threshold (int): Growth which is tolerated, in bytes or blocks.
+            rel_threshold (float): Growth which is tolerated, relative to the baseline.
+
+        Returns:
+            :class:`BaselineDiff`
+        '''
+        name = name or result.qualname
+        if name not in self._entries:
+            raise KeyError('{} is not in the baseline {}.'.format(name, self._path))
+        if field not in BASELINE_FIELDS:
+            raise ValueError('The field must be one of {}.'.format(BASELINE_FIELDS))
+
+        baseline_lines = self._entries[name]['lines']
+
+        lines = list()
+        current_keys = set()
+        for key, line in make_line_keys(result.target_lines):
+            current_keys.add(key)
+            baseline = baseline_lines.get(key, dict()).get(field)
+            current = getattr(line, field)
+            if baseline is not None or current is not None:
+                lines.append(LineDiff(line.contents.strip(), line.lineno, baseline, current))
+
+        for key, values in baseline_lines.items():
+            if key not in current_keys and values.get(field) is not None:
+                lines.append(LineDiff(key, None, values[field], None))
+
+        return BaselineDiff(
+            name=name,
+            field=field,
+            lines=lines,
+            baseline_total=sum(values.get(field) or 0 for values in baseline_lines.values()),
+            current_total=sum(line.current or 0 for line in lines),
+            abs_threshold=abs_threshold,
+            rel_threshold=rel_threshold
+        )
+
+    def check(self, result, name=None, update=False, **kwargs):
+        '''Compare the result with the baseline, or store it if there is none.
+
+        Args:
+            result (:class:`TraceResult`):
+            name (str): Name of the target. The qualified name is used if None.
+            update (bool): Store the result instead of comparing it.
+            **kwargs: Passed to :meth:`diff`.
+
+        Returns:
+            :class:`BaselineDiff`: None if the result was stored.
+
+        Raises:
+            :class:`AllocationRegression`: If the result regressed.
+        '''
+        if update or (name or result.qualname) not in self._entries:
+            self.update(result, name=name)
+            return None
+
+        diff = self.diff(result, name=name, **kwargs)
+        diff.check()
+        return diff
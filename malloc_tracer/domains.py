@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+from tracemalloc import Filter
+try:
+    from tracemalloc import DomainFilter
+except ImportError:  # Python < 3.6
+    DomainFilter = None
+
+
+__all__ = ['PYTHON_DOMAIN', 'NUMPY_DOMAIN', 'register_domain', 'get_domain_name']
+
+
+PYTHON_DOMAIN = 0  #: The domain of the Python memory allocators.
+NUMPY_DOMAIN = 389047  #: The domain of the data buffers of NumPy arrays.
+
+_domain_names = OrderedDict([
+    (PYTHON_DOMAIN, 'Python'),
+    (NUMPY_DOMAIN, 'NumPy'),
+])
+_lock = threading.Lock()
+
+
+def register_domain(domain, name):
+    '''Name the tracemalloc domain of a library.
+
+    Libraries report their own buffers to tracemalloc under a domain,
+    and the traces of each domain are reported in their own column.
+
+    Args:
+        domain (int): The domain passed to `PyTraceMalloc_Track`.
+        name (str): Name of the column.
+    '''
+    with _lock:
+        _domain_names[domain] = name
+
+
+def get_domain_name(domain):
+    '''Return the name of the domain.'''
+    name = _domain_names.get(domain)
+    if name is None:
+        return 'Domain {}'.format(domain)
+    return name
+
+
+def get_domain_order(name):
+    '''Return the sort key of the domain name, the registered domains first.'''
+    names = list(_domain_names.values())
+    if name in names:
+        return names.index(name), name
+    return len(names), name
+
+
+def make_domain_filters(include_domains=None, exclude_domains=None):
+    '''Make the filters for `tracemalloc.Snapshot.filter_traces`.
+
+    The inclusive filters of a single `filter_traces` are or-ed together,
+    so these filters must not be mixed with the other inclusive filters.
+    '''
+    if DomainFilter is None:
+        # Every trace is in the Python domain.
+        if (include_domains and PYTHON_DOMAIN not in include_domains)\
+                or (exclude_domains and PYTHON_DOMAIN in exclude_domains):
+            return [Filter(False, '*')]
+        return []
+
+    filters = list()
+    if include_domains:
+        filters.extend(DomainFilter(True, domain) for domain in sorted(include_domains))
+    if exclude_domains:
+        filters.extend(DomainFilter(False, domain) for domain in sorted(exclude_domains))
+
+    return filters
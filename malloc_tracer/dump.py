@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''The file format of the snapshots dumped for offline analysis.
+
+A dump is a sequence of pickles: a header which describes the target and
+the call, the raw traces of the snapshot in chunks, and None at the end.
+Unlike `tracemalloc.Snapshot.dump`, which pickles the snapshot as a whole,
+the chunks are loaded one by one, so a dump can be analyzed with a bounded
+amount of memory.
+'''
+import os
+import sys
+import pickle
+import tempfile
+from tracemalloc import Snapshot
+
+
+__all__ = ['SnapshotDump']
+
+
+DUMP_VERSION = 1
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def get_raw_traces(snapshot):
+    '''Return the traces of the snapshot in the format `tracemalloc.Snapshot` is made of.'''
+    return snapshot.traces._traces
+
+
+def write_dump(path, snapshot, header, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Write the snapshot and its header atomically.
+
+    Args:
+        path (str):
+        snapshot (tracemalloc.Snapshot):
+        header (dict): Builtin types which describe the target and the call.
+        chunk_size (int): Number of traces in a chunk.
+    '''
+    if chunk_size < 1:
+        raise ValueError('The chunk size must be positive.')
+
+    traces = get_raw_traces(snapshot)
+    header = dict(
+        header,
+        version=DUMP_VERSION,
+        python=tuple(sys.version_info[:2]),
+        traceback_limit=snapshot.traceback_limit,
+        num_traces=len(traces)
+    )
+
+    dirpath = os.path.dirname(os.path.abspath(path))
+    fd, temppath = tempfile.mkstemp(dir=dirpath, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            for index in range(0, len(traces), chunk_size):
+                pickle.dump(traces[index:index + chunk_size], f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(None, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temppath, path)
+    except BaseException:
+        os.remove(temppath)
+        raise
+
+
+class SnapshotDump(object):
+    '''A snapshot dumped by :meth:`Tracer.dump`.
+
+    Only the header is read when the dump is opened.
+
+    Args:
+        path (str):
+
+    Raises:
+        ValueError: If the dump was written by another version of the format
+            or of Python, whose traces differ.
+    '''
+    def __init__(self, path):
+        self._path = path
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+
+        if header.get('version') != DUMP_VERSION:
+            raise ValueError('Unsupported dump version: {}'.format(header.get('version')))
+        python = tuple(header['python'])
+        if python != tuple(sys.version_info[:2]):
+            raise ValueError('The dump was written by Python {}.{}.'.format(*python))
+
+        self._header = header
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def header(self):
+        '''dict: The header of the dump.'''
+        return self._header
+
+    @property
+    def traceback_limit(self):
+        return self._header['traceback_limit']
+
+    @property
+    def num_traces(self):
+        return self._header['num_traces']
+
+    def iter_snapshots(self):
+        '''Iterate the chunks of the snapshot.
+
+        Yields:
+            tracemalloc.Snapshot: A part of the traces of the snapshot.
+        '''
+        with open(self._path, 'rb') as f:
+            pickle.load(f)
+            while True:
+                traces = pickle.load(f)
+                if traces is None:
+                    return
+                yield Snapshot(traces, self.traceback_limit)
+
+    def load_snapshot(self):
+        '''Load the whole snapshot.
+
+        Returns:
+            tracemalloc.Snapshot
+        '''
+        traces = list()
+        for snapshot in self.iter_snapshots():
+            traces.extend(get_raw_traces(snapshot))
+        return Snapshot(tuple(traces), self.traceback_limit)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''An engine which traces the original code of the target.
+
+:class:`Tracer` rewrites the source of the target and compiles it again.
+:class:`HookTracer` calls the target as is, and hooks the events of its
+code object to probe its lines: `sys.monitoring` (PEP 669) on Python 3.12+
+and `sys.settrace` before. The source is only read to be displayed.
+'''
+import sys
+import dis
+import inspect
+import functools
+import threading
+from types import CodeType
+from .tracer import Tracer, HOOK_FILENAMES, iscoroutinefunction, isasyncgenfunction
+
+
+__all__ = ['HookTracer']
+
+
+MONITORING = getattr(sys, 'monitoring', None)  # Python 3.12+
+
+
+def find_code_lines(code):
+    '''Return the first and the last line numbers of the code, nested code included.'''
+    linenos = [code.co_firstlineno]
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        linenos.extend(lineno for _, lineno in dis.findlinestarts(code) if lineno is not None)
+        codes.extend(const for const in code.co_consts if isinstance(const, CodeType))
+
+    return min(linenos), max(linenos)
+
+
+class CodeHooks(object):
+    '''The hooks of the code of the target, for a single call.
+
+    The first call of the code in the thread is traced. Like the hooks of
+    an instrumented target, tracemalloc is started when the code is entered,
+    and the snapshot is taken when it is exited, while its locals are alive.
+
+    Args:
+        code: The code object of the target.
+        call: The hooks of the call, :class:`TracedCall` or :class:`UntracedCall`.
+        probe: The line probe of the call.
+        lineno_offset (int): Subtracted from the line numbers of the code.
+        probe_lines (bool): Hook the lines of the code.
+    '''
+    def __init__(self, code, call, probe, lineno_offset=0, probe_lines=True):
+        self._code = code
+        self._call = call
+        self._probe = probe
+        self._lineno_offset = lineno_offset
+        self._probe_lines = probe_lines
+        self.entered = False
+        self.exited = False
+
+    def close(self):
+        '''Exit the code if it was entered and the exit was not seen.'''
+        if self.entered and not self.exited:
+            self._exit()
+
+    def _enter(self):
+        self._call.start()
+        self.entered = True
+
+    def _exit(self):
+        self.exited = True
+        try:
+            self._probe.end()
+            self._call.take_snapshot()
+        finally:
+            self._call.stop()
+
+
+class SettraceHooks(CodeHooks):
+    '''Hook the code with `sys.settrace`.
+
+    Every call made in the thread is reported to the global trace function,
+    which only traces the first call of the code. A trace function set by
+    a debugger or a coverage tool is suspended meanwhile.
+    '''
+    def install(self):
+        self._previous = sys.gettrace()
+        sys.settrace(self._trace_call)
+
+    def uninstall(self):
+        sys.settrace(self._previous)
+
+    def _trace_call(self, frame, event, arg):
+        if frame.f_code is self._code and not self.entered:
+            if not self._probe_lines and hasattr(frame, 'f_trace_lines'):  # Python 3.7+
+                frame.f_trace_lines = False
+            self._enter()
+            return self._trace_line
+        return None
+
+    def _trace_line(self, frame, event, arg):
+        if event == 'line':
+            self._probe.mark(frame.f_lineno - self._lineno_offset)
+        elif event == 'return':
+            self._exit()
+        return self._trace_line
+
+
+class MonitoringHooks(CodeHooks):
+    '''Hook the code with `sys.monitoring` (PEP 669).
+
+    The events are enabled for the code of the target alone, so the rest of
+    the program runs at full speed. The events are global to the process:
+    those of the other threads are ignored, and so are the lines of the
+    recursive calls of the code.
+    '''
+    def install(self):
+        self._tool_id = acquire_tool_id()
+        self._thread_id = threading.get_ident()
+        self._depth = 0
+
+        events = MONITORING.events
+        local_events = events.PY_START | events.PY_RETURN
+        MONITORING.register_callback(self._tool_id, events.PY_START, self._on_start)
+        MONITORING.register_callback(self._tool_id, events.PY_RETURN, self._on_return)
+        MONITORING.register_callback(self._tool_id, events.PY_UNWIND, self._on_unwind)
+        if self._probe_lines:
+            MONITORING.register_callback(self._tool_id, events.LINE, self._on_line)
+            local_events |= events.LINE
+        MONITORING.set_local_events(self._tool_id, self._code, local_events)
+        # An exception which leaves a function is not a local event.
+        MONITORING.set_events(self._tool_id, events.PY_UNWIND)
+
+    def uninstall(self):
+        events = MONITORING.events
+        MONITORING.set_events(self._tool_id, events.NO_EVENTS)
+        MONITORING.set_local_events(self._tool_id, self._code, events.NO_EVENTS)
+        for event in (events.PY_START, events.PY_RETURN, events.PY_UNWIND, events.LINE):
+            MONITORING.register_callback(self._tool_id, event, None)
+        MONITORING.free_tool_id(self._tool_id)
+
+    def _on_start(self, code, instruction_offset):
+        if self.exited or threading.get_ident() != self._thread_id:
+            return
+        if self._depth == 0:
+            self._enter()
+        self._depth += 1
+
+    def _on_return(self, code, instruction_offset, retval):
+        if self._depth == 0 or self.exited or threading.get_ident() != self._thread_id:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self._exit()
+
+    def _on_unwind(self, code, instruction_offset, exception):
+        if code is self._code:
+            self._on_return(code, instruction_offset, None)
+
+    def _on_line(self, code, line_number):
+        if self._depth == 1 and not self.exited and threading.get_ident() == self._thread_id:
+            self._probe.mark(line_number - self._lineno_offset)
+
+
+def acquire_tool_id():
+    '''Acquire a free tool identifier of `sys.monitoring`.'''
+    for tool_id in range(MONITORING.PROFILER_ID, 6):
+        try:
+            MONITORING.use_tool_id(tool_id, 'malloc_tracer')
+        except ValueError:
+            continue
+        return tool_id
+
+    raise RuntimeError('No tool identifier of sys.monitoring is free.')
+
+
+Hooks = SettraceHooks if MONITORING is None else MonitoringHooks
+
+HOOK_FILENAMES.add(SettraceHooks.install.__code__.co_filename)
+
+
+class HookTracer(Tracer):
+    '''Tracing malloc that occurs inside a function or method, without rewriting it.
+
+    The target is called as is, with its globals, closures, decorators and
+    default arguments, and nothing is compiled, so it costs little to set up
+    and its source is not required, as in zipapps or deployments of .pyc
+    files only. The source, if found, is only displayed.
+    The entry and the exit of the code are hooked to start tracemalloc and
+    to take the snapshot, and its lines to probe them, with `sys.monitoring`
+    or `sys.settrace` (see :class:`MonitoringHooks` and :class:`SettraceHooks`).
+
+    The report is that of :class:`Tracer`, except that the header of
+    a loop is hit at every iteration, and that the allocations of the code
+    of the target are its own even if they are made by other calls of the
+    same function, such as those of other threads at the same time.
+    Generator functions and coroutine functions are not supported.
+
+    Args:
+        function_or_method: A function or a method. A decorated function is
+            called with its decorators, and its innermost function is traced.
+        enable_auto_resolve (bool): Ignored, the target runs with its own globals.
+        setup (str): Ignored, the target runs with its own globals.
+        enable_line_probe (bool): Record the peak and the net delta of
+            the traced memory around every line.
+        strip_decorators (bool): Call the innermost function, without its decorators.
+        nframe (int): Number of frames of the tracebacks.
+        enable_line_timer (bool): Record the elapsed time of every line.
+        enable_native_probe (bool): Record the net change of the memory of
+            the process around every line.
+        native_metric (str): 'rss' or 'uss'. See :func:`get_memory_reader`.
+
+    The arguments are those of :class:`Tracer`, so either can be passed
+    as `tracer_class` to :func:`trace`, :func:`sweep` and :class:`Sampler`.
+    '''
+    def _load(self, function_or_method, setup='pass', strip_decorators=False):
+        '''Load the original code of the target, and its source if found.'''
+        target = inspect.unwrap(function_or_method)
+        function = getattr(target, '__func__', target)
+        if not inspect.isfunction(function):
+            raise TypeError('The innermost function must be a Python function.')
+        if inspect.isgeneratorfunction(function) or iscoroutinefunction(function)\
+                or isasyncgenfunction(function):
+            raise TypeError('Generator functions and coroutine functions are not supported.')
+
+        code = function.__code__
+        first, last = find_code_lines(code)
+        try:
+            source_lines, lineno = inspect.getsourcelines(function)
+            first, last = lineno, lineno + len(source_lines) - 1
+        except (OSError, TypeError):
+            source_lines = ()
+
+        if strip_decorators and self._class_instance is not None:
+            self._function_or_method = function.__get__(self._class_instance)
+        elif strip_decorators:
+            self._function_or_method = function
+        else:
+            self._function_or_method = function_or_method
+
+        self._code = code
+        self._namespace = function.__globals__
+        self._source_lines = tuple(source_lines)
+        self._lineno = first
+        self._filepath = code.co_filename
+        self._code_filename = code.co_filename
+        self._code_lines = (first, last)
+
+    def _bind(self, setup='pass', timed=False, sampler=None, untraced=False):
+        '''Return the target with the hooks of a new call.
+
+        The code of the target is hooked only while the returned function runs,
+        and only its first call is traced.
+
+        Args:
+            setup (str): Ignored, the target runs with its own globals.
+            timed (bool): Time every line instead of tracing the call.
+            sampler (:class:`TimelineSampler`):
+            untraced (bool): Neither trace nor time the call, because
+                the caller traces it.
+
+        Returns:
+            tuple: The function, the hooks and the line probe of the call.
+        '''
+        call, probe = self._make_call(timed=timed, sampler=sampler, untraced=untraced)
+        if untraced:
+            return self._function_or_method, call, probe
+
+        hooks = Hooks(
+            self._code,
+            call,
+            probe,
+            lineno_offset=self._lineno - 1,
+            probe_lines=timed or (self._enable_line_probe and sampler is None)
+        )
+        origin = self._function_or_method
+
+        @functools.wraps(origin)
+        def function(*args, **kwargs):
+            hooks.install()
+            try:
+                ret = origin(*args, **kwargs)
+            finally:
+                hooks.uninstall()
+                hooks.close()
+
+            if not hooks.entered:
+                raise RuntimeError('The call did not run the code of the target.')
+            return ret
+
+        return function, call, probe
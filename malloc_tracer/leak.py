@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import gc
+from collections import namedtuple
+from tracemalloc import take_snapshot, Filter
+from .tracer import (
+    SESSION, TraceRecorder, record_snapshot, make_result, subtract_traces, exhaust
+)
+from .result import TraceResult
+from .scaling import Complexity, fit_growth
+
+
+__all__ = ['LeakLine', 'LeakResult', 'find_leaks']
+
+
+# The snapshots of the calls are allocated by tracemalloc while it traces.
+TRACEMALLOC_FILENAME = take_snapshot.__code__.co_filename
+
+
+LeakLine = namedtuple(
+    'LeakLine',
+    ('filepath', 'lineno', 'contents', 'values', 'complexity', 'per_call')
+)
+LeakLine.__doc__ = '''The memory retained by a line over the calls of the target.
+
+`values` has an element for each call, the size retained by the line
+after the call, or None. `complexity` is the growth of the retained size
+over the calls after the warmup, and `per_call` is the memory retained by
+each call: the slope of a linear growth, or the mean growth otherwise.
+A line which caches its memory once is constant, and retains 0 per call.
+'''
+
+
+def fit_leak(numbers, values, tolerance=0.1, min_growth=256):
+    '''Fit the retained sizes to the call numbers.
+
+    Returns:
+        tuple: (complexity, per_call)
+    '''
+    complexity, _, slope = fit_growth(
+        numbers,
+        values,
+        tolerance=tolerance,
+        min_growth=min_growth
+    )
+    if complexity == Complexity.CONSTANT:
+        return complexity, 0.0
+    if complexity == Complexity.LINEAR:
+        return complexity, slope
+
+    ys = [0 if value is None else value for value in values]
+    return complexity, (ys[-1] - ys[0]) / (numbers[-1] - numbers[0])
+
+
+class LeakResult(object):
+    '''The memory retained by a target over repeated calls.
+
+    Args:
+        results (iterable): :class:`TraceResult` of the memory retained
+            since the first call, after each call.
+        warmup (int): Number of the first calls which are not fitted,
+            which pay for the caches and the pools allocated once.
+        tolerance (float): See :func:`fit_growth`.
+        min_growth (int): See :func:`fit_growth`.
+    '''
+    __slots__ = ('_results', '_warmup', '_lines', '_related', '_total')
+
+    def __init__(self, results, warmup=1, tolerance=0.1, min_growth=256):
+        self._results = tuple(results)
+        self._warmup = warmup
+        if len(self._results) - warmup < 3:
+            raise ValueError('At least 3 calls are required after the warmup.')
+
+        self._lines, self._related, self._total = self._fit(tolerance, min_growth)
+
+    def __repr__(self):
+        return '<LeakResult {} calls={} per_call={:.0f}>'.format(
+            self._results[-1].qualname,
+            len(self._results),
+            self.per_call
+        )
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def results(self):
+        return self._results
+
+    @property
+    def warmup(self):
+        return self._warmup
+
+    @property
+    def lines(self):
+        '''tuple: :class:`LeakLine` for each line of the target.'''
+        return self._lines
+
+    @property
+    def related(self):
+        '''tuple: :class:`LeakLine` of the lines outside of the target whose memory grows,
+        in descending order of memory per call.'''
+        return self._related
+
+    @property
+    def complexity(self):
+        ''':class:`Complexity`: The growth of the total retained memory.'''
+        return self._total[0]
+
+    @property
+    def per_call(self):
+        '''float: The total memory retained by each call.'''
+        return self._total[1]
+
+    def leaks(self):
+        '''Return the lines whose memory grows, in descending order of memory per call.
+
+        Returns:
+            tuple: :class:`LeakLine` of the target and of the related lines.
+        '''
+        lines = [line for line in self._lines if line.complexity != Complexity.CONSTANT]
+        return tuple(sorted(lines + list(self._related), key=lambda line: -line.per_call))
+
+    def _fit(self, tolerance, min_growth):
+        results = self._results
+        fitted = results[self._warmup:]
+        numbers = list(range(self._warmup + 1, len(results) + 1))
+
+        lines = list()
+        for index, line in enumerate(results[-1].target_lines):
+            values = tuple(result.target_lines[index].size for result in results)
+            complexity, per_call = fit_leak(
+                numbers,
+                values[self._warmup:],
+                tolerance=tolerance,
+                min_growth=min_growth
+            )
+            lines.append(LeakLine(
+                filepath=results[-1].filepath,
+                lineno=line.lineno,
+                contents=line.contents,
+                values=values,
+                complexity=complexity,
+                per_call=per_call
+            ))
+
+        sizes = [
+            {(trace.filepath, trace.lineno): trace.size for trace in result.related_traces}
+            for result in results
+        ]
+        keys = set()
+        for related_sizes in sizes[self._warmup:]:
+            keys.update(related_sizes)
+
+        related = list()
+        for filepath, lineno in sorted(keys):
+            values = tuple(related_sizes.get((filepath, lineno)) for related_sizes in sizes)
+            complexity, per_call = fit_leak(
+                numbers,
+                values[self._warmup:],
+                tolerance=tolerance,
+                min_growth=min_growth
+            )
+            if complexity != Complexity.CONSTANT:
+                related.append(LeakLine(
+                    filepath=filepath,
+                    lineno=lineno,
+                    contents='',
+                    values=values,
+                    complexity=complexity,
+                    per_call=per_call
+                ))
+        related.sort(key=lambda line: -line.per_call)
+
+        total = fit_leak(
+            numbers,
+            [result.total_size for result in fitted],
+            tolerance=tolerance,
+            min_growth=min_growth
+        )
+        return tuple(lines), tuple(related), total
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'warmup': self._warmup,
+            'results': [result.to_dict() for result in self._results],
+        }
+
+    @classmethod
+    def from_dict(cls, d, **kwargs):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            results=[TraceResult.from_dict(result) for result in d['results']],
+            warmup=d['warmup'],
+            **kwargs
+        )
+
+
+def find_leaks(
+    tracer,
+    target_args=None,
+    setup='pass',
+    iterations=10,
+    warmup=1,
+    keep_results=False,
+    collect=True,
+    include_patterns=None,
+    exclude_patterns=None,
+    tolerance=0.1,
+    min_growth=256
+):
+    '''Call the target repeatedly and find the lines whose memory grows with the calls.
+
+    A single trace cannot tell the memory which is cached once from the
+    memory which is retained by every call. The calls run in a single
+    tracing session, and a snapshot is taken after each of them. The memory
+    retained by each line since the first call is fitted to the number of
+    calls: a line which leaks grows linearly, by the memory it retains per call.
+
+    Args:
+        tracer (:class:`Tracer`): The tracer of the target, or a :class:`HookTracer`.
+            Its tracebacks should have several frames (`nframe`) to trace the
+            memory retained by the callees of the target.
+        target_args (dict):
+        setup (str): Run-time dependencies.
+            This parameter is ignored if enable_auto_resolve is enabled.
+        iterations (int): Number of calls, including the warmup.
+        warmup (int): Number of the first calls which are not fitted.
+        keep_results (bool): Keep the return values until the last call,
+            as a caller which stores them does. Otherwise only the memory
+            retained by the target itself is found.
+        collect (bool): Collect the garbage before each snapshot, so that
+            the reference cycles which are not leaked yet are freed.
+        include_patterns (set): Specify patterns of file paths to include in the output.
+        exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+        tolerance (float): See :func:`fit_growth`.
+        min_growth (int): See :func:`fit_growth`.
+
+    Returns:
+        :class:`LeakResult`
+
+    Raises:
+        TypeError: If the target is a coroutine function.
+        ValueError: If less than 3 calls are fitted.
+    '''
+    if tracer.is_coroutine_function:
+        raise TypeError('Coroutine functions are not supported.')
+    if warmup < 0 or iterations - warmup < 3:
+        raise ValueError('At least 3 calls are required after the warmup.')
+
+    function, _, _ = tracer._bind(setup=setup, untraced=True)
+    kwargs = dict() if target_args is None else target_args
+    # The lists are allocated before tracing, so that they do not grow with the calls.
+    snapshots = [None] * iterations
+    kept = [None] * iterations if keep_results else None
+
+    baseline = None
+    ticket = SESSION.acquire(tracer._nframe)
+    try:
+        if ticket[1]:
+            # Memory is already traced, by the application or by an outer call.
+            baseline = take_snapshot()
+        for index in range(iterations):
+            ret = function(**kwargs)
+            if tracer.is_generator_function:
+                ret = exhaust(ret)
+            if kept is not None:
+                kept[index] = ret
+            ret = None
+            if collect:
+                gc.collect()
+            snapshots[index] = take_snapshot()
+        shared = SESSION.is_shared(ticket)
+    finally:
+        SESSION.release()
+    kept = None
+
+    metadata = tracer.metadata
+    results = list()
+    for index, snapshot in enumerate(snapshots):
+        if baseline is not None:
+            snapshot = subtract_traces(snapshot, baseline)
+        snapshot = snapshot.filter_traces([Filter(False, TRACEMALLOC_FILENAME)])
+        snapshots[index] = None
+
+        recorder = TraceRecorder()
+        total_size, total_count = record_snapshot(
+            recorder,
+            snapshot,
+            metadata.code_filename,
+            shared=shared,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            code_lines=metadata.code_lines
+        )
+        results.append(make_result(recorder, metadata, None, total_size, total_count))
+
+    return LeakResult(results, warmup=warmup, tolerance=tolerance, min_growth=min_growth)
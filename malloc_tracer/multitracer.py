@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import ast
+import bisect
+import inspect
+import textwrap
+from collections import namedtuple, OrderedDict
+from .tracer import (
+    CodeBlockCollector, TraceRecorder, TracedCall, SESSION,
+    iter_frames_most_recent_first, make_filters
+)
+from .result import TraceResult, TargetLine, RelatedTrace
+
+
+__all__ = ['MultiTracer', 'MultiTraceResult', 'FunctionTotal']
+
+
+FunctionTotal = namedtuple(
+    'FunctionTotal',
+    ('qualname', 'size', 'count', 'inclusive_size', 'inclusive_count')
+)
+FunctionTotal.__doc__ = '''The totals of a function or method.
+
+`size` and `count` are allocated by the lines of the function itself,
+and the inclusive ones also by the functions it calls.
+'''
+
+
+def get_filename(obj):
+    '''Return the file name of the code of the class or module.
+
+    It is the file name of the tracebacks, which may differ from the path
+    of the source file.
+    '''
+    module_name = obj.__name__ if inspect.ismodule(obj) else obj.__module__
+    for value in vars(obj).values():
+        function = getattr(value, '__func__', value)
+        if inspect.isfunction(function) and function.__module__ == module_name:
+            return function.__code__.co_filename
+
+    return inspect.getfile(obj)
+
+
+def collect_code_blocks(obj):
+    '''Collect the functions and methods of the class or module.
+
+    Returns:
+        OrderedDict: (first lineno, last lineno) for each qualified name.
+    '''
+    source_lines, lineno = inspect.getsourcelines(obj)
+    source = textwrap.dedent(''.join(source_lines))
+    node = ast.parse(source)
+
+    collector = CodeBlockCollector(source)
+    collector.visit(node)
+
+    offset = max(lineno, 1) - 1
+    prefix = getattr(obj, '__qualname__', None)
+    code_blocks = OrderedDict()
+    for name, (first, last) in collector.code_blocks.items():
+        if prefix is not None:
+            # The class is the first name of the collected names.
+            name = '.'.join([prefix] + name.split('.')[1:])
+        code_blocks[name] = (first + offset, last + offset)
+
+    return code_blocks
+
+
+class MultiTraceResult(object):
+    '''The results of all the functions or methods traced in one pass.
+
+    Args:
+        results (iterable): :class:`TraceResult` of each function or method.
+        totals (iterable): :class:`FunctionTotal` of each function or method.
+        related_traces (iterable): :class:`RelatedTrace` outside of the functions.
+        total_size (int): Total size of all the traces.
+        total_count (int): Total number of memory blocks of all the traces.
+    '''
+    __slots__ = ('_results', '_totals', '_related_traces', '_total_size', '_total_count')
+
+    def __init__(self, results, totals, related_traces, total_size, total_count):
+        self._results = OrderedDict((result.qualname, result) for result in results)
+        self._totals = tuple(FunctionTotal(*total) for total in totals)
+        self._related_traces = tuple(RelatedTrace(*trace) for trace in related_traces)
+        self._total_size = total_size
+        self._total_count = total_count
+
+    def __len__(self):
+        return len(self._results)
+
+    def __getitem__(self, qualname):
+        return self._results[qualname]
+
+    def __iter__(self):
+        return iter(self._results.values())
+
+    @property
+    def qualnames(self):
+        return tuple(self._results)
+
+    @property
+    def totals(self):
+        '''tuple: :class:`FunctionTotal` in descending order of inclusive size.'''
+        return self._totals
+
+    @property
+    def related_traces(self):
+        return self._related_traces
+
+    @property
+    def total_size(self):
+        return self._total_size
+
+    @property
+    def total_count(self):
+        return self._total_count
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'results': [result.to_dict() for result in self._results.values()],
+            'totals': [total._asdict() for total in self._totals],
+            'related_traces': [trace._asdict() for trace in self._related_traces],
+            'total_size': self._total_size,
+            'total_count': self._total_count,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            results=[TraceResult.from_dict(result) for result in d['results']],
+            totals=[FunctionTotal(**total) for total in d['totals']],
+            related_traces=[RelatedTrace(**trace) for trace in d['related_traces']],
+            total_size=d['total_size'],
+            total_count=d['total_count']
+        )
+
+
+class MultiTracer(object):
+    '''Tracing malloc that occurs inside every function of a module,
+    or every method of a class, while a workload runs.
+
+    The functions are not instrumented. The traces are attributed to the
+    functions by the line ranges of their source, and a single snapshot is
+    taken at the end of the workload.
+    The memory allocated by a function itself is recorded per line, and
+    with `nframe` greater than 1, the memory allocated under each line,
+    including the callees, is also recorded.
+
+    Args:
+        class_or_module: A class or a module.
+        nframe (int): Number of frames of the tracebacks.
+    '''
+    def __init__(self, class_or_module, nframe=10):
+        if not (inspect.isclass(class_or_module) or inspect.ismodule(class_or_module)):
+            raise TypeError('The obj must be a class or a module.')
+
+        self._filepath = inspect.getsourcefile(class_or_module) or inspect.getfile(class_or_module)
+        self._code_filename = get_filename(class_or_module)
+        self._code_blocks = collect_code_blocks(class_or_module)
+        self._source_lines = [
+            line.rstrip('\n')
+            for line in inspect.getsourcelines(inspect.getmodule(class_or_module))[0]
+        ]
+        self._nframe = nframe
+        self._snapshot = None
+        self._call = None
+
+        blocks = sorted(
+            (first, last, name) for name, (first, last) in self._code_blocks.items()
+        )
+        self._starts = [block[0] for block in blocks]
+        self._blocks = blocks
+
+    @property
+    def qualnames(self):
+        return tuple(self._code_blocks)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Start tracing the workload.'''
+        if self._call is not None:
+            raise RuntimeError('The tracer has already been started.')
+
+        self._snapshot = None
+        self._call = TracedCall(SESSION, nframe=self._nframe)
+        self._call.start()
+
+    def stop(self):
+        '''Take the snapshot and stop tracing the workload.'''
+        if self._call is None:
+            raise RuntimeError('The tracer has not been started.')
+
+        call, self._call = self._call, None
+        try:
+            self._snapshot = call.take_snapshot()
+        finally:
+            call.stop()
+
+    def run(self, workload, *args, include_patterns=None, exclude_patterns=None, **kwargs):
+        '''Trace the workload and return the result.
+
+        Args:
+            workload (callable): Called with `args` and `kwargs`.
+            include_patterns (set): Specify patterns of file paths to include in the output.
+            exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+
+        Returns:
+            :class:`MultiTraceResult`
+        '''
+        with self:
+            workload(*args, **kwargs)
+
+        return self.result(include_patterns=include_patterns, exclude_patterns=exclude_patterns)
+
+    def _find_block(self, filename, lineno):
+        '''Return the qualified name of the function at the line, or None.'''
+        if filename != self._code_filename:
+            return None
+
+        index = bisect.bisect_right(self._starts, lineno) - 1
+        if index < 0:
+            return None
+
+        first, last, name = self._blocks[index]
+        return name if lineno <= last else None
+
+    def result(self, include_patterns=None, exclude_patterns=None):
+        '''Return the result of the last workload.
+
+        Args:
+            include_patterns (set): Specify patterns of file paths to include in the output.
+            exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+
+        Returns:
+            :class:`MultiTraceResult`
+        '''
+        if self._snapshot is None:
+            raise RuntimeError('No workload has been traced.')
+
+        snapshot = self._snapshot
+        total_size = sum(trace.size for trace in snapshot.traces)
+        total_count = len(snapshot.traces)
+
+        code_lines = None
+        if self._code_blocks:
+            code_lines = (
+                min(first for first, _ in self._code_blocks.values()),
+                max(last for _, last in self._code_blocks.values())
+            )
+        filters = make_filters(include_patterns, exclude_patterns, self._code_filename, code_lines)
+        if filters:
+            snapshot = snapshot.filter_traces(filters)
+
+        recorders = {name: TraceRecorder() for name in self._code_blocks}
+        inclusive_totals = {name: [0, 0] for name in self._code_blocks}
+        related = TraceRecorder()
+        blocks = dict()
+
+        for trace in snapshot.traces:
+            size = trace.size
+            seen = set()
+            callee = None
+            for index, frame in enumerate(iter_frames_most_recent_first(trace.traceback)):
+                key = (frame.filename, frame.lineno)
+                name = blocks.get(key, False)
+                if name is False:
+                    name = self._find_block(*key)
+                    blocks[key] = name
+
+                if index == 0:
+                    if name is None:
+                        related.add_trace(frame.filename, frame.lineno, size, 1)
+                    else:
+                        recorders[name].add_trace(frame.filename, frame.lineno, size, 1)
+
+                if name is not None and name not in seen:
+                    seen.add(name)
+                    inclusive_totals[name][0] += size
+                    inclusive_totals[name][1] += 1
+                    if self._nframe > 1:
+                        recorders[name].add_inclusive_trace(frame.lineno, size, callee)
+
+                callee = key
+
+        results = list()
+        totals = list()
+        for name, (first, last) in self._code_blocks.items():
+            recorder = recorders[name]
+            lineno_to_trace = {
+                trace[0]: trace[1:]
+                for trace in recorder.list_traces_for_each_file(self._code_filename)
+            }
+            lineno_to_inclusive_trace = {
+                lineno: (size, callees)
+                for lineno, size, callees in recorder.list_inclusive_traces()
+            }
+
+            target_lines = list()
+            for lineno in range(first, last + 1):
+                size, count = lineno_to_trace.get(lineno, (None, None))
+                inclusive, callees = lineno_to_inclusive_trace.get(lineno, (None, None))
+                target_lines.append(TargetLine(
+                    lineno=lineno,
+                    contents=self._source_lines[lineno - 1],
+                    size=size,
+                    count=count,
+                    inclusive=inclusive,
+                    callees=callees
+                ))
+
+            result = TraceResult(
+                qualname=name,
+                filepath=self._filepath,
+                lineno=first,
+                target_lines=target_lines,
+                related_traces=(),
+                total_size=total_size,
+                total_count=total_count
+            )
+            results.append(result)
+            totals.append(FunctionTotal(
+                qualname=name,
+                size=result.target_size,
+                count=result.target_count,
+                inclusive_size=inclusive_totals[name][0],
+                inclusive_count=inclusive_totals[name][1]
+            ))
+
+        totals.sort(key=lambda total: (-total.inclusive_size, total.qualname))
+
+        return MultiTraceResult(
+            results=results,
+            totals=totals,
+            related_traces=related.list_all_trace(),
+            total_size=total_size,
+            total_count=total_count
+        )
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''The memory of the process, including what tracemalloc cannot see.
+
+The memory allocated by `malloc` in C extensions is not traced by
+tracemalloc, but it is resident in the process.
+'''
+import os
+import sys
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+__all__ = ['get_rss', 'get_uss', 'get_memory_reader']
+
+
+STATM_PATH = '/proc/self/statm'
+SMAPS_ROLLUP_PATH = '/proc/self/smaps_rollup'
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def _read_statm_rss():
+    '''Return the resident set size from /proc/self/statm.'''
+    with open(STATM_PATH, 'rb') as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def _read_maxrss():
+    '''Return the peak resident set size from getrusage.'''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _read_smaps_uss():
+    '''Return the unique set size from /proc/self/smaps_rollup.'''
+    uss = 0
+    with open(SMAPS_ROLLUP_PATH, 'rb') as f:
+        for line in f:
+            if line.startswith((b'Private_Clean:', b'Private_Dirty:')):
+                uss += int(line.split()[1]) * 1024
+    return uss
+
+
+def _is_readable(path):
+    try:
+        with open(path, 'rb') as f:
+            f.read()
+    except OSError:
+        return False
+    return True
+
+
+def get_memory_reader(metric='rss'):
+    '''Return the function which reads the memory of the process in bytes.
+
+    The resident set size is read from /proc/self/statm. Without procfs,
+    the peak resident set size of getrusage is read instead, which only
+    grows. The unique set size is read from /proc/self/smaps_rollup
+    (Linux 4.14+), which is much slower to read.
+
+    Args:
+        metric (str): 'rss' or 'uss'.
+
+    Raises:
+        ValueError: If the metric is unknown.
+        RuntimeError: If the metric is not available on this platform.
+    '''
+    if metric == 'rss':
+        if _is_readable(STATM_PATH):
+            return _read_statm_rss
+        if resource is not None:
+            return _read_maxrss
+    elif metric == 'uss':
+        if _is_readable(SMAPS_ROLLUP_PATH):
+            return _read_smaps_uss
+    else:
+        raise ValueError('The metric must be either rss or uss.')
+
+    raise RuntimeError('The {} is not available on this platform.'.format(metric))
+
+
+def get_rss():
+    '''Return the resident set size of the process in bytes.'''
+    return get_memory_reader('rss')()
+
+
+def get_uss():
+    '''Return the unique set size of the process in bytes.'''
+    return get_memory_reader('uss')()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''pytest plugin which checks the allocations of targets against a baseline.
+
+The plugin is registered by the `pytest11` entry point, and provides
+the `malloc_baseline` fixture::
+
+    def test_allocations(malloc_baseline):
+        malloc_baseline.check(func, target_args=dict(x=1, y=2, z=3))
+
+The targets which are not in the baseline are added to it.
+Run pytest with `--malloc-baseline-update` to store the current traces
+instead of comparing them.
+'''
+import os
+import pytest
+from .tracer import Tracer
+from .baseline import Baseline
+
+
+DEFAULT_BASELINE_PATH = '.malloc_baseline.json'
+DEFAULT_ABS_THRESHOLD = 256
+DEFAULT_REL_THRESHOLD = 0.1
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('malloc_tracer')
+    group.addoption(
+        '--malloc-baseline',
+        dest='malloc_baseline',
+        default=None,
+        help='Path of the allocation baseline (default: {}).'.format(DEFAULT_BASELINE_PATH)
+    )
+    group.addoption(
+        '--malloc-baseline-update',
+        dest='malloc_baseline_update',
+        action='store_true',
+        default=False,
+        help='Store the current traces in the allocation baseline instead of comparing them.'
+    )
+    parser.addini('malloc_baseline', 'Path of the allocation baseline.', default=DEFAULT_BASELINE_PATH)
+    parser.addini(
+        'malloc_abs_threshold',
+        'Growth in bytes tolerated on a line.',
+        default=str(DEFAULT_ABS_THRESHOLD)
+    )
+    parser.addini(
+        'malloc_rel_threshold',
+        'Growth relative to the baseline tolerated on a line.',
+        default=str(DEFAULT_REL_THRESHOLD)
+    )
+
+
+class BaselineChecker(object):
+    '''Trace targets and check them against the baseline.
+
+    Args:
+        baseline (:class:`Baseline`):
+        update (bool): Store the traces instead of comparing them.
+        abs_threshold (int): Default of :meth:`check`.
+        rel_threshold (float): Default of :meth:`check`.
+    '''
+    def __init__(self, baseline, update=False, abs_threshold=0, rel_threshold=0.0):
+        self.baseline = baseline
+        self.update = update
+        self.abs_threshold = abs_threshold
+        self.rel_threshold = rel_threshold
+        self.modified = False
+
+    def check(
+        self,
+        function_or_method,
+        target_args=None,
+        name=None,
+        field='size',
+        abs_threshold=None,
+        rel_threshold=None,
+        repeat=3,
+        warmup=1,
+        **kwargs
+    ):
+        '''Trace the target and check the result against the baseline.
+
+        Args:
+            function_or_method:
+            target_args (dict):
+            name (str): Name of the target. The qualified name is used if None.
+            field (str): One of 'size', 'count', 'peak' and 'inclusive'.
+            abs_threshold (int):
+            rel_threshold (float):
+            repeat (int):
+            warmup (int):
+            **kwargs: Passed to :class:`Tracer`.
+
+        Returns:
+            :class:`TraceResult`
+
+        Raises:
+            :class:`AllocationRegression`: If the result regressed.
+        '''
+        result = Tracer(function_or_method, **kwargs).run(
+            target_args=target_args,
+            repeat=repeat,
+            warmup=warmup
+        )
+
+        diff = self.baseline.check(
+            result,
+            name=name,
+            update=self.update,
+            field=field,
+            abs_threshold=self.abs_threshold if abs_threshold is None else abs_threshold,
+            rel_threshold=self.rel_threshold if rel_threshold is None else rel_threshold
+        )
+        if diff is None:
+            self.modified = True
+
+        return result
+
+
+@pytest.fixture(scope='session')
+def malloc_baseline(request):
+    '''The :class:`BaselineChecker` of the session.'''
+    config = request.config
+    path = config.getoption('malloc_baseline') or config.getini('malloc_baseline')
+    rootdir = str(getattr(config, 'rootpath', None) or config.rootdir)
+    checker = BaselineChecker(
+        Baseline(os.path.join(rootdir, path)),
+        update=config.getoption('malloc_baseline_update'),
+        abs_threshold=int(config.getini('malloc_abs_threshold')),
+        rel_threshold=float(config.getini('malloc_rel_threshold'))
+    )
+
+    yield checker
+
+    if checker.modified:
+        checker.baseline.save()
@@ -0,0 +1,884 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import math
+import html
+import inspect
+import functools
+import itertools
+from enum import Enum
+from operator import attrgetter
+from .result import NOISY_FIELDS
+from .writers import ReportWriter
+
+
+__all__ = ['RelatedTracesOutputMode', 'render_text', 'render_sweep_text', 'render_scaling_text',
+           'render_multi_text', 'render_timeline_text', 'render_stream_text', 'render_leaks_text',
+           'render_markdown', 'render_html', 'render', 'register_renderer']
+
+
+def bytes_to_hrf(size):
+    '''Convert bytes to human readable format.'''
+    units = ('B', 'KiB', 'MiB', 'GiB', 'TiB')
+
+    if size != 0:
+        order = min(int(math.log(abs(size)) / math.log(1024)), len(units)-1)
+    else:
+        order = 0
+
+    fmt = '6.0f' if order == 0 else '6.1f'
+    return '{0:{1}} {2}'.format(size/(1024**order), fmt, units[order])
+
+
+def time_to_hrf(time_ns):
+    '''Convert nanoseconds to human readable format.'''
+    units = ('ns', 'us', 'ms', 's')
+
+    order = 0
+    value = time_ns
+    while abs(value) >= 1000 and order < len(units) - 1:
+        value /= 1000
+        order += 1
+
+    fmt = '6.0f' if order == 0 else '6.1f'
+    return '{0:{1}} {2}'.format(value, fmt, units[order])
+
+
+def _buffered(render):
+    '''Make the renderer write to a :class:`ReportWriter`, which is flushed at the end.
+
+    The helpers of the renderers receive the writer as `file`.
+    '''
+    signature = inspect.signature(render)
+
+    @functools.wraps(render)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs)
+        file = arguments.arguments.get('file')
+        if isinstance(file, ReportWriter):
+            return render(*args, **kwargs)
+
+        with ReportWriter(file) as writer:
+            arguments.arguments['file'] = writer
+            return render(*arguments.args, **arguments.kwargs)
+
+    return wrapper
+
+
+class RelatedTracesOutputMode(Enum):
+    '''Output modes for Related traces.'''
+    NONE = 0
+    FOR_EACH_FILE = 1  #: Displays related traces for each file.
+    IN_DESCENDING_ORDER = 2  #: Display related traces in descending order.
+
+
+@_buffered
+def render_text(
+    result,
+    related_traces_output_mode=RelatedTracesOutputMode.NONE,
+    file=None
+):
+    '''Display the trace result as text.
+
+    Args:
+        result (:class:`TraceResult`):
+        related_traces_output_mode (:class:`RelatedTracesOutputMode`):
+        file: A text stream. sys.stdout is used if None.
+    '''
+    _display_target_traces(result, file)
+
+    # for others.
+    if related_traces_output_mode == RelatedTracesOutputMode.NONE:
+        print(file=file)
+    elif related_traces_output_mode == RelatedTracesOutputMode.FOR_EACH_FILE:
+        print(file=file)
+        _display_related_traces_for_each_file(result, file)
+    elif related_traces_output_mode == RelatedTracesOutputMode.IN_DESCENDING_ORDER:
+        print(file=file)
+        _display_related_traces_in_descending_order(result, file)
+
+    # Total allocated size.
+    print('Total allocated size: {} (raw {} B)'.format(
+        bytes_to_hrf(result.total_size).lstrip(),
+        result.total_size
+    ), file=file)
+
+
+def _format_count(count):
+    return '{:10d}'.format(count)
+
+
+def _domain_getter(name):
+    '''Return the getter of the size of a domain of a target line.'''
+    def get(line):
+        return None if line.domains is None else line.domains.get(name)
+    return get
+
+
+def _target_columns(result):
+    '''Return (name, getter, summarize, format) of the columns of the target traces.'''
+    columns = list()
+    if result.has_time:
+        columns.append(('Time', attrgetter('time'), sum, time_to_hrf))
+    if result.has_line_stats:
+        columns.append(('Peak', attrgetter('peak'), max, bytes_to_hrf))
+        columns.append(('Delta', attrgetter('delta'), sum, bytes_to_hrf))
+    if result.has_native:
+        columns.append(('Native', attrgetter('native'), sum, bytes_to_hrf))
+    if result.has_churn:
+        columns.append(('Churn', attrgetter('churn'), sum, bytes_to_hrf))
+    if any(line.hits is not None for line in result.target_lines):
+        columns.append(('Hits', attrgetter('hits'), sum, _format_count))
+    if result.has_inclusive:
+        columns.append(('Inclusive', attrgetter('inclusive'), sum, bytes_to_hrf))
+    for name in result.domain_names:
+        columns.append((name, _domain_getter(name), sum, bytes_to_hrf))
+    columns.append(('Size', attrgetter('size'), sum, bytes_to_hrf))
+    if result.has_time:
+        columns.append(('Count', attrgetter('count'), sum, _format_count))
+    return columns
+
+
+def _display_target_traces(result, file, show_qualname=False):
+    '''Display target traces.'''
+    columns = _target_columns(result)
+    width = 24 + 14 * (len(columns) - 1) + 80
+
+    unstable = set(line.lineno for line in result.unstable_lines())
+    untraced = set(line.lineno for line in result.untraced_lines())
+
+    if result.num_runs > 1:
+        print('<< Target traces (median of {} runs) >>'.format(result.num_runs), file=file)
+    else:
+        print('<< Target traces >>', file=file)
+    print('File "{}"'.format(result.filepath), file=file)
+    if show_qualname:
+        print('Function "{}"'.format(result.qualname), file=file)
+    print('Line #    ' + ''.join(
+        '{:14s}'.format(name) for name, _, _, _ in columns
+    ) + 'Line Contents', file=file)
+    print('=' * width, file=file)
+
+    for line in result.target_lines:
+        values = list()
+        for _, get, _, fmt in columns:
+            value = get(line)
+            values.append(' ' * 10 if value is None else '{:10s}'.format(fmt(value)))
+
+        print('{lineno:6d}  {mark:1s} {size:10s}    {contents}'.format(
+            lineno=line.lineno,
+            mark='!' if line.lineno in untraced else '*' if line.lineno in unstable else '',
+            size='    '.join(values),
+            contents=line.contents
+        ), file=file)
+
+    summaries = list()
+    for _, get, summarize, fmt in columns:
+        values = [get(line) for line in result.target_lines]
+        values = [value for value in values if value is not None]
+        summaries.append('{:10s}'.format(fmt(summarize(values) if values else 0)))
+
+    total = result.target_size
+
+    print('-' * width, file=file)
+    print('{:6d}    {:10s} (raw {} B)'.format(
+        len(result.traced_lines),
+        '    '.join(summaries),
+        total
+    ), file=file)
+
+    if untraced:
+        print("Lines marked with '!' grow the memory of the process beyond the traced memory.",
+              file=file)
+
+    if unstable:
+        print(file=file)
+        _display_unstable_lines(result, file)
+
+    if result.has_inclusive:
+        print(file=file)
+        _display_callees(result, file)
+
+
+def _display_unstable_lines(result, file):
+    '''Display the spread of the lines which vary between the runs.'''
+    print('<< Unstable lines >>', file=file)
+    print('Line #    Field         Min           Median        Max', file=file)
+    print('=' * (24 + 80), file=file)
+
+    for line in result.unstable_lines():
+        for field, spread in sorted(line.spread.items()):
+            if field in NOISY_FIELDS or spread.min == spread.max:
+                continue
+            if field in ('count', 'hits'):
+                values = ['{:10d}'.format(value) for value in spread]
+            else:
+                values = ['{:10s}'.format(bytes_to_hrf(value)) for value in spread]
+            print('{:6d}    {:10s}    {}'.format(
+                line.lineno,
+                field,
+                '    '.join(values).rstrip()
+            ), file=file)
+
+    print('-' * (24 + 80), file=file)
+
+
+def _display_callees(result, file, max_callees=5):
+    '''Display the callees of each line of the target.'''
+    print('<< Callees >>', file=file)
+    print('Line #    Inclusive     Line Contents / Callee', file=file)
+    print('=' * (24 + 80), file=file)
+
+    for line in result.target_lines:
+        if not line.inclusive:
+            continue
+
+        print('{lineno:6d}    {size:10s}    {contents}'.format(
+            lineno=line.lineno,
+            size=bytes_to_hrf(line.inclusive),
+            contents=line.contents.strip()
+        ), file=file)
+
+        callees = line.callees or ()
+        self_size = line.inclusive - sum(callee.size for callee in callees)
+        if callees and self_size > 0:
+            print('          {:10s}      (self)'.format(bytes_to_hrf(self_size)), file=file)
+        for callee in callees[:max_callees]:
+            print('          {:10s}      "{}", line {}: {}'.format(
+                bytes_to_hrf(callee.size),
+                callee.filepath,
+                callee.lineno,
+                file.getline(callee.filepath, callee.lineno).strip()
+            ), file=file)
+        if len(callees) > max_callees:
+            print('          {:10s}      ({} more)'.format(
+                bytes_to_hrf(sum(callee.size for callee in callees[max_callees:])),
+                len(callees) - max_callees
+            ), file=file)
+
+    print('-' * (24 + 80), file=file)
+
+
+def _display_related_traces_for_each_file(result, file):
+    '''Displays related traces for each file.'''
+    traces = sorted(result.related_traces, key=lambda trace: (trace.filepath, trace.lineno))
+
+    for filepath, group in itertools.groupby(traces, key=lambda trace: trace.filepath):
+        print('<< Related traces >>', file=file)
+        print('File "{}"'.format(filepath), file=file)
+        print('Line #    Size          Line Contents', file=file)
+        print('=' * (24 + 80), file=file)
+
+        num_lines = 0
+        total = 0
+        for trace in group:
+            print('{lineno:6d}    {size:10s}    {contents}'.format(
+                lineno=trace.lineno,
+                size=bytes_to_hrf(trace.size),
+                contents=file.getline(filepath, trace.lineno).rstrip()
+            ), file=file)
+            num_lines += 1
+            total += trace.size
+
+        print('-' * (24 + 80), file=file)
+        print('{:6d}    {:10s} (raw {} B)\n'.format(
+            num_lines,
+            bytes_to_hrf(total),
+            total
+        ), file=file)
+
+
+def _display_related_traces_in_descending_order(result, file):
+    '''Display related traces in descending order.'''
+    traces = list(result.related_traces)
+    if not traces:
+        return
+
+    traces.sort(key=lambda trace: (-trace.size, trace.filepath, trace.lineno))
+
+    print('<< Related traces >>', file=file)
+    print('Line #    Size          Line Contents', file=file)
+    print('=' * (24 + 80), file=file)
+
+    for index, trace in enumerate(traces, 1):
+        print('#{} "{}": (raw {} B)'.format(
+            index,
+            trace.filepath,
+            trace.size
+        ), file=file)
+        print('{lineno:6d}    {size:10s}    {contents}\n'.format(
+            lineno=trace.lineno,
+            size=bytes_to_hrf(trace.size),
+            contents=file.getline(trace.filepath, trace.lineno).rstrip()
+        ), file=file)
+
+
+@_buffered
+def render_sweep_text(sweep_result, field='size', file=None):
+    '''Display the lines of the target by configurations as text.
+
+    Args:
+        sweep_result (:class:`SweepResult`):
+        field (str): A field of :class:`TargetLine`.
+        file: A text stream. sys.stdout is used if None.
+    '''
+    num_configurations = len(sweep_result)
+    width = 10 + 14 * num_configurations + 80
+
+    print('<< Target traces by configuration ({}) >>'.format(field), file=file)
+    if sweep_result.results:
+        print('File "{}"'.format(sweep_result.results[0].filepath), file=file)
+    print('Line #    ' + ''.join(
+        '{:14s}'.format('#{}'.format(index)) for index in range(1, num_configurations + 1)
+    ) + 'Line Contents', file=file)
+    print('=' * width, file=file)
+
+    for lineno, contents, values in sweep_result.matrix(field=field):
+        print('{:6d}    {}{}'.format(
+            lineno,
+            ''.join(
+                (' ' * 10 if value is None else bytes_to_hrf(value)) + '    '
+                for value in values
+            ),
+            contents
+        ), file=file)
+
+    print('-' * width, file=file)
+    for index, configuration in enumerate(sweep_result.configurations, 1):
+        print('#{}: {}'.format(index, configuration), file=file)
+    print(file=file)
+
+
+@_buffered
+def render_scaling_text(scaling_result, expected=None, file=None):
+    '''Display the growth of the lines of the target as text.
+
+    Args:
+        scaling_result (:class:`ScalingResult`):
+        expected (:class:`Complexity`): The lines which grow faster are marked with '!'.
+        file: A text stream. sys.stdout is used if None.
+    '''
+    num_sizes = len(scaling_result)
+    width = 10 + 14 * num_sizes + 14 + 80
+    exceeding = set() if expected is None else set(
+        line.lineno for line in scaling_result.exceeding(expected)
+    )
+
+    print('<< Target traces by input size ({}) >>'.format(scaling_result.field), file=file)
+    if scaling_result.results:
+        print('File "{}"'.format(scaling_result.results[0].filepath), file=file)
+    print('Line #    ' + ''.join(
+        '{:14s}'.format('n={}'.format(n)) for n in scaling_result.sizes
+    ) + 'Growth        Line Contents', file=file)
+    print('=' * width, file=file)
+
+    for line in scaling_result.lines:
+        traced = any(value is not None for value in line.values)
+        print('{:6d}    {}{:12s}{:2s}{}'.format(
+            line.lineno,
+            ''.join(
+                (' ' * 10 if value is None else '{:10s}'.format(bytes_to_hrf(value))) + '    '
+                for value in line.values
+            ),
+            str(line.complexity) if traced else '',
+            '!' if line.lineno in exceeding else '',
+            line.contents
+        ), file=file)
+
+    print('-' * width, file=file)
+    if expected is not None:
+        print('{} line(s) grow faster than {}'.format(len(exceeding), expected), file=file)
+    print(file=file)
+
+
+@_buffered
+def render_multi_text(
+    multi_result,
+    related_traces_output_mode=RelatedTracesOutputMode.NONE,
+    file=None
+):
+    '''Display the results of a :class:`MultiTracer` as text.
+
+    The totals of the functions are followed by the target traces of
+    the functions which allocated anything.
+
+    Args:
+        multi_result (:class:`MultiTraceResult`):
+        related_traces_output_mode (:class:`RelatedTracesOutputMode`):
+        file: A text stream. sys.stdout is used if None.
+    '''
+    print('<< Functions >>', file=file)
+    print('Inclusive     Exclusive     Name', file=file)
+    print('=' * (28 + 80), file=file)
+    for total in multi_result.totals:
+        print('{:10s}    {:10s}    {}'.format(
+            bytes_to_hrf(total.inclusive_size),
+            bytes_to_hrf(total.size),
+            total.qualname
+        ), file=file)
+    print('-' * (28 + 80), file=file)
+    print(file=file)
+
+    for total in multi_result.totals:
+        if not total.inclusive_size and not total.size:
+            continue
+        _display_target_traces(multi_result[total.qualname], file, show_qualname=True)
+        print(file=file)
+
+    if related_traces_output_mode == RelatedTracesOutputMode.FOR_EACH_FILE:
+        _display_related_traces_for_each_file(multi_result, file)
+    elif related_traces_output_mode == RelatedTracesOutputMode.IN_DESCENDING_ORDER:
+        _display_related_traces_in_descending_order(multi_result, file)
+        print(file=file)
+
+    print('Total allocated size: {} (raw {} B)'.format(
+        bytes_to_hrf(multi_result.total_size).lstrip(),
+        multi_result.total_size
+    ), file=file)
+
+
+@_buffered
+def render_timeline_text(timeline, num_peaks=5, file=None):
+    '''Display the traced memory over the time of a call as text.
+
+    Args:
+        timeline (:class:`Timeline`):
+        num_peaks (int): Number of the highest peaks which are displayed.
+        file: A text stream. sys.stdout is used if None.
+    '''
+    samples = timeline.samples
+    print('<< Timeline >>', file=file)
+    print('File "{}"'.format(timeline.filepath), file=file)
+    print('Function "{}"'.format(timeline.qualname), file=file)
+    print('{} samples every {} over {}{}'.format(
+        len(samples),
+        time_to_hrf(timeline.interval * 1e9).lstrip(),
+        time_to_hrf(samples[-1].time * 1e9).lstrip() if samples else '0 ns',
+        ' ({} oldest dropped)'.format(timeline.num_dropped) if timeline.num_dropped else ''
+    ), file=file)
+    print(file=file)
+
+    print('<< Lines >>', file=file)
+    print('Line #    Samples       Max Current   Line Contents', file=file)
+    print('=' * (24 + 80), file=file)
+    for lineno, count, current in timeline.lines():
+        print('{:6d}    {:10d}    {:10s}    {}'.format(
+            lineno,
+            count,
+            bytes_to_hrf(current),
+            timeline.contents(lineno)
+        ), file=file)
+    print('-' * (24 + 80), file=file)
+    print(file=file)
+
+    print('<< Peaks >>', file=file)
+    print('Time          Current       Peak          Line #    Line Contents', file=file)
+    print('=' * (52 + 80), file=file)
+    for sample in timeline.peaks(num_peaks):
+        print('{:10s}    {:10s}    {:10s}    {:6s}    {}'.format(
+            time_to_hrf(sample.time * 1e9),
+            bytes_to_hrf(sample.current),
+            bytes_to_hrf(sample.peak),
+            '' if sample.lineno is None else '{:6d}'.format(sample.lineno),
+            timeline.contents(sample.lineno).strip()
+        ), file=file)
+    print('-' * (52 + 80), file=file)
+
+
+@_buffered
+def render_stream_text(stream_result, num_items=10, file=None):
+    '''Display the memory of a generator for each item as text.
+
+    Args:
+        stream_result (:class:`StreamResult`):
+        num_items (int): Number of the last items which are displayed.
+        file: A text stream. sys.stdout is used if None.
+    '''
+    items = stream_result.items
+    print('<< Stream >>', file=file)
+    print('File "{}"'.format(stream_result.result.filepath), file=file)
+    print('Function "{}"'.format(stream_result.result.qualname), file=file)
+    print('{} items{}, {} retained after the last item'.format(
+        stream_result.num_items,
+        ' ({} oldest dropped)'.format(stream_result.num_dropped) if stream_result.num_dropped else '',
+        bytes_to_hrf(stream_result.retained).lstrip()
+    ), file=file)
+    if sum(1 for item in items if item.index >= 1) < 3:
+        print('Growth: not enough items', file=file)
+    else:
+        complexity, _, slope = stream_result.growth()
+        print('Growth: {}{}'.format(
+            complexity,
+            ', {} per item'.format(bytes_to_hrf(slope).lstrip()) if slope else ''
+        ), file=file)
+    print(file=file)
+
+    lines = stream_result.lines()
+    if lines:
+        print('<< Lines by item >>', file=file)
+        print('Line #    Items         Delta/Item    Max Delta     Churn/Item    Line Contents',
+              file=file)
+        print('=' * (66 + 80), file=file)
+        for lineno, count, delta, max_delta, churn in lines:
+            print('{:6d}    {:10d}    {:10s}    {:10s}    {:10s}    {}'.format(
+                lineno,
+                count,
+                bytes_to_hrf(delta // count),
+                bytes_to_hrf(max_delta),
+                '{:>10s}'.format('-') if churn is None else bytes_to_hrf(churn // count),
+                stream_result.contents(lineno)
+            ), file=file)
+        print('-' * (66 + 80), file=file)
+        print(file=file)
+
+    print('<< Last items >>', file=file)
+    print('Item #        Delta         Retained', file=file)
+    print('=' * 38, file=file)
+    for item in items[-num_items:] if num_items > 0 else ():
+        print('{:10d}    {:10s}    {:10s}'.format(
+            item.index,
+            bytes_to_hrf(item.delta),
+            bytes_to_hrf(item.retained)
+        ), file=file)
+    print('-' * 38, file=file)
+
+
+@_buffered
+def render_leaks_text(leak_result, file=None):
+    '''Display the memory retained by the target over repeated calls as text.
+
+    Args:
+        leak_result (:class:`LeakResult`):
+        file: A text stream. sys.stdout is used if None.
+    '''
+    last = leak_result.results[-1]
+    print('<< Leaks >>', file=file)
+    print('File "{}"'.format(last.filepath), file=file)
+    print('Function "{}"'.format(last.qualname), file=file)
+    print('{} calls ({} warmup), {} retained after the last call'.format(
+        len(leak_result),
+        leak_result.warmup,
+        bytes_to_hrf(last.total_size).lstrip()
+    ), file=file)
+    print('Growth: {}{}'.format(
+        leak_result.complexity,
+        ', {} per call'.format(bytes_to_hrf(leak_result.per_call).lstrip())
+        if leak_result.per_call else ''
+    ), file=file)
+    print(file=file)
+
+    width = 66 + 80
+    print('<< Target traces over the calls >>', file=file)
+    print('Line #    First Call    Last Call     Per Call      Growth        Line Contents',
+          file=file)
+    print('=' * width, file=file)
+    for line in leak_result.lines:
+        traced = any(value is not None for value in line.values)
+        print('{:6d}    {:10s}    {:10s}    {:10s}    {:12s}{:2s}{}'.format(
+            line.lineno,
+            '' if line.values[0] is None else bytes_to_hrf(line.values[0]),
+            '' if line.values[-1] is None else bytes_to_hrf(line.values[-1]),
+            bytes_to_hrf(line.per_call) if line.per_call else '',
+            str(line.complexity) if traced else '',
+            '!' if line.per_call else '',
+            line.contents
+        ), file=file)
+    print('-' * width, file=file)
+    print(file=file)
+
+    if leak_result.related:
+        print('<< Related leaks >>', file=file)
+        print('Per Call      Growth        Line', file=file)
+        print('=' * width, file=file)
+        for line in leak_result.related:
+            print('{:10s}    {:12s}  "{}", line {}: {}'.format(
+                bytes_to_hrf(line.per_call),
+                str(line.complexity),
+                line.filepath,
+                line.lineno,
+                file.getline(line.filepath, line.lineno).strip()
+            ), file=file)
+        print('-' * width, file=file)
+        print(file=file)
+
+
+def _markdown_code(text):
+    '''Return the text as a code span in a cell of a Markdown table.'''
+    text = text.rstrip()
+    if not text.strip():
+        return ''
+    fence = '``' if '`' in text else '`'
+    return '{0} {1} {0}'.format(fence, text.replace('|', '\\|'))
+
+
+def _markdown_row(cells):
+    return '| ' + ' | '.join(cells) + ' |'
+
+
+def _markdown_related_traces(traces, file, show_filepath):
+    names = ['Line #', 'Size', 'Line Contents']
+    aligns = ['---:', '---:', ':---']
+    if show_filepath:
+        names.insert(0, 'File')
+        aligns.insert(0, ':---')
+
+    print(_markdown_row(names), file=file)
+    print(_markdown_row(aligns), file=file)
+    for trace in traces:
+        cells = [
+            str(trace.lineno),
+            bytes_to_hrf(trace.size).strip(),
+            _markdown_code(file.getline(trace.filepath, trace.lineno))
+        ]
+        if show_filepath:
+            cells.insert(0, _markdown_code(trace.filepath))
+        print(_markdown_row(cells), file=file)
+    print(file=file)
+
+
+@_buffered
+def render_markdown(
+    result,
+    related_traces_output_mode=RelatedTracesOutputMode.NONE,
+    file=None
+):
+    '''Display the trace result as Markdown tables.
+
+    Args:
+        result (:class:`TraceResult`):
+        related_traces_output_mode (:class:`RelatedTracesOutputMode`):
+        file: A text stream. sys.stdout is used if None.
+    '''
+    columns = _target_columns(result)
+    unstable = set(line.lineno for line in result.unstable_lines())
+    untraced = set(line.lineno for line in result.untraced_lines())
+
+    title = 'Target traces'
+    if result.num_runs > 1:
+        title += ' (median of {} runs)'.format(result.num_runs)
+    print('### {}: {}'.format(title, _markdown_code(result.qualname)), file=file)
+    print(file=file)
+    print('File {}'.format(_markdown_code(result.filepath)), file=file)
+    print(file=file)
+
+    print(_markdown_row(
+        ['Line #'] + [name for name, _, _, _ in columns] + ['Line Contents']
+    ), file=file)
+    print(_markdown_row(['---:'] * (len(columns) + 1) + [':---']), file=file)
+    for line in result.target_lines:
+        mark = ' !' if line.lineno in untraced else ' \\*' if line.lineno in unstable else ''
+        cells = [str(line.lineno) + mark]
+        for _, get, _, fmt in columns:
+            value = get(line)
+            cells.append('' if value is None else fmt(value).strip())
+        cells.append(_markdown_code(line.contents))
+        print(_markdown_row(cells), file=file)
+
+    summaries = list()
+    for _, get, summarize, fmt in columns:
+        values = [value for value in map(get, result.target_lines) if value is not None]
+        summaries.append('**{}**'.format(fmt(summarize(values) if values else 0).strip()))
+    print(_markdown_row(
+        ['**{}**'.format(len(result.traced_lines))] + summaries + ['']
+    ), file=file)
+    print(file=file)
+
+    if related_traces_output_mode == RelatedTracesOutputMode.FOR_EACH_FILE:
+        traces = sorted(result.related_traces, key=lambda trace: (trace.filepath, trace.lineno))
+        for filepath, group in itertools.groupby(traces, key=lambda trace: trace.filepath):
+            print('#### Related traces: {}'.format(_markdown_code(filepath)), file=file)
+            print(file=file)
+            _markdown_related_traces(group, file, show_filepath=False)
+    elif related_traces_output_mode == RelatedTracesOutputMode.IN_DESCENDING_ORDER:
+        traces = sorted(
+            result.related_traces,
+            key=lambda trace: (-trace.size, trace.filepath, trace.lineno)
+        )
+        if traces:
+            print('#### Related traces', file=file)
+            print(file=file)
+            _markdown_related_traces(traces, file, show_filepath=True)
+
+    print('Total allocated size: {} (raw {} B)'.format(
+        bytes_to_hrf(result.total_size).strip(),
+        result.total_size
+    ), file=file)
+
+
+HTML_STYLE = '''
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; font-size: 13px; margin-bottom: 2em; }
+th, td { padding: 2px 8px; text-align: right; white-space: nowrap; }
+th { border-bottom: 1px solid #888; }
+th.contents, td.contents { text-align: left; }
+td.contents { font-family: monospace; white-space: pre; }
+tfoot td { border-top: 1px solid #888; font-weight: bold; }
+'''
+
+
+def _html_escape(text):
+    return html.escape(text, quote=True)
+
+
+def _html_heat(value, max_value):
+    '''Return the style of a cell whose value is `value` of `max_value`.'''
+    if not value or not max_value or value <= 0:
+        return ''
+    return ' style="background-color: rgba(255, 64, 0, {:.2f})"'.format(
+        0.05 + 0.75 * min(value / max_value, 1.0)
+    )
+
+
+def _html_related_traces(traces, file, show_filepath):
+    traces = list(traces)
+    max_size = max((trace.size for trace in traces), default=0)
+
+    print('<table>', file=file)
+    print('<thead><tr>{}<th>Line #</th><th>Size</th><th class="contents">Line Contents</th>'
+          '</tr></thead>'.format('<th class="contents">File</th>' if show_filepath else ''),
+          file=file)
+    print('<tbody>', file=file)
+    for trace in traces:
+        print('<tr{heat} title="{raw} B">{filepath}<td>{lineno}</td><td>{size}</td>'
+              '<td class="contents">{contents}</td></tr>'.format(
+                  heat=_html_heat(trace.size, max_size),
+                  raw=trace.size,
+                  filepath='<td class="contents">{}</td>'.format(
+                      _html_escape(trace.filepath)
+                  ) if show_filepath else '',
+                  lineno=trace.lineno,
+                  size=_html_escape(bytes_to_hrf(trace.size).strip()),
+                  contents=_html_escape(file.getline(trace.filepath, trace.lineno).rstrip())
+              ), file=file)
+    print('</tbody>', file=file)
+    print('</table>', file=file)
+
+
+@_buffered
+def render_html(
+    result,
+    related_traces_output_mode=RelatedTracesOutputMode.NONE,
+    field='size',
+    file=None
+):
+    '''Display the trace result as a self-contained HTML page.
+
+    The lines of the target are colored by the value of a field,
+    as a heatmap of the source.
+
+    Args:
+        result (:class:`TraceResult`):
+        related_traces_output_mode (:class:`RelatedTracesOutputMode`):
+        field (str): The field of :class:`TargetLine` which colors the lines.
+        file: A text stream. sys.stdout is used if None.
+    '''
+    columns = _target_columns(result)
+    unstable = set(line.lineno for line in result.unstable_lines())
+    untraced = set(line.lineno for line in result.untraced_lines())
+    get_heat = attrgetter(field)
+    max_heat = max((get_heat(line) or 0 for line in result.target_lines), default=0)
+
+    title = _html_escape('malloc_tracer: {}'.format(result.qualname))
+    print('<!DOCTYPE html>', file=file)
+    print('<html>', file=file)
+    print('<head>', file=file)
+    print('<meta charset="utf-8">', file=file)
+    print('<title>{}</title>'.format(title), file=file)
+    print('<style>{}</style>'.format(HTML_STYLE), file=file)
+    print('</head>', file=file)
+    print('<body>', file=file)
+    print('<h1>{}</h1>'.format(_html_escape(result.qualname)), file=file)
+    print('<p>File "{}"{}</p>'.format(
+        _html_escape(result.filepath),
+        ', median of {} runs'.format(result.num_runs) if result.num_runs > 1 else ''
+    ), file=file)
+
+    print('<table>', file=file)
+    print('<thead><tr><th>Line #</th>{}<th class="contents">Line Contents</th></tr></thead>'.format(
+        ''.join('<th>{}</th>'.format(_html_escape(name)) for name, _, _, _ in columns)
+    ), file=file)
+    print('<tbody>', file=file)
+    for line in result.target_lines:
+        mark = ' !' if line.lineno in untraced else ' *' if line.lineno in unstable else ''
+        cells = list()
+        for _, get, _, fmt in columns:
+            value = get(line)
+            cells.append('<td>{}</td>'.format(
+                '' if value is None else _html_escape(fmt(value).strip())
+            ))
+        heat = get_heat(line)
+        print('<tr{heat}{title}><td>{lineno}{mark}</td>{cells}'
+              '<td class="contents">{contents}</td></tr>'.format(
+            heat=_html_heat(heat, max_heat),
+            title='' if heat is None else ' title="{}: {}"'.format(field, heat),
+            lineno=line.lineno,
+            mark=mark,
+            cells=''.join(cells),
+            contents=_html_escape(line.contents.rstrip())
+        ), file=file)
+    print('</tbody>', file=file)
+
+    summaries = list()
+    for _, get, summarize, fmt in columns:
+        values = [value for value in map(get, result.target_lines) if value is not None]
+        summaries.append('<td>{}</td>'.format(
+            _html_escape(fmt(summarize(values) if values else 0).strip())
+        ))
+    print('<tfoot><tr><td>{}</td>{}<td class="contents"></td></tr></tfoot>'.format(
+        len(result.traced_lines),
+        ''.join(summaries)
+    ), file=file)
+    print('</table>', file=file)
+
+    if related_traces_output_mode == RelatedTracesOutputMode.FOR_EACH_FILE:
+        traces = sorted(result.related_traces, key=lambda trace: (trace.filepath, trace.lineno))
+        for filepath, group in itertools.groupby(traces, key=lambda trace: trace.filepath):
+            print('<h2>Related traces: {}</h2>'.format(_html_escape(filepath)), file=file)
+            _html_related_traces(group, file, show_filepath=False)
+    elif related_traces_output_mode == RelatedTracesOutputMode.IN_DESCENDING_ORDER:
+        traces = sorted(
+            result.related_traces,
+            key=lambda trace: (-trace.size, trace.filepath, trace.lineno)
+        )
+        if traces:
+            print('<h2>Related traces</h2>', file=file)
+            _html_related_traces(traces, file, show_filepath=True)
+
+    print('<p>Total allocated size: {} (raw {} B)</p>'.format(
+        _html_escape(bytes_to_hrf(result.total_size).strip()),
+        result.total_size
+    ), file=file)
+    print('</body>', file=file)
+    print('</html>', file=file)
+
+
+RENDERERS = {
+    'text': render_text,
+    'markdown': render_markdown,
+    'html': render_html,
+}
+
+
+def register_renderer(name, renderer):
+    '''Add a format to :func:`render`.
+
+    Args:
+        name (str): Name of the format.
+        renderer (callable): Called with the result, the keyword arguments
+            of :func:`render` and `file`, a :class:`ReportWriter`.
+    '''
+    RENDERERS[name] = _buffered(renderer)
+
+
+def render(result, format='text', file=None, **kwargs):
+    '''Display the trace result in a format.
+
+    Args:
+        result (:class:`TraceResult`):
+        format (str): 'text', 'markdown', 'html' or a registered format.
+        file: A text stream. sys.stdout is used if None.
+        **kwargs: Passed to the renderer of the format.
+    '''
+    renderer = RENDERERS.get(format)
+    if renderer is None:
+        raise ValueError('The format must be one of {}.'.format(sorted(RENDERERS)))
+    renderer(result, file=file, **kwargs)
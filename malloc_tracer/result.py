@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import csv
+import json
+import statistics
+from collections import namedtuple, OrderedDict
+
+
+__all__ = ['TraceResult', 'TargetLine', 'RelatedTrace', 'Spread']
+
+
+TargetLine = namedtuple(
+    'TargetLine',
+    (
+        'lineno', 'contents', 'size', 'count', 'peak', 'delta',
+        'inclusive', 'callees', 'spread', 'churn', 'hits', 'time', 'domains',
+        'native'
+    )
+)
+TargetLine.__doc__ = '''A line of the target function or method.
+
+The fields are None if nothing was recorded for the line.
+`inclusive` is the size allocated under the line, including the callees,
+and `callees` is a tuple of :class:`RelatedTrace` for the frames called
+from the line, in descending order of size.
+`spread` is a dict of field name to :class:`Spread` if the target was run
+several times, in which case the other fields are the medians.
+`churn` is the memory allocated by all the executions of the line,
+including what was freed before the snapshot, and `hits` is the number
+of executions. `time` is the elapsed time of the line in nanoseconds.
+`domains` is a dict of domain name to size if memory was traced in other
+domains than the Python one, such as the data buffers of NumPy arrays.
+`native` is the net change of the memory of the process on the line,
+which includes the memory that tracemalloc cannot see.
+'''
+TargetLine.__new__.__defaults__ = (None, ) * 12
+
+RelatedTrace = namedtuple(
+    'RelatedTrace',
+    ('filepath', 'lineno', 'size', 'count')
+)
+RelatedTrace.__doc__ = '''A line outside of the target function or method.'''
+
+Spread = namedtuple('Spread', ('min', 'median', 'max'))
+Spread.__doc__ = '''The minimum, the median and the maximum of a field over the runs.'''
+
+# The fields of a target line which are summarized over the runs.
+SPREAD_FIELDS = (
+    'size', 'count', 'peak', 'delta', 'inclusive', 'churn', 'hits', 'time', 'native'
+)
+
+# The fields which vary between the runs regardless of the allocations.
+NOISY_FIELDS = ('time', 'native')
+
+# The native growth of a line, beyond its traced growth, which is not noise.
+NATIVE_THRESHOLD = 64 * 1024
+
+
+# The callees, the spread and the domains are nested, and not exported to CSV.
+CSV_FIELDS = ('kind', 'filepath') + tuple(
+    field for field in TargetLine._fields if field not in ('callees', 'spread', 'domains')
+)
+
+
+def make_target_line(line):
+    '''Make :class:`TargetLine` from a sequence.'''
+    line = TargetLine(*line)
+    if line.callees is not None:
+        line = line._replace(callees=tuple(
+            RelatedTrace(**callee) if isinstance(callee, dict) else RelatedTrace(*callee)
+            for callee in line.callees
+        ))
+    if line.spread is not None:
+        line = line._replace(spread={
+            field: Spread(*spread) for field, spread in line.spread.items()
+        })
+    return line
+
+
+def make_spread(values):
+    '''Make :class:`Spread` of the values of the runs.
+
+    The values which were never recorded (None) are ignored.
+
+    Returns:
+        :class:`Spread`, or None if no run recorded a value.
+    '''
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    return Spread(values[0], statistics.median_low(values), values[-1])
+
+
+def merge_domains(domains_of_runs):
+    '''Merge the sizes of each domain of the runs into their medians.
+
+    Returns:
+        dict: Size for each domain name, or None if no run has domains.
+    '''
+    domains_of_runs = list(domains_of_runs)
+    if all(domains is None for domains in domains_of_runs):
+        return None
+
+    names = OrderedDict()
+    for domains in domains_of_runs:
+        if domains is not None:
+            names.update(OrderedDict.fromkeys(domains))
+
+    # A run which has nothing in a domain has no memory in it.
+    return {
+        name: make_spread(
+            0 if domains is None else domains.get(name, 0) for domains in domains_of_runs
+        ).median
+        for name in names
+    }
+
+
+def merge_traces(traces_of_runs, key):
+    '''Merge the traces of the runs into their medians.
+
+    Args:
+        traces_of_runs (list): An iterable of :class:`RelatedTrace` for each run.
+        key (callable): Return the key to identify a trace of the runs.
+
+    Returns:
+        list: :class:`RelatedTrace` in descending order of size.
+    '''
+    runs = [{key(trace): trace for trace in traces} for traces in traces_of_runs]
+    keys = OrderedDict()
+    for run in runs:
+        keys.update(OrderedDict.fromkeys(run))
+
+    merged = list()
+    for k in keys:
+        traces = [run.get(k) for run in runs]
+        # A trace which is missing from a run has no memory in it.
+        sizes = [0 if trace is None else trace.size for trace in traces]
+        counts = [0 if trace is None else trace.count for trace in traces]
+        size = make_spread(sizes).median
+        if size:
+            trace = next(trace for trace in traces if trace is not None)
+            merged.append(trace._replace(size=size, count=make_spread(counts).median))
+
+    merged.sort(key=lambda trace: -trace.size)
+    return merged
+
+
+class TraceResult(object):
+    '''The result of a trace.
+
+    The result is immutable and does not hold the snapshot,
+    so it can be kept, compared and exported without re-tracing.
+
+    Args:
+        qualname (str): Qualified name of the target.
+        filepath (str): File path of the target.
+        lineno (int): First line number of the target.
+        target_lines (iterable): :class:`TargetLine` for each line of the target.
+        related_traces (iterable): :class:`RelatedTrace`.
+        total_size (int): Total size of all the traces.
+        total_count (int): Total number of memory blocks of all the traces.
+        num_runs (int): Number of runs summarized by the result.
+    '''
+    __slots__ = (
+        '_qualname', '_filepath', '_lineno',
+        '_target_lines', '_related_traces',
+        '_total_size', '_total_count', '_num_runs'
+    )
+
+    def __init__(
+        self,
+        qualname,
+        filepath,
+        lineno,
+        target_lines,
+        related_traces,
+        total_size,
+        total_count,
+        num_runs=1
+    ):
+        self._qualname = qualname
+        self._filepath = filepath
+        self._lineno = lineno
+        self._target_lines = tuple(make_target_line(line) for line in target_lines)
+        self._related_traces = tuple(RelatedTrace(*trace) for trace in related_traces)
+        self._total_size = total_size
+        self._total_count = total_count
+        self._num_runs = num_runs
+
+    def __repr__(self):
+        return '<TraceResult {} target_size={} total_size={}>'.format(
+            self._qualname,
+            self.target_size,
+            self._total_size
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, TraceResult):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    @property
+    def qualname(self):
+        return self._qualname
+
+    @property
+    def filepath(self):
+        return self._filepath
+
+    @property
+    def lineno(self):
+        return self._lineno
+
+    @property
+    def target_lines(self):
+        '''tuple: :class:`TargetLine` for each line of the target.'''
+        return self._target_lines
+
+    @property
+    def related_traces(self):
+        '''tuple: :class:`RelatedTrace` outside of the target.'''
+        return self._related_traces
+
+    @property
+    def total_size(self):
+        '''int: Total size of all the traces, including the filtered ones.'''
+        return self._total_size
+
+    @property
+    def total_count(self):
+        '''int: Total number of memory blocks of all the traces.'''
+        return self._total_count
+
+    @property
+    def num_runs(self):
+        '''int: Number of runs, the values are the medians over the runs if more than 1.'''
+        return self._num_runs
+
+    @property
+    def traced_lines(self):
+        '''tuple: :class:`TargetLine` which have a trace.'''
+        return tuple(line for line in self._target_lines if line.size is not None)
+
+    @property
+    def target_size(self):
+        '''int: Total size of the target traces.'''
+        return sum(line.size for line in self.traced_lines)
+
+    @property
+    def target_count(self):
+        '''int: Total number of memory blocks of the target traces.'''
+        return sum(line.count for line in self.traced_lines)
+
+    @property
+    def has_line_stats(self):
+        '''bool: True if the peak and the net delta were recorded.'''
+        return any(line.peak is not None for line in self._target_lines)
+
+    @property
+    def has_time(self):
+        '''bool: True if the elapsed time of each line was recorded.'''
+        return any(line.time is not None for line in self._target_lines)
+
+    @property
+    def has_churn(self):
+        '''bool: True if the churn was recorded.'''
+        return any(line.churn is not None for line in self._target_lines)
+
+    @property
+    def has_domains(self):
+        '''bool: True if memory was traced in other domains than the Python one.'''
+        return any(line.domains is not None for line in self._target_lines)
+
+    @property
+    def domain_names(self):
+        '''tuple: Names of the domains traced on the target lines.'''
+        names = OrderedDict()
+        for line in self._target_lines:
+            if line.domains is not None:
+                names.update(OrderedDict.fromkeys(line.domains))
+        return tuple(names)
+
+    @property
+    def has_native(self):
+        '''bool: True if the memory of the process was recorded.'''
+        return any(line.native is not None for line in self._target_lines)
+
+    def untraced_lines(self, threshold=NATIVE_THRESHOLD):
+        '''Return the lines whose native memory grows but whose traced memory does not.
+
+        Such lines allocate memory that tracemalloc cannot see,
+        such as the memory allocated by C extensions with `malloc`.
+
+        Args:
+            threshold (int): Native growth beyond the traced growth which is ignored.
+
+        Returns:
+            tuple: :class:`TargetLine`
+        '''
+        return tuple(
+            line for line in self._target_lines
+            if line.native is not None
+            and line.native - max(line.delta or 0, 0) > threshold
+        )
+
+    @property
+    def has_inclusive(self):
+        '''bool: True if the size allocated under each line was recorded.'''
+        return any(line.inclusive is not None for line in self._target_lines)
+
+    def unstable_lines(self, tolerance=0.0):
+        '''Return the lines whose allocations vary between the runs.
+
+        Args:
+            tolerance (float): Variation relative to the median which is ignored.
+
+        Returns:
+            tuple: :class:`TargetLine`
+        '''
+        def is_unstable(field, spread):
+            if field in NOISY_FIELDS:
+                return False
+            return spread.max - spread.min > tolerance * abs(spread.median)
+
+        return tuple(
+            line for line in self._target_lines
+            if line.spread is not None
+            and any(is_unstable(field, spread) for field, spread in line.spread.items())
+        )
+
+    @classmethod
+    def from_runs(cls, results):
+        '''Summarize the results of several runs of the same target.
+
+        Every value is the median over the runs, and the target lines hold
+        the spread of their values. A field which is recorded by some runs
+        is 0 in the runs which recorded nothing for the line, such as
+        the size of a cache which is filled by the first run only.
+
+        Args:
+            results (list): :class:`TraceResult` of each run.
+
+        Returns:
+            :class:`TraceResult`
+        '''
+        first = results[0]
+        if len(results) == 1:
+            return first
+
+        target_lines = list()
+        for index, line in enumerate(first.target_lines):
+            lines = [result.target_lines[index] for result in results]
+            spread = dict()
+            for field in SPREAD_FIELDS:
+                values = [getattr(line, field) for line in lines]
+                if any(value is not None for value in values):
+                    spread[field] = make_spread(0 if value is None else value for value in values)
+
+            callees = [line.callees for line in lines if line.callees is not None]
+            target_lines.append(line._replace(
+                callees=merge_traces(callees, key=lambda trace: trace[:2]) if callees else None,
+                domains=merge_domains(line.domains for line in lines),
+                spread=spread or None,
+                **{field: spread[field].median for field in spread}
+            ))
+
+        return cls(
+            qualname=first.qualname,
+            filepath=first.filepath,
+            lineno=first.lineno,
+            target_lines=target_lines,
+            related_traces=merge_traces(
+                [result.related_traces for result in results],
+                key=lambda trace: trace[:2]
+            ),
+            total_size=make_spread(result.total_size for result in results).median,
+            total_count=make_spread(result.total_count for result in results).median,
+            num_runs=len(results)
+        )
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'qualname': self._qualname,
+            'filepath': self._filepath,
+            'lineno': self._lineno,
+            'total_size': self._total_size,
+            'total_count': self._total_count,
+            'num_runs': self._num_runs,
+            'target_lines': [self._line_to_dict(line) for line in self._target_lines],
+            'related_traces': [trace._asdict() for trace in self._related_traces],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            qualname=d['qualname'],
+            filepath=d['filepath'],
+            lineno=d['lineno'],
+            target_lines=[TargetLine(**line) for line in d['target_lines']],
+            related_traces=[RelatedTrace(**trace) for trace in d['related_traces']],
+            total_size=d['total_size'],
+            total_count=d['total_count'],
+            num_runs=d.get('num_runs', 1)
+        )
+
+    def to_json(self, file=None, **kwargs):
+        '''Export as JSON.
+
+        Args:
+            file: A text stream. The JSON is returned as str if None.
+            **kwargs: Passed to `json.dump`.
+        '''
+        if file is None:
+            return json.dumps(self.to_dict(), **kwargs)
+        json.dump(self.to_dict(), file, **kwargs)
+
+    @classmethod
+    def from_json(cls, s):
+        '''Create from the JSON made by :meth:`to_json`.'''
+        return cls.from_dict(json.loads(s))
+
+    def to_ndjson(self, file=None):
+        '''Export as newline delimited JSON.
+
+        The first record describes the result and each following record
+        is a target line or a related trace, distinguished by `kind`.
+        '''
+        stream = io.StringIO() if file is None else file
+
+        header = self.to_dict()
+        del header['target_lines']
+        del header['related_traces']
+        header['kind'] = 'result'
+        stream.write(json.dumps(header) + '\n')
+
+        for kind, record in self._iter_records():
+            record['kind'] = kind
+            stream.write(json.dumps(record) + '\n')
+
+        if file is None:
+            return stream.getvalue()
+
+    def to_csv(self, file=None):
+        '''Export as CSV with a row for each target line and related trace.'''
+        stream = io.StringIO() if file is None else file
+
+        writer = csv.DictWriter(
+            stream,
+            fieldnames=CSV_FIELDS,
+            extrasaction='ignore',
+            lineterminator='\n'
+        )
+        writer.writeheader()
+        for kind, record in self._iter_records():
+            record['kind'] = kind
+            writer.writerow(record)
+
+        if file is None:
+            return stream.getvalue()
+
+    @staticmethod
+    def _line_to_dict(line):
+        d = line._asdict()
+        if line.callees is not None:
+            d['callees'] = [callee._asdict() for callee in line.callees]
+        if line.spread is not None:
+            d['spread'] = {field: list(spread) for field, spread in line.spread.items()}
+        return d
+
+    def _iter_records(self):
+        for line in self._target_lines:
+            record = self._line_to_dict(line)
+            record['filepath'] = self._filepath
+            yield 'target', record
+
+        for trace in self._related_traces:
+            yield 'related', trace._asdict()
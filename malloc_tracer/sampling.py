@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import time
+import heapq
+import inspect
+import random
+import itertools
+import functools
+import threading
+from .tracer import TraceRecorder, DUMMY_SRC_NAME, iscoroutinefunction
+from .engine import HookTracer
+
+
+__all__ = ['Sampler', 'SamplingProfile', 'sampling']
+
+
+class SamplingProfile(object):
+    '''Per-line allocations aggregated over the sampled calls.
+
+    The memory used is bounded by the number of lines of the target
+    and by `max_related_traces`.
+
+    Args:
+        max_related_traces (int): Number of related traces to keep,
+            the largest ones are kept.
+    '''
+    def __init__(self, max_related_traces=1000):
+        self._lock = threading.Lock()
+        self._max_related_traces = max_related_traces
+        self.reset()
+
+    @property
+    def num_samples(self):
+        return self._num_samples
+
+    def reset(self):
+        '''Discard all the samples.'''
+        with self._lock:
+            self._num_samples = 0
+            self._target_traces = dict()
+            self._related_traces = dict()
+            self._line_stats = dict()
+            self._line_churn = dict()
+            self._total_size = 0
+            self._total_count = 0
+
+    def add(self, recorder, line_stats, total_size, total_count, line_churn=None):
+        '''Add a sampled call.
+
+        Args:
+            recorder (:class:`TraceRecorder`):
+            line_stats (dict): The line stats of :class:`LineProbe`, or None.
+            total_size (int):
+            total_count (int):
+            line_churn (dict): The line churn of :class:`LineProbe`, or None.
+        '''
+        with self._lock:
+            self._num_samples += 1
+            self._total_size += total_size
+            self._total_count += total_count
+
+            for lineno, size, count in recorder.list_traces_for_each_file(DUMMY_SRC_NAME):
+                self._accumulate(self._target_traces, lineno, size, count)
+
+            for filepath, lineno, size, count in recorder.list_all_related_trace():
+                self._accumulate(self._related_traces, (filepath, lineno), size, count)
+
+            if line_stats is not None:
+                for lineno, (peak, delta) in line_stats.items():
+                    stat = self._line_stats.get(lineno)
+                    if stat is None:
+                        self._line_stats[lineno] = [peak, delta]
+                    else:
+                        stat[0] = max(stat[0], peak)
+                        stat[1] += delta
+
+            if line_churn is not None:
+                for lineno, (churn, hits) in line_churn.items():
+                    trace = self._line_churn.get(lineno)
+                    if trace is None:
+                        self._line_churn[lineno] = [churn, hits]
+                    else:
+                        # The churn is None unless every sample recorded it.
+                        trace[0] = None if churn is None or trace[0] is None else trace[0] + churn
+                        trace[1] += hits
+
+            if len(self._related_traces) > 2 * self._max_related_traces:
+                self._related_traces = dict(heapq.nlargest(
+                    self._max_related_traces,
+                    self._related_traces.items(),
+                    key=lambda item: item[1][0]
+                ))
+
+    @staticmethod
+    def _accumulate(traces, key, size, count):
+        trace = traces.get(key)
+        if trace is None:
+            traces[key] = [size, count]
+        else:
+            trace[0] += size
+            trace[1] += count
+
+    def average(self):
+        '''Average the samples.
+
+        The peaks are the maximum over the samples.
+
+        Returns:
+            tuple: :class:`TraceRecorder`, the line stats (or None),
+                the total size and the total number of memory blocks.
+        '''
+        with self._lock:
+            n = max(self._num_samples, 1)
+
+            recorder = TraceRecorder()
+            for lineno, (size, count) in self._target_traces.items():
+                recorder.add_trace(DUMMY_SRC_NAME, lineno, size // n, count // n)
+            for (filepath, lineno), (size, count) in self._related_traces.items():
+                recorder.add_trace(filepath, lineno, size // n, count // n)
+
+            if self._line_stats:
+                line_stats = {
+                    lineno: (peak, delta // n)
+                    for lineno, (peak, delta) in self._line_stats.items()
+                }
+            else:
+                line_stats = None
+
+            return recorder, line_stats, self._total_size // n, self._total_count // n
+
+    def average_churn(self):
+        '''Average the churn and the hits of the samples.
+
+        Returns:
+            dict: (churn, hits) for each line number, or None.
+        '''
+        with self._lock:
+            if not self._line_churn:
+                return None
+
+            n = max(self._num_samples, 1)
+            return {
+                lineno: (None if churn is None else churn // n, hits // n)
+                for lineno, (churn, hits) in self._line_churn.items()
+            }
+
+
+class Sampler(object):
+    '''Trace a fraction of the calls of a function.
+
+    Exactly one of `rate`, `every` and `interval` must be specified.
+    The calls that are not sampled run the original function, and
+    only one call is sampled at a time. By default the sampled calls run
+    the original code as well, with its globals (see :class:`HookTracer`),
+    so that sampling does not change what the function does.
+    Generator functions and coroutine functions, whose calls return
+    before they run, are not supported.
+
+    Args:
+        function: A function. It is traced without its decorators.
+        rate (float): Probability for a call to be sampled.
+        every (int): Sample one call every `every` calls.
+        interval (float): Sample at most one call every `interval` seconds.
+        enable_auto_resolve (bool): See :class:`Tracer`.
+        enable_line_probe (bool):
+        include_patterns (set): Specify patterns of file paths to include in the output.
+        exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+        max_related_traces (int): Number of related traces to keep.
+        tracer_class: :class:`HookTracer`, or :class:`Tracer` whose calls
+            run the instrumented copy of the function in its own namespace.
+    '''
+    def __init__(
+        self,
+        function,
+        rate=None,
+        every=None,
+        interval=None,
+        enable_auto_resolve=True,
+        enable_line_probe=False,
+        include_patterns=None,
+        exclude_patterns=None,
+        max_related_traces=1000,
+        tracer_class=HookTracer
+    ):
+        if inspect.isgeneratorfunction(function) or iscoroutinefunction(function):
+            raise TypeError('The function must not be a generator or a coroutine function.')
+
+        if [rate, every, interval].count(None) != 2:
+            raise ValueError('Specify exactly one of rate, every and interval.')
+
+        if rate is not None:
+            if not 0.0 <= rate <= 1.0:
+                raise ValueError('The rate must be in [0, 1].')
+        elif every is not None:
+            if every < 1:
+                raise ValueError('The every must be a positive integer.')
+
+        self._function = function
+        self._rate = rate
+        self._every = every
+        self._interval = interval
+        self._enable_auto_resolve = enable_auto_resolve
+        self._enable_line_probe = enable_line_probe
+        self._include_patterns = include_patterns
+        self._exclude_patterns = exclude_patterns
+        self._tracer_class = tracer_class
+
+        self._calls = itertools.count(1)
+        self._next_time = time.monotonic()
+        self._tracer = None
+        self._lock = threading.Lock()
+        self.profile = SamplingProfile(max_related_traces=max_related_traces)
+        self.should_sample = self._make_predicate()
+
+    def _make_predicate(self):
+        '''Make the function that decides whether to sample the next call.'''
+        calls = self._calls
+        if self._rate is not None:
+            rate = self._rate
+            uniform = random.random
+
+            def should_sample():
+                next(calls)
+                return uniform() < rate
+        elif self._every is not None:
+            every = self._every
+
+            def should_sample():
+                return next(calls) % every == 0
+        else:
+            monotonic = time.monotonic
+
+            def should_sample():
+                next(calls)
+                return monotonic() >= self._next_time
+
+        return should_sample
+
+    def _get_tracer(self):
+        # Instrument lazily, so that decorated functions cost nothing until sampled.
+        if self._tracer is None:
+            self._tracer = self._tracer_class(
+                self._function,
+                enable_auto_resolve=self._enable_auto_resolve,
+                enable_line_probe=self._enable_line_probe,
+                strip_decorators=True
+            )
+
+        return self._tracer
+
+    def call(self, args, kwargs):
+        '''Call the function, traced if no other call is being traced.'''
+        if not self._lock.acquire(False):
+            return self._function(*args, **kwargs)
+
+        try:
+            if self._interval is not None:
+                self._next_time = time.monotonic() + self._interval
+
+            tracer = self._get_tracer()
+            ret, capture = tracer._call(args, kwargs)
+            recorder, total_size, total_count = tracer._record(
+                capture,
+                include_patterns=self._include_patterns,
+                exclude_patterns=self._exclude_patterns
+            )
+            self.profile.add(
+                recorder,
+                capture.line_stats,
+                total_size,
+                total_count,
+                line_churn=capture.line_churn
+            )
+
+            return ret
+        finally:
+            self._lock.release()
+
+    def dump(self):
+        '''Return the profile averaged per sampled call.
+
+        Returns:
+            :class:`TraceResult`: None if no call has been sampled.
+        '''
+        if self._tracer is None or self.profile.num_samples == 0:
+            return None
+
+        recorder, line_stats, total_size, total_count = self.profile.average()
+        return self._tracer._make_result(
+            recorder=recorder,
+            line_stats=line_stats,
+            total_size=total_size,
+            total_count=total_count,
+            line_churn=self.profile.average_churn()
+        )
+
+
+def sampling(
+    rate=None,
+    every=None,
+    interval=None,
+    **kwargs
+):
+    '''Decorator to trace a fraction of the calls of a function.
+
+    The decorated function has the :class:`Sampler` as `sampler` attribute.
+    The decorator should be applied directly to the function,
+    since the sampled calls run the function without its decorators.
+
+    Args:
+        rate (float): Probability for a call to be sampled.
+        every (int): Sample one call every `every` calls.
+        interval (float): Sample at most one call every `interval` seconds.
+        **kwargs: Passed to :class:`Sampler`.
+    '''
+    def decorator(function):
+        sampler = Sampler(function, rate=rate, every=every, interval=interval, **kwargs)
+        should_sample = sampler.should_sample
+        call = sampler.call
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if should_sample():
+                return call(args, kwargs)
+            return function(*args, **kwargs)
+
+        wrapper.sampler = sampler
+        return wrapper
+
+    return decorator
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import math
+from enum import Enum
+from collections import namedtuple
+from .tracer import Tracer, reset_peak
+from .result import TraceResult
+
+
+__all__ = ['Complexity', 'LineGrowth', 'ScalingResult', 'geometric_sizes', 'fit_growth', 'scaling']
+
+
+class Complexity(Enum):
+    '''Growth models of the memory, from the slowest to the fastest.'''
+    CONSTANT = 0  #: O(1)
+    LINEAR = 1  #: O(n)
+    LINEARITHMIC = 2  #: O(n log n)
+    QUADRATIC = 3  #: O(n^2)
+
+    def __str__(self):
+        return COMPLEXITY_NOTATIONS[self]
+
+
+COMPLEXITY_NOTATIONS = {
+    Complexity.CONSTANT: 'O(1)',
+    Complexity.LINEAR: 'O(n)',
+    Complexity.LINEARITHMIC: 'O(n log n)',
+    Complexity.QUADRATIC: 'O(n^2)',
+}
+
+# The fields of a target line which are recorded by the line probe.
+PROBE_FIELDS = ('peak', 'delta', 'churn', 'hits')
+
+GROWTH_FUNCTIONS = (
+    (Complexity.LINEAR, lambda n: n),
+    (Complexity.LINEARITHMIC, lambda n: n * math.log(n)),
+    (Complexity.QUADRATIC, lambda n: n * n),
+)
+
+
+LineGrowth = namedtuple(
+    'LineGrowth',
+    ('lineno', 'contents', 'values', 'complexity', 'intercept', 'slope')
+)
+LineGrowth.__doc__ = '''The growth of a line of the target.
+
+`values` has an element for each input size, and the line is modeled as
+`intercept + slope * g(n)` where `g` is the growth function of `complexity`.
+'''
+
+
+def geometric_sizes(start=2**6, stop=2**14, factor=2):
+    '''Return the geometric sequence of input sizes from `start` up to `stop`.'''
+    if start < 1 or factor <= 1:
+        raise ValueError('The start must be positive and the factor must be greater than 1.')
+
+    sizes = list()
+    n = start
+    while n <= stop:
+        sizes.append(int(n))
+        n *= factor
+
+    return sizes
+
+
+def _fit_line(xs, ys, ws):
+    '''Weighted least squares fit of `y = a + b * x`, returns (a, b, residual).'''
+    sum_w = sum(ws)
+    mean_x = sum(w * x for x, w in zip(xs, ws)) / sum_w
+    mean_y = sum(w * y for y, w in zip(ys, ws)) / sum_w
+    var_x = sum(w * (x - mean_x) ** 2 for x, w in zip(xs, ws))
+    if var_x == 0:
+        b = 0.0
+    else:
+        b = sum(w * (x - mean_x) * (y - mean_y) for x, y, w in zip(xs, ys, ws)) / var_x
+    a = mean_y - b * mean_x
+    residual = sum(w * (y - a - b * x) ** 2 for x, y, w in zip(xs, ys, ws))
+    return a, b, residual
+
+
+def fit_growth(sizes, values, tolerance=0.1, min_growth=256):
+    '''Fit the growth models to the values and choose the best one.
+
+    The residuals are relative to the values, so that the small sizes of
+    a geometric sweep weigh as much as the large ones. The simplest model
+    is chosen among the models whose residual is within `tolerance` of
+    the smallest residual, so that noise does not promote a line to
+    a faster growth.
+
+    Args:
+        sizes (list): Input sizes.
+        values (list): Bytes for each input size. None is regarded as 0.
+        tolerance (float): Relative tolerance on the residual.
+        min_growth (int): Lines which vary less than this many bytes are constant.
+
+    Returns:
+        tuple: (complexity, intercept, slope)
+    '''
+    ys = [0 if value is None else value for value in values]
+    if len(sizes) < 3:
+        raise ValueError('At least 3 input sizes are required.')
+
+    if max(ys) - min(ys) <= min_growth:
+        return Complexity.CONSTANT, sum(ys) / len(ys), 0.0
+
+    ws = [1.0 / max(abs(y), min_growth) ** 2 for y in ys]
+    a, _, residual = _fit_line([0] * len(sizes), ys, ws)
+    fits = [(Complexity.CONSTANT, a, 0.0, residual)]
+    for complexity, function in GROWTH_FUNCTIONS:
+        a, b, residual = _fit_line([function(n) for n in sizes], ys, ws)
+        # A model of decreasing memory describes nothing.
+        if b > 0:
+            fits.append((complexity, a, b, residual))
+
+    best = min(fit[3] for fit in fits)
+    for complexity, a, b, residual in fits:
+        if residual <= best * (1 + tolerance):
+            return complexity, a, b
+
+
+class ScalingResult(object):
+    '''The results of a target traced over increasing input sizes.
+
+    Args:
+        sizes (iterable): Input sizes.
+        results (iterable): :class:`TraceResult` of each input size.
+        field (str): A field of :class:`TargetLine` to fit.
+        tolerance (float): See :func:`fit_growth`.
+        min_growth (int): See :func:`fit_growth`.
+    '''
+    __slots__ = ('_sizes', '_results', '_field', '_lines')
+
+    def __init__(self, sizes, results, field='size', tolerance=0.1, min_growth=256):
+        self._sizes = tuple(sizes)
+        self._results = tuple(results)
+        self._field = field
+        if len(self._sizes) != len(self._results):
+            raise ValueError('The number of sizes and results must be the same.')
+
+        self._lines = self._fit(tolerance, min_growth)
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def sizes(self):
+        return self._sizes
+
+    @property
+    def results(self):
+        return self._results
+
+    @property
+    def field(self):
+        return self._field
+
+    @property
+    def lines(self):
+        '''tuple: :class:`LineGrowth` for each line of the target.'''
+        return self._lines
+
+    def _fit(self, tolerance, min_growth):
+        if not self._results:
+            return tuple()
+
+        lines = list()
+        for index, line in enumerate(self._results[0].target_lines):
+            values = tuple(
+                getattr(result.target_lines[index], self._field)
+                for result in self._results
+            )
+            complexity, intercept, slope = fit_growth(
+                self._sizes,
+                values,
+                tolerance=tolerance,
+                min_growth=min_growth
+            )
+            lines.append(LineGrowth(
+                lineno=line.lineno,
+                contents=line.contents,
+                values=values,
+                complexity=complexity,
+                intercept=intercept,
+                slope=slope
+            ))
+
+        return tuple(lines)
+
+    def exceeding(self, expected=Complexity.LINEAR):
+        '''Return the lines which grow faster than `expected`.
+
+        Args:
+            expected (:class:`Complexity`):
+
+        Returns:
+            tuple: :class:`LineGrowth`
+        '''
+        return tuple(
+            line for line in self._lines
+            if line.complexity.value > expected.value
+        )
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'sizes': list(self._sizes),
+            'field': self._field,
+            'results': [result.to_dict() for result in self._results],
+        }
+
+    @classmethod
+    def from_dict(cls, d, **kwargs):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            sizes=d['sizes'],
+            results=[TraceResult.from_dict(result) for result in d['results']],
+            field=d['field'],
+            **kwargs
+        )
+
+
+def scaling(
+    function_or_method,
+    make_target_args,
+    sizes=None,
+    *,
+    enable_auto_resolve=True,
+    ctime_setup='pass',
+    rtime_setup='pass',
+    nframe=1,
+    enable_line_probe=False,
+    include_patterns=None,
+    exclude_patterns=None,
+    repeat=1,
+    warmup=0,
+    field='size',
+    tolerance=0.1,
+    min_growth=256
+):
+    '''Trace the target over increasing input sizes and fit the growth of each line.
+
+    Args:
+        function_or_method:
+        make_target_args (callable): Return `target_args` for an input size.
+        sizes (iterable): Input sizes. :func:`geometric_sizes` is used if None.
+        enable_auto_resolve (bool):
+        ctime_setup (str):
+        rtime_setup (str):
+        nframe (int):
+        enable_line_probe (bool):
+        include_patterns (set):
+        exclude_patterns (set):
+        repeat (int): Number of traced runs of each input size.
+        warmup (int): Number of runs discarded before the traced ones.
+        field (str): A field of :class:`TargetLine` to fit.
+            'inclusive' requires `nframe` greater than 1, and 'peak',
+            'delta', 'churn' and 'hits' require `enable_line_probe`.
+            'churn' also requires Python 3.9+.
+        tolerance (float): See :func:`fit_growth`.
+        min_growth (int): See :func:`fit_growth`.
+
+    Returns:
+        :class:`ScalingResult`
+
+    Raises:
+        ValueError: If the field is not recorded by the runs.
+    '''
+    if field in PROBE_FIELDS and not enable_line_probe:
+        raise ValueError('The field {} requires enable_line_probe.'.format(field))
+    if field == 'churn' and reset_peak is None:
+        raise ValueError('The field churn requires tracemalloc.reset_peak (Python 3.9+).')
+    if field == 'inclusive' and nframe < 2:
+        raise ValueError('The field inclusive requires nframe greater than 1.')
+    if field not in PROBE_FIELDS + ('size', 'count', 'inclusive'):
+        raise ValueError('The field {} is not recorded by the traced runs.'.format(field))
+
+    sizes = geometric_sizes() if sizes is None else list(sizes)
+
+    tracer = Tracer(
+        function_or_method,
+        enable_auto_resolve=enable_auto_resolve,
+        setup=ctime_setup,
+        enable_line_probe=enable_line_probe,
+        nframe=nframe
+    )
+    results = [
+        tracer.run(
+            target_args=make_target_args(n),
+            setup=rtime_setup,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            repeat=repeat,
+            warmup=warmup
+        )
+        for n in sizes
+    ]
+
+    return ScalingResult(
+        sizes,
+        results,
+        field=field,
+        tolerance=tolerance,
+        min_growth=min_growth
+    )
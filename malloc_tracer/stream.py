@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import csv
+import json
+from collections import namedtuple, deque
+from tracemalloc import get_traced_memory
+from .tracer import HOOK_FILENAMES
+from .result import TraceResult
+from .scaling import fit_growth
+
+
+__all__ = ['ItemTrace', 'StreamResult', 'TracedStream']
+
+
+ItemTrace = namedtuple('ItemTrace', ('index', 'delta', 'retained', 'lines'))
+ItemTrace.__doc__ = '''The memory of a generator while it produced an item.
+
+`delta` is the net change of the traced memory while the generator ran
+for the item, which includes the item itself. `retained` is the traced
+memory when the item was yielded, above the level at which the generator
+started. It includes what the caller kept of the previous items, so the
+caller should release them, as the next stage of a pipeline does.
+`lines` maps the line numbers of the lines which ran for the item to
+their (delta, churn), or is None if the line probe is disabled. The churn
+is None if the probe did not record it (see :attr:`LineProbe.line_churn`).
+'''
+
+ITEM_FIELDS = ('index', 'delta', 'retained')
+
+
+class StreamResult(object):
+    '''The result of a generator traced while it was iterated.
+
+    A stage of a pipeline which streams retains the same memory whatever
+    the number of items; one which buffers retains more with every item.
+
+    Args:
+        result (:class:`TraceResult`): The result of the whole generator.
+        items (iterable): :class:`ItemTrace` of the items which were kept.
+        num_items (int): Number of items, including those dropped.
+    '''
+    __slots__ = ('_result', '_items', '_num_items')
+
+    def __init__(self, result, items, num_items=None):
+        self._result = result
+        self._items = tuple(ItemTrace(*item) for item in items)
+        self._num_items = len(self._items) if num_items is None else num_items
+
+    def __repr__(self):
+        return '<StreamResult {} items={} retained={}>'.format(
+            self._result.qualname,
+            self._num_items,
+            self.retained
+        )
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def result(self):
+        ''':class:`TraceResult` of the whole generator.'''
+        return self._result
+
+    @property
+    def items(self):
+        '''tuple: :class:`ItemTrace` in the order they were yielded.'''
+        return self._items
+
+    @property
+    def num_items(self):
+        '''int: Number of items yielded, including those dropped.'''
+        return self._num_items
+
+    @property
+    def num_dropped(self):
+        '''int: Number of the oldest items dropped from the ring buffer.'''
+        return self._num_items - len(self._items)
+
+    @property
+    def retained(self):
+        '''int: The memory retained by the generator after the last item.'''
+        return self._items[-1].retained if self._items else 0
+
+    def contents(self, lineno):
+        '''Return the contents of a line of the target, or an empty string.'''
+        index = lineno - self._result.lineno
+        if 0 <= index < len(self._result.target_lines):
+            return self._result.target_lines[index].contents
+        return ''
+
+    def growth(self, warmup=1, tolerance=0.1, min_growth=256):
+        '''Fit the retained memory to the number of items.
+
+        Args:
+            warmup (int): Number of the first items which are not fitted,
+                which pay for the state that the generator sets up.
+            tolerance (float): See :func:`fit_growth`.
+            min_growth (int): See :func:`fit_growth`.
+
+        Returns:
+            tuple: (complexity, intercept, slope). The slope of a linear
+                growth is the memory buffered for each item.
+
+        Raises:
+            ValueError: If less than 3 items are fitted.
+        '''
+        items = [item for item in self._items if item.index >= warmup]
+        return fit_growth(
+            [item.index + 1 for item in items],
+            [item.retained for item in items],
+            tolerance=tolerance,
+            min_growth=min_growth
+        )
+
+    def lines(self):
+        '''Summarize the lines over the items.
+
+        Returns:
+            list: (lineno, number of items, total delta, highest delta of an item,
+                total churn or None) of the lines which ran for the items, in order
+                of lines. Empty if the line probe is disabled.
+        '''
+        lines = dict()
+        for item in self._items:
+            for lineno, (delta, churn) in (item.lines or dict()).items():
+                line = lines.get(lineno)
+                if line is None:
+                    lines[lineno] = [1, delta, delta, churn]
+                else:
+                    line[0] += 1
+                    line[1] += delta
+                    line[2] = max(line[2], delta)
+                    if churn is not None:
+                        line[3] += churn
+
+        return [(lineno, ) + tuple(line) for lineno, line in sorted(lines.items())]
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'result': self._result.to_dict(),
+            'items': [
+                {
+                    'index': item.index,
+                    'delta': item.delta,
+                    'retained': item.retained,
+                    'lines': None if item.lines is None else [
+                        [lineno, delta, churn]
+                        for lineno, (delta, churn) in sorted(item.lines.items())
+                    ],
+                }
+                for item in self._items
+            ],
+            'num_items': self._num_items,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            result=TraceResult.from_dict(d['result']),
+            items=[
+                ItemTrace(
+                    index=item['index'],
+                    delta=item['delta'],
+                    retained=item['retained'],
+                    lines=None if item['lines'] is None else {
+                        lineno: (delta, churn) for lineno, delta, churn in item['lines']
+                    }
+                )
+                for item in d['items']
+            ],
+            num_items=d['num_items']
+        )
+
+    def to_json(self, file=None, **kwargs):
+        '''Export as JSON.
+
+        Args:
+            file: A text stream. The JSON is returned as str if None.
+            **kwargs: Passed to `json.dump`.
+        '''
+        if file is None:
+            return json.dumps(self.to_dict(), **kwargs)
+        json.dump(self.to_dict(), file, **kwargs)
+
+    @classmethod
+    def from_json(cls, s):
+        '''Create from the JSON made by :meth:`to_json`.'''
+        return cls.from_dict(json.loads(s))
+
+    def to_csv(self, file=None):
+        '''Export as CSV with a row for each item, ready to be plotted.'''
+        stream = io.StringIO() if file is None else file
+
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(ITEM_FIELDS)
+        for item in self._items:
+            writer.writerow((item.index, item.delta, item.retained))
+
+        if file is None:
+            return stream.getvalue()
+
+
+class TracedStream(object):
+    '''Trace a generator function while the caller iterates it.
+
+    The generator is driven lazily by the caller, which receives the items
+    as they are yielded::
+
+        with malloc_tracer.TracedStream(tracer, target_args=dict(path=path)) as rows:
+            for row in rows:
+                load(row)
+        result = rows.result()
+
+    The memory of the generator is recorded for each item. The caller is not
+    charged: the line probe is suspended while the caller holds an item, and
+    if the tracebacks have several frames (`nframe`), only the traces
+    allocated under the generator are kept in the snapshot.
+
+    Args:
+        tracer (:class:`Tracer`): The tracer of a generator function.
+        target_args (dict):
+        setup (str): Run-time dependencies.
+            This parameter is ignored if enable_auto_resolve is enabled.
+        capacity (int): Number of the most recent items which are kept.
+    '''
+    def __init__(self, tracer, target_args=None, setup='pass', capacity=100000):
+        if not tracer.is_generator_function:
+            raise TypeError('The target is not a generator function.')
+
+        function, self._call, self._probe = tracer._bind(setup=setup)
+        self._tracer = tracer
+        self._generator = function(**({} if target_args is None else target_args))
+        self._lineno_offset = tracer.metadata.lineno - 1
+        self._items = deque(maxlen=capacity)
+        self._num_items = 0
+        self._baseline = None
+        self._overhead = 0
+        self._current = 0
+        self._traced = 0
+        self._line_stats = dict()
+        self._done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+
+        # The readings are kept in attributes, so that each one is freed
+        # in the same window as it is allocated, by the next reading.
+        self._current = get_traced_memory()[0]
+        if self._baseline is None:
+            # The traced memory is 0 until the generator starts tracing.
+            self._baseline = self._current
+
+        self._probe.resume()
+        try:
+            item = next(self._generator)
+        except BaseException:
+            # The generator returned or raised, and took the snapshot.
+            self._done = True
+            raise
+        self._probe.suspend()
+
+        self._traced = get_traced_memory()[0]
+        self._items.append(ItemTrace(
+            index=self._num_items,
+            delta=self._traced - self._current,
+            retained=self._traced - self._baseline - self._overhead,
+            lines=self._diff_lines() if self._tracer.enable_line_probe else None
+        ))
+        self._num_items += 1
+        # The records of the items are not retained by the generator.
+        self._overhead += get_traced_memory()[0] - self._traced
+
+        return item
+
+    def _diff_lines(self):
+        '''Return the (delta, churn) of the lines which ran since the previous item.'''
+        line_stats = self._probe.line_stats
+        line_churn = self._probe.line_churn
+
+        lines = dict()
+        for lineno, (_, delta) in line_stats.items():
+            churn, hits = line_churn[lineno]
+            recorded = churn is not None
+            previous = self._line_stats.get(lineno, (0, 0, 0))
+            diff = (delta - previous[0], (churn or 0) - previous[1], hits - previous[2])
+            if any(diff):
+                lines[self._lineno_offset + lineno] = (diff[0], diff[1] if recorded else None)
+                # Keep the sums rather than the values of the probe, which the
+                # generator replaces: they would be freed outside of its window.
+                self._line_stats[lineno] = tuple(map(sum, zip(previous, diff)))
+
+        return lines
+
+    def close(self):
+        '''Close the generator if the caller did not exhaust it.'''
+        if not self._done:
+            self._done = True
+            self._generator.close()
+
+    def result(
+        self,
+        include_patterns=None,
+        exclude_patterns=None,
+        include_domains=None,
+        exclude_domains=None
+    ):
+        '''Close the generator and return the result.
+
+        Args:
+            include_patterns (set): Specify patterns of file paths to include in the output.
+            exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+            include_domains (set): Specify tracemalloc domains to include in the output.
+            exclude_domains (set): Specify tracemalloc domains to exclude in the output.
+
+        Returns:
+            :class:`StreamResult`
+
+        Raises:
+            ValueError: If the generator was closed before it started.
+        '''
+        self.close()
+        if self._call.snapshot is None:
+            raise ValueError('The generator was closed before it started.')
+
+        capture = self._tracer._capture(self._call, self._probe, shared=self._num_items > 0)
+        result = self._tracer._analyze(
+            capture,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains
+        )
+        return StreamResult(result, self._items, self._num_items)
+
+
+HOOK_FILENAMES.add(TracedStream.__next__.__code__.co_filename)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import csv
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from .tracer import Tracer, SESSION
+from .result import TraceResult
+
+
+__all__ = ['SweepResult', 'sweep']
+
+
+def _trace_in_worker(function_or_method, tracer_class, tracer_kwargs, run_kwargs):
+    '''Trace the target in a worker process and return the result as a dict.'''
+    # A forked worker inherits the tracemalloc state of the parent.
+    if tracemalloc.is_tracing() and not SESSION.active:
+        tracemalloc.stop()
+
+    tracer = tracer_class(function_or_method, **tracer_kwargs)
+    return tracer.run(**run_kwargs).to_dict()
+
+
+class SweepResult(object):
+    '''The results of a target traced over several configurations.
+
+    Args:
+        configurations (iterable): `target_args` of each configuration.
+        results (iterable): :class:`TraceResult` of each configuration.
+    '''
+    __slots__ = ('_configurations', '_results')
+
+    def __init__(self, configurations, results):
+        self._configurations = tuple(configurations)
+        self._results = tuple(results)
+        if len(self._configurations) != len(self._results):
+            raise ValueError('The number of configurations and results must be the same.')
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def configurations(self):
+        return self._configurations
+
+    @property
+    def results(self):
+        return self._results
+
+    def matrix(self, field='size'):
+        '''Make a matrix of lines by configurations.
+
+        Args:
+            field (str): A field of :class:`TargetLine`.
+
+        Returns:
+            list: (lineno, contents, values) for each line of the target,
+                where values has an element for each configuration.
+        '''
+        if not self._results:
+            return list()
+
+        rows = list()
+        for index, line in enumerate(self._results[0].target_lines):
+            values = tuple(
+                getattr(result.target_lines[index], field)
+                for result in self._results
+            )
+            rows.append((line.lineno, line.contents, values))
+
+        return rows
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'configurations': [dict(configuration) for configuration in self._configurations],
+            'results': [result.to_dict() for result in self._results],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            configurations=d['configurations'],
+            results=[TraceResult.from_dict(result) for result in d['results']]
+        )
+
+    def to_csv(self, file=None, field='size'):
+        '''Export the matrix as CSV with a column for each configuration.'''
+        stream = io.StringIO() if file is None else file
+
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(
+            ['lineno', 'contents']
+            + [repr(configuration) for configuration in self._configurations]
+        )
+        for lineno, contents, values in self.matrix(field=field):
+            writer.writerow([lineno, contents] + ['' if value is None else value for value in values])
+
+        if file is None:
+            return stream.getvalue()
+
+
+def sweep(
+    function_or_method,
+    target_args_list,
+    *,
+    enable_auto_resolve=True,
+    ctime_setup='pass',
+    rtime_setup='pass',
+    enable_line_probe=False,
+    nframe=1,
+    include_patterns=None,
+    exclude_patterns=None,
+    repeat=1,
+    warmup=0,
+    max_workers=None,
+    mp_context=None,
+    tracer_class=Tracer
+):
+    '''Trace the target for each of `target_args_list` in a process pool.
+
+    Each configuration is traced in a worker with its own tracemalloc state,
+    and only the compact result is sent back to the parent.
+    The target must be picklable, for example a module level function.
+
+    Args:
+        function_or_method:
+        target_args_list (iterable): `target_args` of each configuration.
+        enable_auto_resolve (bool):
+        ctime_setup (str):
+        rtime_setup (str):
+        enable_line_probe (bool):
+        nframe (int):
+        include_patterns (set):
+        exclude_patterns (set):
+        repeat (int): Number of traced runs of each configuration.
+        warmup (int): Number of runs discarded before the traced ones.
+        max_workers (int): Passed to `concurrent.futures.ProcessPoolExecutor`.
+        mp_context: Passed to `concurrent.futures.ProcessPoolExecutor`.
+        tracer_class: :class:`Tracer` or a subclass such as :class:`HookTracer`.
+
+    Returns:
+        :class:`SweepResult`
+    '''
+    configurations = [dict(target_args) for target_args in target_args_list]
+    tracer_kwargs = dict(
+        enable_auto_resolve=enable_auto_resolve,
+        setup=ctime_setup,
+        enable_line_probe=enable_line_probe,
+        nframe=nframe
+    )
+
+    executor_kwargs = dict(max_workers=max_workers)
+    if mp_context is not None:
+        executor_kwargs['mp_context'] = mp_context
+
+    with ProcessPoolExecutor(**executor_kwargs) as executor:
+        futures = [
+            executor.submit(
+                _trace_in_worker,
+                function_or_method,
+                tracer_class,
+                tracer_kwargs,
+                dict(
+                    target_args=configuration,
+                    setup=rtime_setup,
+                    include_patterns=include_patterns,
+                    exclude_patterns=exclude_patterns,
+                    repeat=repeat,
+                    warmup=warmup
+                )
+            )
+            for configuration in configurations
+        ]
+        results = [TraceResult.from_dict(future.result()) for future in futures]
+
+    return SweepResult(configurations, results)
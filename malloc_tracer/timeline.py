@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import sys
+import csv
+import json
+import threading
+from time import perf_counter
+from collections import namedtuple, deque
+from tracemalloc import is_tracing, get_traced_memory
+try:
+    from tracemalloc import reset_peak
+except ImportError:  # Python < 3.9
+    reset_peak = None
+
+
+__all__ = ['Timeline', 'TimelineSample', 'TimelineSampler']
+
+
+TimelineSample = namedtuple('TimelineSample', ('time', 'current', 'peak', 'lineno'))
+TimelineSample.__doc__ = '''The traced memory at a point of the call.
+
+`time` is the time in seconds since the sampler started, `current` is the
+traced memory and `peak` is the highest traced memory since the previous
+sample (since tracemalloc started, without `tracemalloc.reset_peak` or if
+the peak belongs to someone else).
+`lineno` is the line of the target which was executing, or None if the
+target was not on the stack.
+'''
+
+TIMELINE_FIELDS = TimelineSample._fields + ('contents', )
+
+
+class TimelineSampler(object):
+    '''Sample the traced memory of a thread at a fixed interval.
+
+    The samples are taken by a background thread, and kept in a ring buffer
+    which holds the most recent ones. They are also written to the file,
+    as newline delimited JSON, if any.
+
+    Args:
+        thread_id (int): Identifier of the thread which runs the target.
+        filename (str): File name of the code of the target.
+        interval (float): Interval between the samples in seconds.
+        capacity (int): Number of samples kept in the ring buffer.
+        file: A text stream which receives every sample.
+        lineno_offset (int): Added to the line numbers of the code.
+        hook_filename (str): File name of the hooks called by the target.
+            The samples taken in the hooks, such as while the snapshot
+            is taken, are discarded.
+        owns_peak (callable): Return True if the peak of tracemalloc may be
+            reset. The peak of a session started by the application is left alone.
+    '''
+    def __init__(
+        self,
+        thread_id,
+        filename,
+        interval=0.01,
+        capacity=100000,
+        file=None,
+        lineno_offset=0,
+        hook_filename=None,
+        owns_peak=None
+    ):
+        if interval <= 0 or capacity < 1:
+            raise ValueError('The interval and the capacity must be positive.')
+
+        self._thread_id = thread_id
+        self._filename = filename
+        self._interval = interval
+        self._samples = deque(maxlen=capacity)
+        self._num_samples = 0
+        self._file = file
+        self._lineno_offset = lineno_offset
+        self._hook_filename = hook_filename
+        self._owns_peak = owns_peak
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def samples(self):
+        '''tuple: :class:`TimelineSample` in the ring buffer.'''
+        return tuple(self._samples)
+
+    @property
+    def num_samples(self):
+        '''int: Number of samples taken, including those dropped from the ring buffer.'''
+        return self._num_samples
+
+    def start(self):
+        '''Start sampling in a background thread.'''
+        if self._thread is not None:
+            raise RuntimeError('The sampler has already been started.')
+
+        self._start_time = perf_counter()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='malloc_tracer-timeline')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Take the last sample and stop sampling.'''
+        if self._thread is None:
+            raise RuntimeError('The sampler has not been started.')
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self._sample()
+
+    def _find_lineno(self):
+        '''Return the line of the target which the thread is executing.
+
+        Returns:
+            tuple: The line number, None if the target is not on the stack,
+                and True if the thread is in the hooks.
+        '''
+        in_hooks = False
+        frame = sys._current_frames().get(self._thread_id)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename == self._filename:
+                return frame.f_lineno + self._lineno_offset, in_hooks
+            if filename == self._hook_filename:
+                in_hooks = True
+            frame = frame.f_back
+        return None, in_hooks
+
+    def _sample(self):
+        if not is_tracing():
+            return
+
+        lineno, in_hooks = self._find_lineno()
+        if in_hooks:
+            return
+
+        current, peak = get_traced_memory()
+        if reset_peak is not None and (self._owns_peak is None or self._owns_peak()):
+            reset_peak()
+        sample = TimelineSample(
+            time=perf_counter() - self._start_time,
+            current=current,
+            peak=peak,
+            lineno=lineno
+        )
+        self._samples.append(sample)
+        self._num_samples += 1
+
+        if self._file is not None:
+            self._file.write(json.dumps(sample._asdict()) + '\n')
+
+
+def find_peaks(samples):
+    '''Return the samples whose traced memory is a local maximum.'''
+    peaks = list()
+    for index, sample in enumerate(samples):
+        previous = samples[index - 1].current if index > 0 else None
+        following = samples[index + 1].current if index + 1 < len(samples) else None
+        if (previous is None or sample.current >= previous) \
+                and (following is None or sample.current > following):
+            peaks.append(sample)
+
+    return peaks
+
+
+class Timeline(object):
+    '''The traced memory over the time of a call.
+
+    Args:
+        qualname (str): Qualified name of the target.
+        filepath (str): File path of the target.
+        lineno (int): First line number of the target.
+        source_lines (iterable): The lines of the target.
+        samples (iterable): :class:`TimelineSample`.
+        interval (float): Interval between the samples in seconds.
+        num_samples (int): Number of samples taken, including those dropped.
+    '''
+    __slots__ = (
+        '_qualname', '_filepath', '_lineno', '_source_lines',
+        '_samples', '_interval', '_num_samples'
+    )
+
+    def __init__(
+        self,
+        qualname,
+        filepath,
+        lineno,
+        source_lines,
+        samples,
+        interval,
+        num_samples=None
+    ):
+        self._qualname = qualname
+        self._filepath = filepath
+        self._lineno = lineno
+        self._source_lines = tuple(source_lines)
+        self._samples = tuple(TimelineSample(*sample) for sample in samples)
+        self._interval = interval
+        self._num_samples = len(self._samples) if num_samples is None else num_samples
+
+    def __repr__(self):
+        return '<Timeline {} samples={} max_current={}>'.format(
+            self._qualname,
+            len(self._samples),
+            self.max_current
+        )
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def qualname(self):
+        return self._qualname
+
+    @property
+    def filepath(self):
+        return self._filepath
+
+    @property
+    def lineno(self):
+        return self._lineno
+
+    @property
+    def samples(self):
+        '''tuple: :class:`TimelineSample` in chronological order.'''
+        return self._samples
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def num_samples(self):
+        '''int: Number of samples taken, including those dropped.'''
+        return self._num_samples
+
+    @property
+    def num_dropped(self):
+        '''int: Number of the oldest samples dropped from the ring buffer.'''
+        return self._num_samples - len(self._samples)
+
+    @property
+    def max_current(self):
+        return max((sample.current for sample in self._samples), default=0)
+
+    def contents(self, lineno):
+        '''Return the contents of a line of the target, or an empty string.'''
+        index = (lineno or 0) - self._lineno
+        if 0 <= index < len(self._source_lines):
+            return self._source_lines[index]
+        return ''
+
+    def peaks(self, n=5):
+        '''Return the highest local maxima of the traced memory.
+
+        Args:
+            n (int): Number of peaks.
+
+        Returns:
+            list: :class:`TimelineSample` in descending order of traced memory.
+        '''
+        peaks = find_peaks(self._samples)
+        peaks.sort(key=lambda sample: (-sample.current, sample.time))
+        return peaks[:n]
+
+    def lines(self):
+        '''Summarize the samples of each line.
+
+        Returns:
+            list: (lineno, number of samples, highest traced memory) of the
+                lines of the target which were sampled, in order of lines.
+        '''
+        lines = dict()
+        for sample in self._samples:
+            if sample.lineno is None:
+                continue
+            line = lines.get(sample.lineno)
+            if line is None:
+                lines[sample.lineno] = [1, sample.current]
+            else:
+                line[0] += 1
+                line[1] = max(line[1], sample.current)
+
+        return [(lineno, count, current) for lineno, (count, current) in sorted(lines.items())]
+
+    def to_dict(self):
+        '''Convert to a dict of builtin types.'''
+        return {
+            'qualname': self._qualname,
+            'filepath': self._filepath,
+            'lineno': self._lineno,
+            'source_lines': list(self._source_lines),
+            'samples': [sample._asdict() for sample in self._samples],
+            'interval': self._interval,
+            'num_samples': self._num_samples,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        '''Create from the dict made by :meth:`to_dict`.'''
+        return cls(
+            qualname=d['qualname'],
+            filepath=d['filepath'],
+            lineno=d['lineno'],
+            source_lines=d['source_lines'],
+            samples=[TimelineSample(**sample) for sample in d['samples']],
+            interval=d['interval'],
+            num_samples=d['num_samples']
+        )
+
+    def to_json(self, file=None, **kwargs):
+        '''Export as JSON.
+
+        Args:
+            file: A text stream. The JSON is returned as str if None.
+            **kwargs: Passed to `json.dump`.
+        '''
+        if file is None:
+            return json.dumps(self.to_dict(), **kwargs)
+        json.dump(self.to_dict(), file, **kwargs)
+
+    @classmethod
+    def from_json(cls, s):
+        '''Create from the JSON made by :meth:`to_json`.'''
+        return cls.from_dict(json.loads(s))
+
+    def to_csv(self, file=None):
+        '''Export as CSV with a row for each sample, ready to be plotted.'''
+        stream = io.StringIO() if file is None else file
+
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(TIMELINE_FIELDS)
+        for sample in self._samples:
+            writer.writerow(sample + (self.contents(sample.lineno).strip(), ))
+
+        if file is None:
+            return stream.getvalue()
@@ -1,67 +1,133 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import io
+import os
+import re
+import sys
 import inspect
 import ast
-import math
-import contextlib
+import bisect
+import tokenize
 import textwrap
-import linecache
 import fnmatch
-from enum import Enum
-from tracemalloc import start, take_snapshot, stop, Filter
-
-
-__all__ = ['Tracer', 'RelatedTracesOutputMode', 'trace']
+import builtins
+import functools
+import itertools
+import hashlib
+import threading
+import statistics
+from types import CodeType, FunctionType
+from collections import namedtuple, OrderedDict, Counter
+from tracemalloc import (
+    start, take_snapshot, stop, is_tracing, get_traced_memory, Filter, Snapshot
+)
+try:
+    from tracemalloc import reset_peak
+except ImportError:  # Python < 3.9
+    reset_peak = None
+try:
+    from time import perf_counter_ns
+except ImportError:  # Python < 3.7
+    from time import perf_counter
+
+    def perf_counter_ns():
+        return int(perf_counter() * 1e9)
+try:
+    from types import coroutine
+except ImportError:  # Python < 3.5
+    def coroutine(function):
+        return function
+try:
+    from inspect import iscoroutinefunction
+except ImportError:  # Python < 3.5
+    def iscoroutinefunction(obj):
+        return False
+try:
+    from inspect import isasyncgenfunction
+except ImportError:  # Python < 3.6
+    def isasyncgenfunction(obj):
+        return False
+from .result import TraceResult, TargetLine, RelatedTrace
+from .process import get_memory_reader
+from .timeline import Timeline, TimelineSampler
+from .dump import SnapshotDump, write_dump, get_raw_traces, DEFAULT_CHUNK_SIZE
+from .domains import PYTHON_DOMAIN, get_domain_name, get_domain_order, make_domain_filters
+from .report import RelatedTracesOutputMode, bytes_to_hrf, render_text
+
+
+__all__ = ['Tracer', 'RelatedTracesOutputMode', 'trace', 'analyze_dump']
 
 
 DUMMY_SRC_NAME = '<tracer-src>'
+SETUP_SRC_NAME = '<tracer-setup>'
 
+_source_name_counter = itertools.count(1)
 
-def bytes_to_hrf(size):
-    '''Convert bytes to human readable format.'''
-    units = ('B', 'KiB', 'MiB', 'GiB', 'TiB')
 
-    if size > 0:
-        order = min(int(math.log(size) / math.log(1024)), len(units)-1)
-    else:
-        order = 0
+def make_source_name():
+    '''Make a unique file name for instrumented code.'''
+    return '{}-{}>'.format(DUMMY_SRC_NAME[:-1], next(_source_name_counter))
 
-    fmt = '6.0f' if order == 0 else '6.1f'
-    return '{0:{1}} {2}'.format(size/(1024**order), fmt, units[order])
 
+def is_source_name(filename):
+    '''Return True if the file name is of instrumented code.'''
+    return filename.startswith(DUMMY_SRC_NAME[:-1])
 
-@contextlib.contextmanager
-def apply_modules_temporarily(setup='pass', extras=None):
-    '''Apply modules temporarily.'''
-    if extras is None:
-        temp = dict()
-    else:
-        temp = extras.copy()
 
-    if setup != 'pass':
-        code = compile(setup, DUMMY_SRC_NAME, 'exec')
-        exec(code, globals(), temp)
-
-    for key in list(temp):
-        if key in globals().keys():
-            temp.pop(key)
+def relabel_code(code, filename):
+    '''Replace the file name of the code object and of its nested code objects.'''
+    consts = tuple(
+        relabel_code(const, filename) if isinstance(const, CodeType) else const
+        for const in code.co_consts
+    )
+    if hasattr(code, 'replace'):
+        return code.replace(co_filename=filename, co_consts=consts)
+
+    # Python < 3.8
+    return CodeType(
+        code.co_argcount,
+        code.co_kwonlyargcount,
+        code.co_nlocals,
+        code.co_stacksize,
+        code.co_flags,
+        code.co_code,
+        consts,
+        code.co_names,
+        code.co_varnames,
+        filename,
+        code.co_name,
+        code.co_firstlineno,
+        code.co_lnotab,
+        code.co_freevars,
+        code.co_cellvars
+    )
 
-    globals().update(temp)
 
-    try:
-        yield
-    finally:
-        # Restore.
-        for key in temp.keys():
-            globals().pop(key, None)
+def make_constant(value):
+    '''Make a constant node.'''
+    if hasattr(ast, 'Constant'):
+        return ast.Constant(value=value)
+    return ast.Num(n=value)  # Python < 3.6
 
 
 class Transformer(ast.NodeTransformer):
-    '''Add tracemalloc functions.'''
-    def __init__(self, result_id):
+    '''Add tracemalloc functions.
+
+    Args:
+        result_id (str): Name of the global that receives the snapshot.
+        line_probe_id (str): Name of the :class:`LineProbe` that is called
+            before every statement. Statements are not instrumented if None.
+        strip_decorators (bool): Remove the decorators of the function.
+    '''
+    def __init__(self, result_id, line_probe_id=None, strip_decorators=False):
         self._result_id = result_id
+        self._line_probe_id = line_probe_id
+        self._strip_decorators = strip_decorators
 
     def visit_FunctionDef(self, node):
+        if self._strip_decorators:
+            node.decorator_list = []
+
         # Pre-hook.
         pre_hook_expr = ast.Expr(
             value=ast.Call(
@@ -91,7 +157,11 @@ class Transformer(ast.NodeTransformer):
         ]
 
         body_elems = [pre_hook_expr]
-        body_elems.extend([elem for elem in node.body])
+        if self._line_probe_id is None:
+            body_elems.extend([elem for elem in node.body])
+        else:
+            body_elems.extend(self._instrument_block(node.body))
+            finalbody.insert(0, self._make_probe_call('end'))
         node.body.clear()
         node.body.append(
             ast.Try(
@@ -104,14 +174,115 @@ class Transformer(ast.NodeTransformer):
 
         return ast.fix_missing_locations(node)
 
+    # The hooks of a coroutine function run when the coroutine is driven.
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _make_probe_call(self, attr, *args):
+        return ast.Expr(
+            value=ast.Call(
+                func=ast.Attribute(
+                    value=ast.Name(id=self._line_probe_id, ctx=ast.Load()),
+                    attr=attr,
+                    ctx=ast.Load()
+                ),
+                args=[make_constant(arg) for arg in args],
+                keywords=[]
+            )
+        )
+
+    def _instrument_block(self, stmts):
+        '''Put a line probe before each statement of the block.'''
+        block = list()
+        for stmt in stmts:
+            self._instrument_children(stmt)
+            block.append(
+                ast.copy_location(self._make_probe_call('mark', stmt.lineno), stmt)
+            )
+            block.append(stmt)
+
+        return block
+
+    def _instrument_children(self, node):
+        # Nested functions and classes are executed later, or never.
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Lambda))\
+                or type(node).__name__ == 'AsyncFunctionDef':
+            return
+
+        for name, value in ast.iter_fields(node):
+            if not isinstance(value, list) or not value:
+                continue
+            if isinstance(value[0], ast.stmt):
+                setattr(node, name, self._instrument_block(value))
+            elif isinstance(value[0], ast.AST):
+                # except handlers, match cases.
+                for elem in value:
+                    if isinstance(getattr(elem, 'body', None), list):
+                        self._instrument_children(elem)
+
+
+def find_newlines(source):
+    '''Return the positions of the ends of the logical lines of the source.'''
+    readline = io.StringIO(source).readline
+    return [
+        token.start for token in tokenize.generate_tokens(readline)
+        if token.type == tokenize.NEWLINE
+    ]
+
+
+def get_end_lineno(node, newlines=None):
+    '''Return the last line number of the node.
+
+    Before Python 3.8 the nodes have no end position. The node ends with the
+    logical line of its last child, such as the line of a closing bracket,
+    which is found in `newlines` made by :func:`find_newlines`.
+    '''
+    end_lineno = getattr(node, 'end_lineno', None)  # Python 3.8+
+    if end_lineno is not None:
+        return end_lineno
+
+    last = max(
+        (child.lineno, child.col_offset) for child in ast.walk(node)
+        if hasattr(child, 'lineno')
+    )
+    if newlines:
+        index = bisect.bisect_left(newlines, last)
+        if index < len(newlines):
+            return newlines[index][0]
+    return last[0]
+
 
 class CodeBlockCollector(ast.NodeVisitor):
-    '''Collect code blocks.'''
-    def __init__(self):
-        self.code_blocks = dict()
+    '''Collect code blocks.
+
+    `code_blocks` maps the qualified names of the functions and methods
+    to their first and last line numbers, decorators included.
+    Nested functions are part of the function that defines them.
+
+    Args:
+        source (str): The parsed source. The last line numbers are only
+            found in the source before Python 3.8.
+    '''
+    def __init__(self, source=None):
+        self.code_blocks = OrderedDict()
+        self._names = list()
+        if source is None or sys.version_info >= (3, 8):
+            self._newlines = None
+        else:
+            self._newlines = find_newlines(source)
+
+    def visit_ClassDef(self, node):
+        self._names.append(node.name)
+        self.generic_visit(node)
+        self._names.pop()
 
     def visit_FunctionDef(self, node):
-        self.code_blocks[node.name] = (node.lineno, node.body[-1].lineno)
+        first_lineno = min(
+            [node.lineno] + [decorator.lineno for decorator in node.decorator_list]
+        )
+        name = '.'.join(self._names + [node.name])
+        self.code_blocks[name] = (first_lineno, get_end_lineno(node, self._newlines))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
 
 
 class DependencyCollector(ast.NodeVisitor):
@@ -134,29 +305,837 @@ class DependencyCollector(ast.NodeVisitor):
 
 def extract_dependencies(obj):
     '''Extract dependencies.'''
+    from types import MappingProxyType
+    names = instrument(obj).dependency_names
+    return MappingProxyType(resolve_dependencies(obj, names))
+
+
+Instrumentation = namedtuple(
+    'Instrumentation',
+    ('code', 'source_lines', 'lineno', 'dependency_names', 'source_hash', 'mtime')
+)
+Instrumentation.__doc__ = '''The instrumented code of a function or method.'''
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'maxsize', 'currsize'))
+
+
+class InstrumentationCache(object):
+    '''A bounded LRU cache of :class:`Instrumentation`.
+
+    Args:
+        maxsize (int): The least recently used entries are discarded
+            when the number of entries exceeds this.
+    '''
+    def __init__(self, maxsize=128):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        with self._lock:
+            self._maxsize = value
+            self._shrink()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def info(self):
+        '''Return :class:`CacheInfo`.'''
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._maxsize, len(self._entries))
+
+    def _shrink(self):
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+
+INSTRUMENTATION_CACHE = InstrumentationCache()
+
+
+def get_mtime(filepath):
+    '''Return the modification time of the file, or None.'''
+    try:
+        return os.stat(filepath).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+def hash_source(source_lines):
+    '''Return the hash of the source lines.'''
+    return hashlib.sha1(''.join(source_lines).encode('utf-8')).hexdigest()
+
+
+def instrument(function_or_method, enable_line_probe=False, strip_decorators=False):
+    '''Instrument the function or method.
+
+    The result is cached by the identity of the code object,
+    and is rebuilt when the source file is modified.
+
+    Returns:
+        :class:`Instrumentation`
+    '''
+    code = function_or_method.__code__
+    key = (code, enable_line_probe, strip_decorators)
+    mtime = get_mtime(code.co_filename)
+
+    entry = INSTRUMENTATION_CACHE.get(key)
+    if entry is not None and entry.mtime == mtime:
+        return entry
+
+    source_lines, lineno = inspect.getsourcelines(function_or_method)
+    source_hash = hash_source(source_lines)
+    if entry is not None and entry.source_hash == source_hash:
+        entry = entry._replace(mtime=mtime)
+        INSTRUMENTATION_CACHE.put(key, entry)
+        return entry
+
+    source_text = ''.join(source_lines)
+    source_text = textwrap.dedent(source_text)
+    source_text = source_text.strip()
+
+    node = ast.parse(source_text)
+
+    module = inspect.getmodule(function_or_method)
+    if module is None:
+        dependency_names = frozenset()
+    else:
+        collector = DependencyCollector(module=module)
+        collector.visit(node)
+        dependency_names = frozenset(collector.dependencies)
+
+    node = Transformer(
+        result_id='SNAPSHOT',
+        line_probe_id='LINE_PROBE' if enable_line_probe else None,
+        strip_decorators=strip_decorators
+    ).visit(node)
+
+    entry = Instrumentation(
+        code=compile(node, DUMMY_SRC_NAME, 'exec'),
+        source_lines=tuple(source_lines),
+        lineno=lineno,
+        dependency_names=dependency_names,
+        source_hash=source_hash,
+        mtime=mtime
+    )
+    INSTRUMENTATION_CACHE.put(key, entry)
+
+    return entry
+
+
+def resolve_dependencies(obj, names):
+    '''Resolve the names in the module of the obj.'''
     module = inspect.getmodule(obj)
-    collector = DependencyCollector(module=module)
+    if module is None:
+        return dict()
+
+    namespace = module.__dict__
+    return {name: namespace[name] for name in names if name in namespace}
+
+
+def most_recent_frame(traceback):
+    '''Return the most recent frame of `tracemalloc.Traceback`.'''
+    if sys.version_info >= (3, 7):
+        # Sorted from the oldest frame to the most recent frame.
+        return traceback[-1]
+    return traceback[0]
+
+
+def iter_frames_most_recent_first(traceback):
+    '''Iterate the frames of `tracemalloc.Traceback` from the most recent one.'''
+    if sys.version_info >= (3, 7):
+        return reversed(traceback)
+    return iter(traceback)
+
+
+@functools.lru_cache(maxsize=64)
+def compile_patterns(patterns):
+    '''Compile the file path patterns into a regular expression.
+
+    Args:
+        patterns (frozenset): Patterns of `fnmatch` style.
+    '''
+    return re.compile('|'.join(
+        '(?:{})'.format(fnmatch.translate(os.path.normcase(pattern)))
+        for pattern in sorted(patterns)
+    ))
+
+
+class PatternFilter(Filter):
+    '''Filter traces on the file paths matching any of the patterns.
 
-    source = inspect.getsource(obj)
-    source = textwrap.dedent(source)
-    node = ast.parse(source)
-    collector.visit(node)
+    Each file path is matched only once with the precompiled patterns.
+    The target traces are never filtered out: those of the instrumented
+    code, and those of the lines `code_lines` of `code_filename` if the
+    target is the original code.
 
-    return collector.dependencies
+    Args:
+        inclusive (bool):
+        patterns (iterable): Patterns of `fnmatch` style.
+        code_filename (str): See :class:`TargetMetadata`.
+        code_lines (tuple): See :class:`TargetMetadata`.
+    '''
+    def __init__(self, inclusive, patterns, code_filename=None, code_lines=None):
+        super().__init__(inclusive, '*')
+        self._regex = compile_patterns(frozenset(patterns))
+        self._matches = dict()
+        self._code_filename = None if code_lines is None else code_filename
+        self._code_lines = code_lines
+
+    def _match_frame_impl(self, filename, lineno):
+        if filename == self._code_filename:
+            first, last = self._code_lines
+            if first <= lineno <= last:
+                return self.inclusive
+
+        matched = self._matches.get(filename)
+        if matched is None:
+            if is_source_name(filename):
+                matched = self.inclusive
+            else:
+                matched = self._regex.match(os.path.normcase(filename)) is not None
+            self._matches[filename] = matched
+
+        return matched
+
+
+def make_filters(include_patterns=None, exclude_patterns=None, code_filename=None, code_lines=None):
+    '''Make the filters for `tracemalloc.Snapshot.filter_traces`.
+
+    The lines `code_lines` of `code_filename` are never filtered out (see :class:`PatternFilter`).
+    '''
+    filters = list()
+    if include_patterns:
+        filters.append(PatternFilter(True, include_patterns, code_filename, code_lines))
+    if exclude_patterns:
+        filters.append(PatternFilter(False, exclude_patterns, code_filename, code_lines))
+
+    return filters
+
+
+def diff_sums(sums):
+    '''Return the differences between the running sums.'''
+    return [value - previous for previous, value in zip([0] + sums[:-1], sums)]
+
+
+class LineProbe(object):
+    '''Record the traced memory around every statement.
+
+    For each line, the probe keeps the highest amount of memory allocated
+    above the level at which the statement started (peak) and the sum of the
+    changes in traced memory (net delta).
+    Without `tracemalloc.reset_peak` (Python < 3.9) the peak of a statement
+    is only visible when it exceeds every earlier peak; otherwise the net
+    delta is used as the peak.
+    The probe also keeps the churn of each line, the sum of the peaks of all
+    its executions, and the number of executions (hits). The churn counts
+    the memory which is freed before the snapshot, such as the temporaries
+    of a loop, but an execution which allocates and frees several times
+    only counts its highest level. Without `tracemalloc.reset_peak` the
+    temporaries under an earlier peak are not visible, so the churn is not
+    recorded (None).
+    The traced memory is global to the process, so calls traced at the same
+    time are charged each other's allocations, except the tasks which run
+    while a traced coroutine is suspended (see :meth:`suspend`).
+    The readings of the probe are themselves traced; the memory they add
+    to each execution of a statement is calibrated (see :meth:`calibrate`).
+    '''
+    def __init__(self):
+        self._line_stats = dict()
+        self._lineno = None
+        self._current = 0
+        self._peak = 0
+        self._suspended_lineno = None
+        self._resumed = False
+        self._reset_peak = reset_peak
+        self._overhead = (0, 0)
+
+    @property
+    def line_stats(self):
+        '''dict: (peak, delta) for each line number.'''
+        return {lineno: (stat[0], stat[1]) for lineno, stat in self._line_stats.items()}
+
+    @property
+    def line_churn(self):
+        '''dict: (churn, hits) for each line number.
+
+        The churn is None if the peak is not reset: before Python 3.9,
+        or if the peak is shared (see :meth:`share_peak`).
+        '''
+        if self._reset_peak is None:
+            return {lineno: (None, stat[3]) for lineno, stat in self._line_stats.items()}
+        return {lineno: (stat[2], stat[3]) for lineno, stat in self._line_stats.items()}
+
+    def mark(self, lineno):
+        '''Close the current statement and open the statement at `lineno`.'''
+        if self._lineno is not None:
+            self._close()
+
+        self._lineno = lineno
+        self._resumed = False
+        self._open()
+
+    def end(self):
+        '''Close the current statement.'''
+        if self._lineno is not None:
+            self._close()
+            self._lineno = None
+
+    def calibrate(self, num_marks=100):
+        '''Measure the memory that the probe adds to each execution of a statement.
+
+        The probe is marked back to back, so the memory of each statement is
+        the overhead alone: the integers of the reading which opened it, whose
+        size depends on the interpreter. The net delta of
+        the overhead is subtracted from every execution, and a peak is only
+        visible above the peak of the overhead. It must be called while
+        tracemalloc traces, before the first statement.
+        '''
+        key = (type(self), self._reset_peak is not None)
+        overhead = PROBE_OVERHEADS.get(key)
+        if overhead is None:
+            self._overhead = (0, 0)
+            for _ in range(10):
+                self.mark(0)
+            self.end()
+            self._clear()
+            # The running sums are only referenced, so that nothing is allocated
+            # inside the statements, and they are differenced afterwards.
+            deltas = [0] * num_marks
+            churns = [0] * num_marks
+            self.mark(0)
+            for index in range(num_marks):
+                self.mark(0)
+                stat = self._line_stats[0]
+                deltas[index] = stat[1]
+                churns[index] = stat[2]
+            self.end()
+            self._clear()
+            overhead = (
+                int(statistics.median(diff_sums(churns))),
+                int(statistics.median(diff_sums(deltas)))
+            )
+            PROBE_OVERHEADS[key] = overhead
+
+        self._overhead = overhead
+
+    def _clear(self):
+        self._line_stats = dict()
+
+    def share_peak(self):
+        '''Leave the peak of tracemalloc alone, as if `tracemalloc.reset_peak` was missing.
+
+        The peak belongs to whoever traced memory before the call, such as
+        the application or an outer traced call.
+        '''
+        self._reset_peak = None
+
+    def suspend(self):
+        '''Close the current statement while the coroutine of the call is suspended.
+
+        What the other tasks allocate until :meth:`resume` is not charged to
+        the statement. The peak of a statement which is suspended is the
+        highest peak of its parts.
+        '''
+        lineno = self._lineno
+        self.end()
+        self._suspended_lineno = lineno
+
+    def resume(self):
+        '''Reopen the statement which was suspended, as the same execution.'''
+        lineno, self._suspended_lineno = self._suspended_lineno, None
+        if lineno is not None:
+            self.mark(lineno)
+            self._resumed = True
+
+    def _open(self):
+        # The integers of the reading are allocated after the memory is read.
+        # They are kept until the statement is closed, so that the overhead
+        # of every statement is the same.
+        if self._reset_peak is not None:
+            self._reset_peak()
+        self._current, self._peak = get_traced_memory()
+
+    def _close(self):
+        # The reading is the first thing done, before a bound method or
+        # the arguments of a call are allocated.
+        current, peak = get_traced_memory()
+        # The small integers are cached by the interpreter, and are not allocated,
+        # as are the readings right after tracemalloc starts.
+        num_allocated = (self._current > MAX_SMALL_INT) + (self._peak > MAX_SMALL_INT)
+        peak_overhead = self._overhead[0] * num_allocated // 2
+        delta_overhead = self._overhead[1] * num_allocated // 2
+        delta = current - self._current - delta_overhead
+        line_peak = peak - self._current
+        new_peak = peak > self._peak
+        # The reading of the statement is freed before the next one opens.
+        self._current = self._peak = None
+        # The peak of the overhead includes transient readings, which are freed
+        # before the statement allocates; only its net delta is under the peak.
+        if new_peak and line_peak > peak_overhead:
+            line_peak = max(line_peak - delta_overhead, delta, 0)
+        else:
+            line_peak = max(delta, 0)
+
+        stat = self._line_stats.get(self._lineno)
+        if stat is None:
+            self._line_stats[self._lineno] = [line_peak, delta, line_peak, 1]
+        else:
+            stat[0] = max(stat[0], line_peak)
+            stat[1] += delta
+            stat[2] += line_peak
+            if not self._resumed:
+                stat[3] += 1
+
+
+class NativeLineProbe(LineProbe):
+    '''Record the memory of the process around every statement as well.
+
+    The memory allocated by C extensions with `malloc` is not traced, but
+    it grows the resident memory of the process. The net change of the
+    memory of the process (native delta) is kept next to the traced ones.
+    The resident memory grows by pages, when the memory is first written,
+    and is not given back by every `free`, so small changes are noise.
+
+    Args:
+        read_memory (callable): Return the memory of the process in bytes.
+    '''
+    def __init__(self, read_memory):
+        super().__init__()
+        self._read_memory = read_memory
+        self._line_native = dict()
+        self._native = 0
+
+    @property
+    def line_native(self):
+        '''dict: Native delta for each line number.'''
+        return dict(self._line_native)
+
+    def mark(self, lineno):
+        '''Close the current statement and open the statement at `lineno`.'''
+        # The memory of the process is read outside of the traced statement.
+        if self._lineno is not None:
+            self._close()
+            self._close_native(self._read_memory())
+
+        self._lineno = lineno
+        self._resumed = False
+        self._native = self._read_memory()
+        self._open()
+
+    def end(self):
+        '''Close the current statement.'''
+        if self._lineno is not None:
+            self._close()
+            self._close_native(self._read_memory())
+            self._lineno = None
+
+    def _clear(self):
+        super()._clear()
+        self._line_native = dict()
+
+    def _close_native(self, native):
+        delta = native - self._native
+        self._line_native[self._lineno] = self._line_native.get(self._lineno, 0) + delta
+
+
+class NullLineProbe(object):
+    '''A line probe which records nothing.'''
+    def mark(self, lineno):
+        pass
+
+    def share_peak(self):
+        pass
+
+    def calibrate(self):
+        pass
+
+    def end(self):
+        pass
+
+    def suspend(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+class LineTimer(object):
+    '''Record the elapsed time of every statement.
+
+    The timer replaces the :class:`LineProbe` in a call which is not traced,
+    so the time is not slowed down by tracemalloc. The calibrated overhead
+    of the timer is subtracted from each execution of a statement.
+    The time of a compound statement, such as `for`, excludes its body,
+    and the time of a statement of a coroutine excludes its suspensions.
+
+    Args:
+        overhead (int): Overhead in nanoseconds. It is calibrated if None.
+    '''
+    def __init__(self, overhead=None):
+        self._line_times = dict()
+        self._lineno = None
+        self._time = 0
+        self._suspended_lineno = None
+        self._overhead = calibrate_line_timer() if overhead is None else overhead
+
+    @property
+    def line_times(self):
+        '''dict: Elapsed time in nanoseconds for each line number.'''
+        return {
+            lineno: max(elapsed - self._overhead * hits, 0)
+            for lineno, (elapsed, hits) in self._line_times.items()
+        }
+
+    def mark(self, lineno):
+        '''Close the current statement and open the statement at `lineno`.'''
+        now = perf_counter_ns()
+        if self._lineno is not None:
+            self._close(now)
+
+        self._lineno = lineno
+        self._time = perf_counter_ns()
+
+    def end(self):
+        '''Close the current statement.'''
+        now = perf_counter_ns()
+        if self._lineno is not None:
+            self._close(now)
+            self._lineno = None
+
+    def suspend(self):
+        '''Stop the clock of the current statement while the coroutine is suspended.'''
+        lineno = self._lineno
+        self.end()
+        self._suspended_lineno = lineno
+
+    def resume(self):
+        '''Restart the clock of the statement which was suspended.'''
+        lineno, self._suspended_lineno = self._suspended_lineno, None
+        if lineno is not None:
+            self.mark(lineno)
+
+    def _close(self, now):
+        stat = self._line_times.get(self._lineno)
+        if stat is None:
+            self._line_times[self._lineno] = [now - self._time, 1]
+        else:
+            stat[0] += now - self._time
+            stat[1] += 1
+
+
+@functools.lru_cache(maxsize=1)
+def calibrate_line_timer(num_rounds=5, num_marks=1000):
+    '''Return the overhead in nanoseconds that the timer adds to each execution of a statement.
+
+    The timer is marked back to back, so the elapsed time of each mark
+    is the overhead alone. The noise of the machine only adds to it, and
+    the overhead is subtracted from every hit of a line, so the fastest
+    round is returned: the others would clamp the time of the hot lines to 0.
+    The overhead is calibrated once per process.
+    '''
+    timings = list()
+    for _ in range(num_rounds):
+        timer = LineTimer(overhead=0)
+        for _ in range(num_marks):
+            timer.mark(1)
+        timer.end()
+        elapsed, hits = timer._line_times[1]
+        timings.append(elapsed / hits)
+
+    return int(min(timings))
+
+
+# The (peak, delta) of the overhead of each kind of probe. See :meth:`LineProbe.calibrate`.
+PROBE_OVERHEADS = dict()
+
+# The largest integer which is cached by the interpreter.
+MAX_SMALL_INT = 256
+
+PROBE_FILENAME = LineProbe.mark.__code__.co_filename
+
+# The files of the hooks which run on behalf of the target.
+HOOK_FILENAMES = {PROBE_FILENAME}
+
+
+class TracemallocSession(object):
+    '''Share tracemalloc between the calls traced at the same time.
+
+    tracemalloc is started by the first call and stopped by the last one.
+    A session started outside of malloc_tracer is never stopped, and its
+    number of frames is kept.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._acquisitions = 0
+        self._owner = False
+
+    @property
+    def active(self):
+        '''bool: True while a call is being traced.'''
+        return self._count > 0
+
+    def acquire(self, nframe=1):
+        '''Start tracing if nobody does.
+
+        Returns:
+            tuple: The ticket to pass to :meth:`is_shared`.
+        '''
+        with self._lock:
+            if self._count == 0:
+                self._owner = not is_tracing()
+                if self._owner:
+                    start(nframe)
+
+            self._count += 1
+            self._acquisitions += 1
+
+            return self._acquisitions, self._count > 1 or not self._owner
+
+    def owns_peak(self):
+        '''Return True if a single call is traced and nobody else traces memory.'''
+        with self._lock:
+            return self._count == 1 and self._owner
+
+    def release(self):
+        '''Stop tracing if this is the last call.'''
+        with self._lock:
+            self._count -= 1
+            if self._count == 0 and self._owner:
+                stop()
+
+    def is_shared(self, ticket):
+        '''Return True if anything else was traced since the ticket was issued.'''
+        acquisitions, shared = ticket
+        with self._lock:
+            return shared or self._acquisitions != acquisitions
+
+
+SESSION = TracemallocSession()
+
+
+Capture = namedtuple(
+    'Capture',
+    ('snapshot', 'line_stats', 'shared', 'line_churn', 'line_times', 'line_native')
+)
+Capture.__doc__ = '''What a traced call captured.
+
+The line stats and the line churn are None if the line probe is disabled,
+the line times are None if the line timer is disabled, and the line
+native deltas are None if the native probe is disabled.
+`shared` is True if other calls were traced at the same time.
+'''
+
+
+TargetMetadata = namedtuple(
+    'TargetMetadata',
+    ('qualname', 'filepath', 'lineno', 'source_lines', 'code_filename', 'code_lines')
+)
+TargetMetadata.__doc__ = '''What the result needs to know about the target.
+
+`source_lines` are the lines of the traced source, and `code_filename` is
+the file name of its code, which is found in the tracebacks.
+`code_lines` is None if the code is instrumented, in which case the lines
+of the code are numbered from 1. If the original code is traced, it is the
+first and the last line numbers of the target in `code_filename`.
+'''
+TargetMetadata.__new__.__defaults__ = (None, )
+
+
+def subtract_traces(snapshot, baseline):
+    '''Return the snapshot of the traces which are not in the baseline.
+
+    The traces are compared by domain, size and traceback, as
+    `tracemalloc.Snapshot.compare_to` does, but each trace is kept whole.
+    The traces of the baseline which were freed are ignored.
+    '''
+    counts = Counter(get_raw_traces(baseline))
+    traces = list()
+    for trace in get_raw_traces(snapshot):
+        if counts[trace] > 0:
+            counts[trace] -= 1
+        else:
+            traces.append(trace)
+
+    return Snapshot(tuple(traces), snapshot.traceback_limit)
+
+
+class TracedCall(object):
+    '''The hooks of a single traced call.
+
+    The instrumented code calls `start`, `take_snapshot` and `stop`,
+    which are bound to an instance of this class in the globals of the call.
+
+    If memory is already traced when the call starts, by the application
+    or by an outer traced call, the session is left as it is: a snapshot
+    is taken at the start, and only the traces which are not in it are kept.
+    The peak of tracemalloc is not reset by the line probe either.
+
+    Args:
+        session (:class:`TracemallocSession`):
+        nframe (int): Number of frames of the tracebacks, if the call starts tracemalloc.
+        probe: The line probe of the call.
+        guard (threading.Lock): Held from the start to the end of the call,
+            so that the calls which share it are not traced at the same time.
+    '''
+    def __init__(self, session, nframe=1, probe=None, guard=None):
+        self._session = session
+        self._nframe = nframe
+        self._probe = probe
+        self._guard = guard
+        self._ticket = None
+        self._baseline = None
+        self.snapshot = None
+        self.shared = False
+
+    def start(self):
+        if self._guard is not None and not self._guard.acquire(False):
+            raise RuntimeError(
+                'The tracer is already tracing a call. Use a tracer for each thread or task.'
+            )
+        self._ticket = self._session.acquire(self._nframe)
+        if self._ticket[1]:
+            if self._probe is not None:
+                self._probe.share_peak()
+            self._baseline = take_snapshot()
+        if self._probe is not None:
+            self._probe.calibrate()
+
+    def take_snapshot(self):
+        if self._ticket is None:
+            # The call was refused by the guard.
+            return None
+        self.shared = self._session.is_shared(self._ticket)
+        self.snapshot = take_snapshot()
+        if self._baseline is not None:
+            self.snapshot = subtract_traces(self.snapshot, self._baseline)
+            self._baseline = None
+        return self.snapshot
+
+    def stop(self):
+        if self._ticket is None:
+            return
+        self._session.release()
+        if self._guard is not None:
+            self._guard.release()
+
+
+class UntracedCall(object):
+    '''The hooks of a call which is not traced.'''
+    snapshot = None
+    shared = False
+
+    def start(self):
+        pass
+
+    def take_snapshot(self):
+        return None
+
+    def stop(self):
+        pass
+
+
+def exhaust(generator):
+    '''Exhaust the generator and return its return value.'''
+    while True:
+        try:
+            next(generator)
+        except StopIteration as e:
+            return e.value
+
+
+class CoroutineDriver(object):
+    '''Drive the coroutine of a traced call on behalf of the task which awaits it.
+
+    The line probe is suspended whenever the coroutine yields to the event
+    loop and resumed with the coroutine, so the statements are not charged
+    what the other tasks allocate in the meantime.
+
+    Args:
+        coroutine: The coroutine of the instrumented target.
+        probe: The line probe of the call.
+    '''
+    def __init__(self, coroutine, probe):
+        self._coroutine = coroutine
+        self._probe = probe
+        self.num_suspensions = 0
+
+    def __iter__(self):
+        value, error = None, None
+        while True:
+            self._probe.resume()
+            try:
+                if error is None:
+                    yielded = self._coroutine.send(value)
+                else:
+                    yielded = self._coroutine.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self._probe.suspend()
+
+            self.num_suspensions += 1
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                self._coroutine.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+    __await__ = __iter__
 
 
 class TraceRecorder:
 
     def __init__(self):
         self._filepaths = dict()
+        self._inclusive_traces = dict()
+        self._domain_traces = dict()
+        self._has_other_domains = False
 
-    def add_trace(self, filepath, lineno, size):
+    def add_trace(self, filepath, lineno, size, count=0):
         filelines = self._filepaths.get(filepath)
         if filelines is None:
             self._filepaths[filepath] = dict()
             filelines = self._filepaths.get(filepath)
 
-        filelines[lineno] = size
+        trace = filelines.get(lineno)
+        if trace is None:
+            filelines[lineno] = [size, count]
+        else:
+            trace[0] += size
+            trace[1] += count
 
     def list_filepaths(self):
         return list(self._filepaths.keys())
@@ -165,8 +1144,8 @@ class TraceRecorder:
         '''List all trace.'''
         traces = list()
         for filepath, filelines in self._filepaths.items():
-            for lineno, size in filelines.items():
-                traces.append((filepath, lineno, size))
+            for lineno, (size, count) in filelines.items():
+                traces.append((filepath, lineno, size, count))
 
         return traces
 
@@ -177,8 +1156,8 @@ class TraceRecorder:
             if filepath == DUMMY_SRC_NAME:
                 continue
 
-            for lineno, size in filelines.items():
-                traces.append((filepath, lineno, size))
+            for lineno, (size, count) in filelines.items():
+                traces.append((filepath, lineno, size, count))
 
         return traces
 
@@ -189,17 +1168,319 @@ class TraceRecorder:
             return list()
 
         traces = list()
-        for k, v in sorted(filelines.items()):
-            traces.append((k, v))
+        for k, (size, count) in sorted(filelines.items()):
+            traces.append((k, size, count))
+
+        return traces
+
+    def add_domain_trace(self, lineno, domain, size):
+        '''Add a trace of a line of the target to its domain.'''
+        domains = self._domain_traces.get(lineno)
+        if domains is None:
+            domains = dict()
+            self._domain_traces[lineno] = domains
+
+        domains[domain] = domains.get(domain, 0) + size
+        if domain != PYTHON_DOMAIN:
+            self._has_other_domains = True
+
+    def list_domain_traces(self):
+        '''List the sizes of each domain.
+
+        Returns:
+            dict: {domain name: size} for each line of the target, in the
+                order of the registered domains. Empty if only the Python
+                domain was traced.
+        '''
+        if not self._has_other_domains:
+            return dict()
+
+        traces = dict()
+        for lineno, domains in self._domain_traces.items():
+            sizes = [(get_domain_name(domain), size) for domain, size in domains.items()]
+            sizes.sort(key=lambda item: get_domain_order(item[0]))
+            traces[lineno] = OrderedDict(sizes)
+
+        return traces
+
+    def add_inclusive_trace(self, lineno, size, callee=None):
+        '''Add a trace allocated under a line of the target.
+
+        Args:
+            lineno (int): Line number of the target.
+            size (int):
+            callee (tuple): (filepath, lineno) of the frame called from the line.
+                None if allocated by the line itself.
+        '''
+        trace = self._inclusive_traces.get(lineno)
+        if trace is None:
+            trace = [0, dict()]
+            self._inclusive_traces[lineno] = trace
+
+        trace[0] += size
+        if callee is not None:
+            callee_trace = trace[1].get(callee)
+            if callee_trace is None:
+                trace[1][callee] = [size, 1]
+            else:
+                callee_trace[0] += size
+                callee_trace[1] += 1
+
+    def list_inclusive_traces(self):
+        '''List inclusive traces.
+
+        Returns:
+            list: (lineno, size, callees) for each line of the target,
+                where callees is a list of (filepath, lineno, size, count)
+                in descending order of size.
+        '''
+        traces = list()
+        for lineno, (size, callees) in sorted(self._inclusive_traces.items()):
+            callees = sorted(
+                (
+                    (filepath, callee_lineno, callee_size, count)
+                    for (filepath, callee_lineno), (callee_size, count) in callees.items()
+                ),
+                key=lambda callee: (-callee[2], callee[0], callee[1])
+            )
+            traces.append((lineno, size, callees))
 
         return traces
 
 
-class RelatedTracesOutputMode(Enum):
-    '''Output modes for Related traces.'''
-    NONE = 0
-    FOR_EACH_FILE = 1  #: Displays related traces for each file.
-    IN_DESCENDING_ORDER = 2  #: Display related traces in descending order.
+def record_snapshot(
+    recorder,
+    snapshot,
+    code_filename,
+    shared=False,
+    include_patterns=None,
+    exclude_patterns=None,
+    include_domains=None,
+    exclude_domains=None,
+    code_lines=None
+):
+    '''Record the traces of the snapshot for each line.
+
+    If other calls were traced at the same time, only the traces allocated
+    under the target are kept. This requires tracebacks of several frames;
+    with a single frame, the related traces may include those of others.
+    The snapshot may be a part of the traces, the recorder adds them up.
+
+    Args:
+        recorder (:class:`TraceRecorder`):
+        snapshot (tracemalloc.Snapshot):
+        code_filename (str): File name of the code of the target.
+        shared (bool): True if other calls were traced at the same time.
+        include_patterns (set):
+        exclude_patterns (set):
+        include_domains (set):
+        exclude_domains (set):
+        code_lines (tuple): The first and the last line numbers of the target
+            in `code_filename`, if it is the original code. See :class:`TargetMetadata`.
+
+    Returns:
+        tuple: The total size and the total number of memory blocks
+            of the unfiltered snapshot.
+    '''
+    if shared and snapshot.traceback_limit > 1:
+        snapshot = snapshot.filter_traces([
+            Filter(True, code_filename, all_frames=True)
+        ])
+
+    total_size = sum(trace.size for trace in snapshot.traces)
+    total_count = len(snapshot.traces)
+
+    filters = make_filters(include_patterns, exclude_patterns, code_filename, code_lines)
+    if filters:
+        snapshot = snapshot.filter_traces(filters)
+    # The inclusive filters of a pass are or-ed, so the domains are filtered apart.
+    filters = make_domain_filters(include_domains, exclude_domains)
+    if filters:
+        snapshot = snapshot.filter_traces(filters)
+
+    first, last = (1, sys.maxsize) if code_lines is None else code_lines
+
+    # Group by line without sorting, the report sorts what it displays.
+    for trace in snapshot.traces:
+        frame = most_recent_frame(trace.traceback)
+        filepath = frame.filename
+        lineno = frame.lineno
+        if filepath == code_filename and first <= lineno <= last:
+            filepath = DUMMY_SRC_NAME
+            lineno -= first - 1
+            recorder.add_domain_trace(
+                lineno=lineno,
+                domain=getattr(trace, 'domain', PYTHON_DOMAIN),
+                size=trace.size
+            )
+        elif is_source_name(filepath):
+            # Traced by another tracer.
+            continue
+        elif filepath in HOOK_FILENAMES:
+            # The bookkeeping of malloc_tracer, such as the line probe.
+            continue
+
+        recorder.add_trace(
+            filepath=filepath,
+            lineno=lineno,
+            size=trace.size,
+            count=1
+        )
+
+        if snapshot.traceback_limit > 1:
+            record_inclusive_trace(recorder, trace, code_filename, code_lines)
+
+    return total_size, total_count
+
+
+def record_inclusive_trace(recorder, trace, code_filename, code_lines=None):
+    '''Charge the trace to the innermost line of the target in its traceback.'''
+    first, last = (1, sys.maxsize) if code_lines is None else code_lines
+    callee = None
+    for frame in iter_frames_most_recent_first(trace.traceback):
+        if frame.filename == code_filename and first <= frame.lineno <= last:
+            # The allocations of the line probe are not made by the line.
+            if callee is None or callee[0] not in HOOK_FILENAMES:
+                recorder.add_inclusive_trace(frame.lineno - first + 1, trace.size, callee)
+            return
+        callee = (frame.filename, frame.lineno)
+
+
+def make_result(
+    recorder,
+    metadata,
+    line_stats,
+    total_size,
+    total_count,
+    line_churn=None,
+    line_times=None,
+    line_native=None
+):
+    '''Make the result from the recorded traces.
+
+    Args:
+        recorder (:class:`TraceRecorder`):
+        metadata (:class:`TargetMetadata`): The target.
+        line_stats (dict): (peak, delta) for each line number of the source.
+        total_size (int):
+        total_count (int):
+        line_churn (dict): (churn, hits) for each line number of the source.
+        line_times (dict): Elapsed time for each line number of the source.
+        line_native (dict): Native delta for each line number of the source.
+
+    Returns:
+        :class:`TraceResult`
+    '''
+    traces = recorder.list_traces_for_each_file(filepath=DUMMY_SRC_NAME)
+    lineno_to_trace = {trace[0]: trace[1:] for trace in traces}
+    if line_stats is None:
+        line_stats = dict()
+    if line_churn is None:
+        line_churn = dict()
+    if line_times is None:
+        line_times = dict()
+    if line_native is None:
+        line_native = dict()
+    lineno_to_inclusive_trace = {
+        lineno: (size, [RelatedTrace(*callee) for callee in callees])
+        for lineno, size, callees in recorder.list_inclusive_traces()
+    }
+    lineno_to_domains = recorder.list_domain_traces()
+
+    target_lines = list()
+    source_lines = ''.join(metadata.source_lines).rstrip().split(sep='\n')
+    if metadata.code_lines is not None:
+        # The source may be missing, the lines of the code are listed anyway.
+        first, last = metadata.code_lines
+        source_lines.extend([''] * (last - first + 1 - len(source_lines)))
+    for lineno, line in enumerate(source_lines, 1):
+        size, count = lineno_to_trace.get(lineno, (None, None))
+        peak, delta = line_stats.get(lineno, (None, None))
+        churn, hits = line_churn.get(lineno, (None, None))
+        inclusive, callees = lineno_to_inclusive_trace.get(lineno, (None, None))
+        target_lines.append(TargetLine(
+            lineno=metadata.lineno + lineno - 1,
+            contents=line,
+            size=size,
+            count=count,
+            peak=peak,
+            delta=delta,
+            inclusive=inclusive,
+            callees=callees,
+            churn=churn,
+            hits=hits,
+            time=line_times.get(lineno),
+            domains=lineno_to_domains.get(lineno),
+            native=line_native.get(lineno)
+        ))
+
+    return TraceResult(
+        qualname=metadata.qualname,
+        filepath=metadata.filepath,
+        lineno=metadata.lineno,
+        target_lines=target_lines,
+        related_traces=[
+            RelatedTrace(*trace) for trace in recorder.list_all_related_trace()
+        ],
+        total_size=total_size,
+        total_count=total_count
+    )
+
+
+def analyze_dump(
+    path,
+    include_patterns=None,
+    exclude_patterns=None,
+    include_domains=None,
+    exclude_domains=None
+):
+    '''Analyze a snapshot dumped by :meth:`Tracer.dump`.
+
+    The traces are read and recorded chunk by chunk, so the memory used
+    depends on the number of distinct lines rather than on the number of
+    traces.
+
+    Args:
+        path (str):
+        include_patterns (set): Specify patterns of file paths to include in the output.
+        exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+        include_domains (set): Specify tracemalloc domains to include in the output.
+        exclude_domains (set): Specify tracemalloc domains to exclude in the output.
+
+    Returns:
+        :class:`TraceResult`
+    '''
+    dump = SnapshotDump(path)
+    header = dump.header
+    metadata = TargetMetadata(**header['metadata'])
+
+    recorder = TraceRecorder()
+    total_size = 0
+    total_count = 0
+    for snapshot in dump.iter_snapshots():
+        size, count = record_snapshot(
+            recorder,
+            snapshot,
+            metadata.code_filename,
+            shared=header['shared'],
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains,
+            code_lines=metadata.code_lines
+        )
+        total_size += size
+        total_count += count
+
+    return make_result(
+        recorder,
+        metadata,
+        line_stats=header['line_stats'],
+        total_size=total_size,
+        total_count=total_count,
+        line_churn=header['line_churn'],
+        line_native=header['line_native']
+    )
 
 
 class Tracer(object):
@@ -210,35 +1491,104 @@ class Tracer(object):
         enable_auto_resolve (bool):
         setup (str): Compile-time dependencies.
             This parameter is ignored if enable_auto_resolve is enabled.
+        enable_line_probe (bool): Record the peak and the net delta of
+            the traced memory around every statement.
+        strip_decorators (bool): Trace the function without its decorators.
+        nframe (int): Number of frames of the tracebacks.
+            If greater than 1, the memory allocated under each line,
+            including the callees, is also recorded.
+        enable_line_timer (bool): Record the elapsed time of every statement.
+            The time is measured in another call of the target, which is not
+            traced, so the target is called twice for each run.
+        enable_native_probe (bool): Record the net change of the memory of
+            the process around every statement, next to the line probe,
+            which includes the memory that tracemalloc cannot see.
+        native_metric (str): 'rss' (resident set size) or 'uss' (unique set size)
+            of the process for the native probe. See :func:`get_memory_reader`.
+
+    A coroutine function is traced by the coroutines :meth:`run_async` and
+    :meth:`trace_async`, which are awaited in the event loop of the caller.
+    A generator function is exhausted by the call, and the snapshot is taken
+    when it returns. See :class:`TracedStream` to trace it while it is iterated.
+
+    A tracer traces a single call at a time, because its calls run the same
+    code, and a call would be charged the allocations of the others.
+    A traced call which starts while another one is traced raises RuntimeError:
+    the threads and the tasks which trace the target at the same time should
+    have a tracer each.
     '''
     def __init__(
         self,
         function_or_method,
         enable_auto_resolve=True,
-        setup='pass'
+        setup='pass',
+        enable_line_probe=False,
+        strip_decorators=False,
+        nframe=1,
+        enable_line_timer=False,
+        enable_native_probe=False,
+        native_metric='rss'
     ):
         if not (inspect.isfunction(function_or_method)
                 or inspect.ismethod(function_or_method)):
             raise TypeError('The obj must be a function or a method.')
+        if isasyncgenfunction(function_or_method):
+            raise TypeError('Asynchronous generator functions are not supported.')
+
+        if enable_native_probe:
+            self._read_memory = get_memory_reader(native_metric)
+            enable_line_probe = True
+        else:
+            self._read_memory = None
+
+        if hasattr(function_or_method, '__self__'):
+            self._class_instance = function_or_method.__self__
+        else:
+            self._class_instance = None
 
-        if enable_auto_resolve:
-            dependencies = extract_dependencies(function_or_method)
+        self._qualname = function_or_method.__qualname__
+        self._enable_auto_resolve = enable_auto_resolve
+        self._enable_line_probe = enable_line_probe
+        self._enable_line_timer = enable_line_timer
+        self._nframe = nframe
+        self._is_coroutine_function = iscoroutinefunction(function_or_method)
+        self._is_generator_function = inspect.isgeneratorfunction(function_or_method)
+        self._guard = threading.Lock()
+        self._load(function_or_method, setup=setup, strip_decorators=strip_decorators)
+
+    def _load(self, function_or_method, setup='pass', strip_decorators=False):
+        '''Load the code of the target which is called by :meth:`_bind`.
+
+        This sets the function which is called, its namespace, the source
+        and where the code of the target runs (see :class:`TargetMetadata`).
+        '''
+        # The timer is driven by the line probe.
+        instrumentation = instrument(
+            function_or_method,
+            enable_line_probe=self._enable_line_probe or self._enable_line_timer,
+            strip_decorators=strip_decorators
+        )
+
+        if self._enable_auto_resolve:
+            dependencies = resolve_dependencies(
+                function_or_method,
+                instrumentation.dependency_names
+            )
             setup = 'pass'
         else:
             dependencies = dict()
 
-        with apply_modules_temporarily(setup=setup, extras=dependencies):
-            source_lines, lineno = inspect.getsourcelines(function_or_method)
-            source_text = ''.join(source_lines)
-            source_text = textwrap.dedent(source_text)
-            source_text = source_text.strip()
+        # Each tracer has its own namespace and its own file name,
+        # so that tracers can run at the same time.
+        code = relabel_code(instrumentation.code, make_source_name())
 
-            node = ast.parse(source_text)
-            node = Transformer(result_id='SNAPSHOT').visit(node)
+        namespace = {'__builtins__': builtins}
+        namespace.update(dependencies)
+        if setup != 'pass':
+            exec(compile(setup, SETUP_SRC_NAME, 'exec'), namespace)
 
-            locals_ = dict()
-            code = compile(node, DUMMY_SRC_NAME, 'exec')
-            exec(code, globals(), locals_)
+        locals_ = dict()
+        exec(code, namespace, locals_)
 
         new_obj = locals_[function_or_method.__name__]
         if hasattr(new_obj, '__func__'):
@@ -248,16 +1598,197 @@ class Tracer(object):
             # function or method
             self._function_or_method = new_obj
 
-        if hasattr(function_or_method, '__self__'):
-            self._class_instance = function_or_method.__self__
+        self._namespace = namespace
+        self._source_lines = instrumentation.source_lines
+        self._lineno = instrumentation.lineno
+        self._filepath = inspect.getfile(function_or_method)
+        self._code_filename = code.co_filename
+        self._code_lines = None
+
+    @property
+    def is_coroutine_function(self):
+        '''bool: True if the target is a coroutine function.'''
+        return self._is_coroutine_function
+
+    @property
+    def is_generator_function(self):
+        '''bool: True if the target is a generator function.'''
+        return self._is_generator_function
+
+    @property
+    def enable_line_probe(self):
+        '''bool: True if the statements of the target are probed.'''
+        return self._enable_line_probe
+
+    @property
+    def metadata(self):
+        ''':class:`TargetMetadata` of the target.'''
+        return TargetMetadata(
+            qualname=self._qualname,
+            filepath=self._filepath,
+            lineno=self._lineno,
+            source_lines=tuple(self._source_lines),
+            code_filename=self._code_filename,
+            code_lines=self._code_lines
+        )
+
+    def _make_call(self, timed=False, sampler=None, untraced=False):
+        '''Make the hooks and the line probe of a new call.
+
+        Returns:
+            tuple: :class:`TracedCall` or :class:`UntracedCall`, and the line probe.
+        '''
+        if timed:
+            return UntracedCall(), LineTimer()
+        if untraced:
+            return UntracedCall(), NullLineProbe()
+
+        if sampler is not None:
+            # The line probe would reset the peak seen by the sampler.
+            probe = NullLineProbe()
+        elif self._read_memory is None:
+            probe = LineProbe()
         else:
-            self._class_instance = None
+            probe = NativeLineProbe(self._read_memory)
+        return TracedCall(SESSION, nframe=self._nframe, probe=probe, guard=self._guard), probe
 
-        self._source_lines = source_lines
-        self._lineno = lineno
-        self._filepath = inspect.getfile(function_or_method)
-        self._enable_auto_resolve = enable_auto_resolve
-        self._dependencies = dependencies
+    def _bind(self, setup='pass', timed=False, sampler=None, untraced=False):
+        '''Bind the instrumented target to the hooks of a new call.
+
+        The call runs with its own copy of the globals of the target,
+        which holds the hooks and receives the snapshot.
+
+        Args:
+            setup (str):
+            timed (bool): Time every statement instead of tracing the call.
+            sampler (:class:`TimelineSampler`):
+            untraced (bool): Neither trace nor time the call, because
+                the caller traces it.
+
+        Returns:
+            tuple: The function, the hooks and the line probe of the call.
+        '''
+        globals_ = self._namespace.copy()
+        if not self._enable_auto_resolve and setup != 'pass':
+            exec(compile(setup, SETUP_SRC_NAME, 'exec'), globals_)
+
+        call, probe = self._make_call(timed=timed, sampler=sampler, untraced=untraced)
+        globals_.update(
+            start=call.start,
+            take_snapshot=call.take_snapshot,
+            stop=call.stop,
+            SNAPSHOT=None,
+            LINE_PROBE=probe
+        )
+
+        origin = self._function_or_method
+        function = FunctionType(
+            origin.__code__,
+            globals_,
+            origin.__name__,
+            origin.__defaults__,
+            origin.__closure__
+        )
+        function.__kwdefaults__ = origin.__kwdefaults__
+
+        if self._class_instance is not None:
+            function = function.__get__(self._class_instance)
+
+        return function, call, probe
+
+    def _capture(self, call, probe, timed=False, sampler=None, shared=False):
+        '''Return :class:`Capture` of a call which returned.'''
+        if timed:
+            return Capture(
+                snapshot=None,
+                line_stats=None,
+                shared=False,
+                line_churn=None,
+                line_times=probe.line_times,
+                line_native=None
+            )
+
+        probed = self._enable_line_probe and sampler is None
+        return Capture(
+            snapshot=call.snapshot,
+            line_stats=probe.line_stats if probed else None,
+            shared=call.shared or shared,
+            line_churn=probe.line_churn if probed else None,
+            line_times=None,
+            line_native=probe.line_native if probed and self._read_memory is not None else None
+        )
+
+    def _call(self, args=(), kwargs=None, setup='pass', timed=False, sampler=None):
+        '''Call the instrumented target.
+
+        Args:
+            args (tuple):
+            kwargs (dict):
+            setup (str): Run-time dependencies.
+                This parameter is ignored if enable_auto_resolve is enabled.
+            timed (bool): Time every statement instead of tracing the call.
+            sampler (:class:`TimelineSampler`): Sample the traced memory
+                during the call, instead of probing every statement.
+
+        Returns:
+            tuple: The return value and :class:`Capture`. The return value of
+                a generator function is the value of its return statement.
+
+        Raises:
+            TypeError: If the target is a coroutine function.
+        '''
+        if self._is_coroutine_function:
+            raise TypeError('A coroutine function is traced by run_async or trace_async.')
+
+        function, call, probe = self._bind(setup=setup, timed=timed, sampler=sampler)
+        if kwargs is None:
+            kwargs = dict()
+
+        if sampler is not None:
+            sampler.start()
+        try:
+            ret = function(*args, **kwargs)
+            if self._is_generator_function:
+                ret = exhaust(ret)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+
+        return ret, self._capture(call, probe, timed=timed, sampler=sampler)
+
+    @coroutine
+    def _call_async(self, args=(), kwargs=None, setup='pass', timed=False):
+        '''Await the instrumented coroutine function.
+
+        The statements are not charged what the other tasks allocate while
+        the coroutine is suspended. If it was suspended, the capture is
+        shared, and only the traces allocated under the target are kept
+        when the tracebacks have several frames.
+
+        Args:
+            args (tuple):
+            kwargs (dict):
+            setup (str): Run-time dependencies.
+                This parameter is ignored if enable_auto_resolve is enabled.
+            timed (bool): Time every statement instead of tracing the call.
+
+        Returns:
+            tuple: The return value and :class:`Capture`.
+
+        Raises:
+            TypeError: If the target is not a coroutine function.
+        '''
+        if not self._is_coroutine_function:
+            raise TypeError('The target is not a coroutine function.')
+
+        function, call, probe = self._bind(setup=setup, timed=timed)
+        if kwargs is None:
+            kwargs = dict()
+
+        driver = CoroutineDriver(function(*args, **kwargs), probe)
+        ret = yield from driver
+
+        return ret, self._capture(call, probe, timed=timed, shared=driver.num_suspensions > 0)
 
     def _take_snapshot(
         self,
@@ -272,190 +1803,358 @@ class Tracer(object):
                 This parameter is ignored if enable_auto_resolve is enabled.
 
         Returns:
-            tracemalloc.Snapshot
+            tuple: tracemalloc.Snapshot and the line stats of :class:`LineProbe`.
+                The line stats are None if the line probe is disabled.
         '''
-        extras = {'SNAPSHOT': None}
-        if self._enable_auto_resolve:
-            extras.update(self._dependencies)
-            setup = 'pass'
+        _, capture = self._call(kwargs=target_args, setup=setup)
+        return capture.snapshot, capture.line_stats
 
-        with apply_modules_temporarily(setup=setup, extras=extras):
-            global SNAPSHOT
+    def run(
+        self,
+        target_args=None,
+        setup='pass',
+        include_patterns=None,
+        exclude_patterns=None,
+        repeat=1,
+        warmup=0,
+        include_domains=None,
+        exclude_domains=None
+    ):
+        '''Trace the target and return the result.
 
-            if target_args is None:
-                target_args = dict()
+        Args:
+            target_args (dict):
+            setup (str): Run-time dependencies.
+                This parameter is ignored if enable_auto_resolve is enabled.
+            include_patterns (set): Specify patterns of file paths to include in the output.
+            exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+            repeat (int): Number of traced runs. If more than 1, the values
+                are the medians over the runs. See :meth:`TraceResult.from_runs`.
+            warmup (int): Number of runs discarded before the traced ones,
+                which pay for the caches and the pools allocated lazily.
+            include_domains (set): Specify tracemalloc domains to include in the output.
+            exclude_domains (set): Specify tracemalloc domains to exclude in the output.
 
-            if self._class_instance is None:
-                self._function_or_method(**target_args)
-            else:
-                self._function_or_method(self._class_instance, **target_args)
+        Returns:
+            :class:`TraceResult`
+        '''
+        if repeat < 1 or warmup < 0:
+            raise ValueError('The repeat must be positive and the warmup must not be negative.')
+
+        for _ in range(warmup):
+            self._call(kwargs=target_args, setup=setup)
+
+        results = list()
+        for _ in range(repeat):
+            line_times = None
+            if self._enable_line_timer:
+                _, timing = self._call(kwargs=target_args, setup=setup, timed=True)
+                line_times = timing.line_times
+
+            _, capture = self._call(kwargs=target_args, setup=setup)
+            results.append(self._analyze(
+                capture,
+                line_times=line_times,
+                include_patterns=include_patterns,
+                exclude_patterns=exclude_patterns,
+                include_domains=include_domains,
+                exclude_domains=exclude_domains
+            ))
 
-            return SNAPSHOT
+        return TraceResult.from_runs(results)
 
-    def trace(
+    @coroutine
+    def run_async(
         self,
         target_args=None,
         setup='pass',
-        related_traces_output_mode=RelatedTracesOutputMode.NONE,
         include_patterns=None,
-        exclude_patterns=None
+        exclude_patterns=None,
+        repeat=1,
+        warmup=0,
+        include_domains=None,
+        exclude_domains=None
     ):
-        '''Display the trace result.
+        '''Trace the coroutine function and return the result.
+
+        This is a coroutine, which awaits the target in the task of the caller::
+
+            result = await tracer.run_async(target_args=dict(request=request))
+
+        The other tasks keep running while the target awaits. Their allocations
+        are not charged to the statements of the target, and they are left out
+        of the traces if the tracebacks have several frames (`nframe`).
+
+        Args:
+            The same as :meth:`run`.
+
+        Returns:
+            :class:`TraceResult`
+        '''
+        if repeat < 1 or warmup < 0:
+            raise ValueError('The repeat must be positive and the warmup must not be negative.')
+
+        for _ in range(warmup):
+            yield from self._call_async(kwargs=target_args, setup=setup)
+
+        results = list()
+        for _ in range(repeat):
+            line_times = None
+            if self._enable_line_timer:
+                _, timing = yield from self._call_async(
+                    kwargs=target_args,
+                    setup=setup,
+                    timed=True
+                )
+                line_times = timing.line_times
+
+            _, capture = yield from self._call_async(kwargs=target_args, setup=setup)
+            results.append(self._analyze(
+                capture,
+                line_times=line_times,
+                include_patterns=include_patterns,
+                exclude_patterns=exclude_patterns,
+                include_domains=include_domains,
+                exclude_domains=exclude_domains
+            ))
+
+        return TraceResult.from_runs(results)
+
+    def dump(self, path, target_args=None, setup='pass', chunk_size=DEFAULT_CHUNK_SIZE):
+        '''Trace the target and dump the snapshot for offline analysis.
+
+        The snapshot is written as is, with what the analysis needs to know
+        about the target, and released. It is analyzed later by
+        :func:`analyze_dump` or `python -m malloc_tracer analyze`.
 
         Args:
+            path (str):
             target_args (dict):
             setup (str): Run-time dependencies.
                 This parameter is ignored if enable_auto_resolve is enabled.
-            related_traces_output_mode (:class:`RelatedTracesOutputMode`):
-            include_patterns (set): Specify patterns of file paths to include in the output.
-            exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+            chunk_size (int): Number of traces in a chunk of the dump.
         '''
-        snapshot = self._take_snapshot(
-            target_args=target_args,
-            setup=setup
+        _, capture = self._call(kwargs=target_args, setup=setup)
+        write_dump(
+            path,
+            capture.snapshot,
+            header={
+                'metadata': self.metadata._asdict(),
+                'shared': capture.shared,
+                'line_stats': capture.line_stats,
+                'line_churn': capture.line_churn,
+                'line_native': capture.line_native,
+            },
+            chunk_size=chunk_size
         )
 
-        if include_patterns is None:
-            include_patterns = set('*')
+    def timeline(
+        self,
+        target_args=None,
+        setup='pass',
+        interval=0.01,
+        capacity=100000,
+        file=None
+    ):
+        '''Sample the traced memory over the time of a call.
 
-        if exclude_patterns is None:
-            exclude_patterns = set()
+        A background thread samples the traced memory at a fixed interval,
+        with the line of the target which is executing. This is meant for
+        targets which run long enough to be sampled many times.
+        The target is called in the current thread, and the sampler waits
+        for the GIL, so intervals shorter than `sys.getswitchinterval()`
+        are stretched while the target runs Python code.
 
-        recorder = TraceRecorder()
-        stats = snapshot.statistics('lineno')
-        for stat in stats:
-            frame = stat.traceback[0]
-
-            if frame.filename != DUMMY_SRC_NAME:
-                if not any(fnmatch.fnmatch(frame.filename, pattern) for pattern in include_patterns):
-                    continue
-                if any(fnmatch.fnmatch(frame.filename, pattern) for pattern in exclude_patterns):
-                    continue
-
-            recorder.add_trace(
-                filepath=frame.filename,
-                lineno=frame.lineno,
-                size=stat.size
-            )
+        Args:
+            target_args (dict):
+            setup (str): Run-time dependencies.
+                This parameter is ignored if enable_auto_resolve is enabled.
+            interval (float): Interval between the samples in seconds.
+            capacity (int): Number of the most recent samples which are kept.
+            file: A text stream which receives every sample as newline delimited JSON.
 
-        # for DUMMY_SRC_NAME.
-        print('<< Target traces >>')
-        print('File "{}"'.format(self._filepath))
-        print('Line #    Size          Line Contents')
-        print('=' * (24+80))
+        Returns:
+            :class:`Timeline`
+        '''
+        sampler = TimelineSampler(
+            thread_id=threading.get_ident(),
+            filename=self._code_filename,
+            interval=interval,
+            capacity=capacity,
+            file=file,
+            lineno_offset=self._lineno - 1 if self._code_lines is None else 0,
+            hook_filename=PROBE_FILENAME,
+            owns_peak=SESSION.owns_peak
+        )
+        self._call(kwargs=target_args, setup=setup, sampler=sampler)
+
+        return Timeline(
+            qualname=self._qualname,
+            filepath=self._filepath,
+            lineno=self._lineno,
+            source_lines=''.join(self._source_lines).rstrip().split('\n'),
+            samples=sampler.samples,
+            interval=interval,
+            num_samples=sampler.num_samples
+        )
 
-        traces = recorder.list_traces_for_each_file(filepath=DUMMY_SRC_NAME)
-        lineno_to_size = {trace[0]: trace[1] for trace in traces}
+    def _record(
+        self,
+        capture,
+        include_patterns=None,
+        exclude_patterns=None,
+        include_domains=None,
+        exclude_domains=None
+    ):
+        '''Record the traces of the snapshot for each line.
 
-        source_text = ''.join(self._source_lines).rstrip()
-        for lineno, line in enumerate(source_text.split(sep='\n'), 1):
-            if lineno_to_size:
-                size = lineno_to_size.get(lineno)
-                size = ' ' * 10 if size is None else bytes_to_hrf(size)
-            else:
-                size = ' ' * 10
+        If other calls were traced at the same time, only the traces allocated
+        under this call are kept. This requires tracebacks of several frames;
+        with a single frame, the related traces may include those of others.
 
-            print('{lineno:6d}    {size:10s}    {contents}'.format(
-                lineno=self._lineno + lineno - 1,
-                size=size,
-                contents=line
-            ))
+        Args:
+            capture (:class:`Capture`):
+            include_patterns (set):
+            exclude_patterns (set):
+            include_domains (set):
+            exclude_domains (set):
 
-        if traces:
-            num_lines = len(traces)
-            total = sum(trace[1] for trace in traces)
-        else:
-            num_lines = 0
-            total = 0
-
-        print('-' * (24 + 80))
-        print('{:6d}    {:10s} (raw {} B)'.format(
-            num_lines,
-            bytes_to_hrf(total),
-            total
-        ))
+        Returns:
+            tuple: :class:`TraceRecorder`, the total size and the total number
+                of memory blocks of the unfiltered snapshot.
+        '''
+        recorder = TraceRecorder()
+        total_size, total_count = record_snapshot(
+            recorder,
+            capture.snapshot,
+            self._code_filename,
+            shared=capture.shared,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains,
+            code_lines=self._code_lines
+        )
+        return recorder, total_size, total_count
 
-        # for others.
-        if related_traces_output_mode == RelatedTracesOutputMode.NONE:
-            print()
-        elif related_traces_output_mode == RelatedTracesOutputMode.FOR_EACH_FILE:
-            print()
-            self._display_related_traces_for_each_file(recorder)
-        elif related_traces_output_mode == RelatedTracesOutputMode.IN_DESCENDING_ORDER:
-            print()
-            self._display_related_traces_in_descending_order(recorder)
-
-        # Total allocated size.
-        total = sum(stat.size for stat in stats)
-        print('Total allocated size: {} (raw {} B)'.format(
-            bytes_to_hrf(total).lstrip(),
-            total
-        ))
+    def _analyze(
+        self,
+        capture,
+        line_times=None,
+        include_patterns=None,
+        exclude_patterns=None,
+        include_domains=None,
+        exclude_domains=None
+    ):
+        '''Make the result of a traced call.'''
+        recorder, total_size, total_count = self._record(
+            capture,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains
+        )
+        return self._make_result(
+            recorder=recorder,
+            line_stats=capture.line_stats,
+            total_size=total_size,
+            total_count=total_count,
+            line_churn=capture.line_churn,
+            line_times=line_times,
+            line_native=capture.line_native
+        )
 
-    @staticmethod
-    def _display_related_traces_for_each_file(recorder):
-        '''Displays related traces for each file.'''
-        filepaths = recorder.list_filepaths()
-        filepaths.sort()
-        try:
-            filepaths.remove(DUMMY_SRC_NAME)
-        except ValueError:
-            pass
-
-        for filepath in filepaths:
-            print('<< Related traces >>')
-            print('File "{}"'.format(filepath))
-            print('Line #    Size          Line Contents')
-            print('=' * (24 + 80))
-
-            traces = recorder.list_traces_for_each_file(filepath=filepath)
-            traces.sort(key=lambda trace: trace[0])
-
-            total = 0
-            for lineno, size in traces:
-                print('{lineno:6d}    {size:10s}    {contents}'.format(
-                    lineno=lineno,
-                    size=bytes_to_hrf(size),
-                    contents=linecache.getline(filepath, lineno).rstrip()
-                ))
-                total += size
-
-            linecache.clearcache()
-
-            print('-' * (24 + 80))
-            print('{:6d}    {:10s} (raw {} B)\n'.format(
-                len(traces),
-                bytes_to_hrf(total),
-                total
-            ))
+    def _make_result(
+        self,
+        recorder,
+        line_stats,
+        total_size,
+        total_count,
+        line_churn=None,
+        line_times=None,
+        line_native=None
+    ):
+        '''Make the result from the recorded traces.'''
+        return make_result(
+            recorder,
+            self.metadata,
+            line_stats=line_stats,
+            total_size=total_size,
+            total_count=total_count,
+            line_churn=line_churn,
+            line_times=line_times,
+            line_native=line_native
+        )
 
-    @staticmethod
-    def _display_related_traces_in_descending_order(recorder):
-        '''Display related traces in descending order.'''
-        traces = recorder.list_all_related_trace()
-        if not traces:
-            return
+    def trace(
+        self,
+        target_args=None,
+        setup='pass',
+        related_traces_output_mode=RelatedTracesOutputMode.NONE,
+        include_patterns=None,
+        exclude_patterns=None,
+        repeat=1,
+        warmup=0,
+        include_domains=None,
+        exclude_domains=None
+    ):
+        '''Display the trace result.
 
-        traces.sort(key=lambda trace: (-trace[2], trace[0], trace[1]))
+        Args:
+            target_args (dict):
+            setup (str): Run-time dependencies.
+                This parameter is ignored if enable_auto_resolve is enabled.
+            related_traces_output_mode (:class:`RelatedTracesOutputMode`):
+            include_patterns (set): Specify patterns of file paths to include in the output.
+            exclude_patterns (set): Specify patterns of file paths to exclude in the output.
+            repeat (int): Number of traced runs.
+            warmup (int): Number of runs discarded before the traced ones.
+            include_domains (set): Specify tracemalloc domains to include in the output.
+            exclude_domains (set): Specify tracemalloc domains to exclude in the output.
+        '''
+        result = self.run(
+            target_args=target_args,
+            setup=setup,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            repeat=repeat,
+            warmup=warmup,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains
+        )
+        render_text(result, related_traces_output_mode=related_traces_output_mode)
 
-        print('<< Related traces >>')
-        print('Line #    Size          Line Contents')
-        print('=' * (24 + 80))
+    @coroutine
+    def trace_async(
+        self,
+        target_args=None,
+        setup='pass',
+        related_traces_output_mode=RelatedTracesOutputMode.NONE,
+        include_patterns=None,
+        exclude_patterns=None,
+        repeat=1,
+        warmup=0,
+        include_domains=None,
+        exclude_domains=None
+    ):
+        '''Display the trace result of the coroutine function.
 
-        for index, trace in enumerate(traces, 1):
-            filepath, lineno, size = trace
-            print('#{} "{}": (raw {} B)'.format(
-                index,
-                filepath,
-                size
-            ))
-            print('{lineno:6d}    {size:10s}    {contents}\n'.format(
-                lineno=lineno,
-                size=bytes_to_hrf(size),
-                contents=linecache.getline(filepath, lineno).rstrip()
-            ))
+        This is a coroutine. See :meth:`run_async`.
 
-        linecache.clearcache()
+        Args:
+            The same as :meth:`trace`.
+        '''
+        result = yield from self.run_async(
+            target_args=target_args,
+            setup=setup,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            repeat=repeat,
+            warmup=warmup,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains
+        )
+        render_text(result, related_traces_output_mode=related_traces_output_mode)
 
 
 def trace(
@@ -467,18 +2166,38 @@ def trace(
     rtime_setup='pass',
     related_traces_output_mode=RelatedTracesOutputMode.NONE,
     include_patterns=None,
-    exclude_patterns=None
+    exclude_patterns=None,
+    enable_line_probe=False,
+    nframe=1,
+    repeat=1,
+    warmup=0,
+    enable_line_timer=False,
+    include_domains=None,
+    exclude_domains=None,
+    enable_native_probe=False,
+    tracer_class=Tracer
 ):
-    '''Convenience function to create Tracer object and call trace method.'''
-    tracer = Tracer(
+    '''Convenience function to create Tracer object and call trace method.
+
+    `tracer_class` is :class:`Tracer` or a subclass such as :class:`HookTracer`.
+    '''
+    tracer = tracer_class(
         function_or_method=function_or_method,
         enable_auto_resolve=enable_auto_resolve,
-        setup=ctime_setup
+        setup=ctime_setup,
+        enable_line_probe=enable_line_probe,
+        nframe=nframe,
+        enable_line_timer=enable_line_timer,
+        enable_native_probe=enable_native_probe
     )
     tracer.trace(
         target_args=target_args,
         setup=rtime_setup,
         related_traces_output_mode=related_traces_output_mode,
         include_patterns=include_patterns,
-        exclude_patterns=exclude_patterns
+        exclude_patterns=exclude_patterns,
+        repeat=repeat,
+        warmup=warmup,
+        include_domains=include_domains,
+        exclude_domains=exclude_domains
     )
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import tokenize
+import linecache
+
+
+__all__ = ['ReportWriter', 'SourceCache']
+
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class SourceCache(object):
+    '''The lines of the source files displayed by a report.
+
+    Each file is read once for the whole report, and the lines are
+    released with the cache. The global cache of `linecache` is left
+    untouched for the files which can be read directly.
+    '''
+    def __init__(self):
+        self._files = dict()
+
+    def getlines(self, filepath):
+        '''Return the lines of the file, or an empty list if it cannot be read.'''
+        lines = self._files.get(filepath)
+        if lines is None:
+            try:
+                with tokenize.open(filepath) as f:
+                    lines = f.readlines()
+            except (OSError, SyntaxError, UnicodeDecodeError):
+                # Such as the modules in zip files.
+                lines = linecache.getlines(filepath)
+            self._files[filepath] = lines
+
+        return lines
+
+    def getline(self, filepath, lineno):
+        '''Return the line of the file, or an empty string.'''
+        lines = self.getlines(filepath)
+        if 1 <= lineno <= len(lines):
+            return lines[lineno - 1]
+        return ''
+
+
+class ReportWriter(object):
+    '''Buffer the output of a report and write it in large chunks.
+
+    It is a text stream which can be passed to `print`. The output is
+    written to the file when the buffer is full and when the writer is
+    flushed or closed. If the file is None, `sys.stdout` is looked up when
+    the output is written, and the output is discarded if there is no
+    standard output, as in pythonw.
+
+    Args:
+        file: A text stream. sys.stdout is used if None.
+        buffer_size (int): Number of characters buffered before they are written.
+        sources (:class:`SourceCache`): The source lines shared by the report.
+    '''
+    def __init__(self, file=None, buffer_size=DEFAULT_BUFFER_SIZE, sources=None):
+        self._file = file
+        self._buffer_size = buffer_size
+        self._chunks = list()
+        self._size = 0
+        self.sources = SourceCache() if sources is None else sources
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def write(self, s):
+        self._chunks.append(s)
+        self._size += len(s)
+        if self._size >= self._buffer_size:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        '''Write the buffered output to the file.'''
+        if not self._chunks:
+            return
+
+        text = ''.join(self._chunks)
+        self._chunks = list()
+        self._size = 0
+
+        file = sys.stdout if self._file is None else self._file
+        if file is not None:
+            file.write(text)
+
+    def getline(self, filepath, lineno):
+        '''Return the line of the source file, or an empty string.'''
+        return self.sources.getline(filepath, lineno)
@@ -45,4 +45,7 @@ if __name__ == '__main__':
         ],
         python_requires='>=3.4',
         install_requires=[],
+        entry_points={
+            'pytest11': ['malloc_tracer = malloc_tracer.pytest_plugin'],
+        },
     )
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# The coroutine functions are a syntax error before Python 3.5,
+# so the test modules only import them on later versions.
+import asyncio
+
+
+async def coroutine_function(size):
+    buf = bytearray(size)
+    await asyncio.sleep(0)
+    return len(buf)
+
+
+async def allocate_while_suspended(num, size, bufs):
+    for _ in range(num):
+        bufs.append(bytearray(size))
+        await asyncio.sleep(0)
+
+
+async def trace_while_allocating(tracer, size, bufs):
+    task = asyncio.ensure_future(allocate_while_suspended(3, 1000000, bufs))
+    result = await tracer.run_async(target_args=dict(size=size))
+    await task
+    return result
+
+
+async def cancel_trace(tracer):
+    '''Return True if the traced call was cancelled.'''
+    task = asyncio.ensure_future(tracer.run_async(target_args=dict(size=10)))
+    await asyncio.sleep(0)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        return True
+    return False
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.baseline import *
+from malloc_tracer.result import TraceResult, TargetLine
+
+
+def make_result(lineno, sizes):
+    contents = (
+        'def function(num):',
+        '    l = list(range(num))',
+        '    m = list(range(num))',
+        '    m = list(range(num))',
+        '    return l, m',
+    )
+    return TraceResult(
+        qualname='function',
+        filepath='/path/to/module.py',
+        lineno=lineno,
+        target_lines=[
+            TargetLine(lineno + index, line, size, None if size is None else 1)
+            for index, (line, size) in enumerate(zip(contents, sizes))
+        ],
+        related_traces=[],
+        total_size=sum(size or 0 for size in sizes),
+        total_count=0
+    )
+
+
+class TestBaseline(TestCase):
+
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        self.path = os.path.join(self.dirpath, 'baseline.json')
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rmdir(self.dirpath)
+
+    def test_save_and_load(self):
+        baseline = Baseline(self.path)
+        self.assertEqual(len(baseline), 0)
+        baseline.update(make_result(10, (None, 1000, 2000, 3000, None)))
+        baseline.save()
+
+        baseline = Baseline(self.path)
+        self.assertIn('function', baseline)
+        self.assertEqual(baseline.names(), ['function'])
+        diff = baseline.diff(make_result(10, (None, 1000, 2000, 3000, None)))
+        self.assertFalse(diff)
+        self.assertEqual(len(diff.lines), 3)
+        self.assertEqual(diff.baseline_total, 6000)
+
+    def test_line_shift(self):
+        baseline = Baseline(self.path)
+        baseline.update(make_result(10, (None, 1000, 2000, 3000, None)))
+
+        diff = baseline.diff(make_result(20, (None, 1000, 2000, 3500, None)))
+        self.assertEqual(len(diff.regressions), 1)
+        line = diff.regressions[0]
+        self.assertEqual(line.lineno, 23)
+        self.assertEqual(line.contents, 'm = list(range(num))')
+        self.assertEqual((line.baseline, line.current), (3000, 3500))
+
+    def test_thresholds(self):
+        baseline = Baseline(self.path)
+        baseline.update(make_result(10, (None, 1000, 2000, 3000, None)))
+        result = make_result(10, (None, 1100, 1000, 3000, 64))
+
+        diff = baseline.diff(result)
+        self.assertEqual([line.lineno for line in diff.regressions], [11, 14])
+        self.assertEqual([line.lineno for line in diff.improvements], [12])
+        self.assertFalse(diff.total_regressed)
+        with self.assertRaises(AllocationRegression):
+            diff.check()
+
+        diff = baseline.diff(result, abs_threshold=128)
+        self.assertEqual(len(diff.regressions), 0)
+        diff = baseline.diff(result, rel_threshold=0.2)
+        self.assertEqual([line.lineno for line in diff.regressions], [14])
+
+    def test_removed_line(self):
+        baseline = Baseline(self.path)
+        baseline.update(make_result(10, (None, 1000, 2000, 3000, None)))
+        result = make_result(10, (None, 1000, 2000, 3000, None))
+        result = TraceResult(
+            qualname=result.qualname,
+            filepath=result.filepath,
+            lineno=result.lineno,
+            target_lines=result.target_lines[:3] + result.target_lines[4:],
+            related_traces=[],
+            total_size=3000,
+            total_count=2
+        )
+        diff = baseline.diff(result)
+        removed = [line for line in diff.lines if line.lineno is None]
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(removed[0].contents, 'm = list(range(num))#1')
+        self.assertEqual(removed[0].current, None)
+        self.assertEqual(diff.current_total, 3000)
+        self.assertFalse(diff)
+
+    def test_check(self):
+        baseline = Baseline(self.path)
+        self.assertIsNone(baseline.check(make_result(10, (None, 1000, 2000, 3000, None))))
+        self.assertFalse(baseline.check(make_result(10, (None, 1000, 2000, 3000, None))))
+        with self.assertRaises(AllocationRegression) as cm:
+            baseline.check(make_result(10, (None, 5000, 2000, 3000, None)), name='function')
+        self.assertIn('l = list(range(num))', str(cm.exception))
+        self.assertIsNone(baseline.check(make_result(10, (None, 5000, 2000, 3000, None)), update=True))
+
+        with self.assertRaises(KeyError):
+            baseline.diff(make_result(10, (None, 1000, 2000, 3000, None)), name='other')
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import asyncio
+import tracemalloc
+from unittest import TestCase, skipIf
+import sys
+sys.path.append('../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from malloc_tracer.tracer import Tracer
+if sys.version_info >= (3, 5):
+    from coroutine_fixtures import *
+
+
+def function(num):
+    return len(list(range(num)))
+
+
+def run_until_complete(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@skipIf(sys.version_info < (3, 5), 'requires async def')
+class TestCoroutine(TestCase):
+
+    def test_coroutine_function(self):
+        tracer = Tracer(coroutine_function, enable_line_probe=True, nframe=5)
+        self.assertTrue(tracer.is_coroutine_function)
+        with self.assertRaises(TypeError):
+            tracer.run(target_args=dict(size=10000))
+
+        bufs = list()
+        result = run_until_complete(trace_while_allocating(tracer, 10000, bufs))
+        self.assertEqual(len(bufs), 3)
+        line = result.target_lines[1]
+        self.assertEqual(line.contents.strip(), 'buf = bytearray(size)')
+        self.assertGreaterEqual(line.size, 10000)
+        self.assertLess(line.size, 11000)
+        # The other task allocated while the target awaited.
+        line = result.target_lines[2]
+        self.assertEqual(line.contents.strip(), 'await asyncio.sleep(0)')
+        self.assertLess(line.delta, 10000)
+        self.assertEqual(line.hits, 1)
+        self.assertLess(result.total_size, 1000000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        with self.assertRaises(TypeError):
+            run_until_complete(Tracer(function).run_async(target_args=dict(num=10)))
+
+    def test_coroutine_function_cancelled(self):
+        self.assertTrue(run_until_complete(cancel_trace(Tracer(coroutine_function))))
+        self.assertFalse(tracemalloc.is_tracing())
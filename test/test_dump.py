@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import os
+import json
+import pickle
+import tempfile
+import contextlib
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.tracer import *
+from malloc_tracer.tracer import TraceRecorder, TargetMetadata, record_snapshot, make_result
+from malloc_tracer.dump import *
+from malloc_tracer.__main__ import main
+
+
+def function(num):
+    l = [str(i) for i in range(num)]
+    d = {i: i for i in range(num)}
+    return len(l) + len(d)
+
+
+class TestDump(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, 'trace.dump')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_analyze_dump(self):
+        tracer = Tracer(function, nframe=5)
+        tracer.dump(self.path, target_args=dict(num=1000), chunk_size=3)
+
+        dump = SnapshotDump(self.path)
+        self.assertEqual(dump.header['metadata']['qualname'], 'function')
+        self.assertGreater(len(list(dump.iter_snapshots())), 1)
+
+        # Recording the chunks one by one is the same as recording the whole snapshot.
+        snapshot = dump.load_snapshot()
+        self.assertEqual(len(snapshot.traces), dump.num_traces)
+        recorder = TraceRecorder()
+        total_size, total_count = record_snapshot(
+            recorder, snapshot, tracer.metadata.code_filename
+        )
+        expected = make_result(recorder, tracer.metadata, None, total_size, total_count)
+
+        result = analyze_dump(self.path)
+        self.assertEqual(result, expected)
+        self.assertGreater(result.target_lines[1].size, 0)
+        self.assertTrue(result.has_inclusive)
+
+        result = analyze_dump(self.path, exclude_patterns={'*'})
+        self.assertEqual(result.related_traces, ())
+        self.assertEqual(result.target_lines, expected.target_lines)
+        self.assertEqual(result.total_size, expected.total_size)
+
+    def test_unsupported_dump(self):
+        with open(self.path, 'wb') as f:
+            pickle.dump({'version': 0}, f)
+        with self.assertRaises(ValueError):
+            SnapshotDump(self.path)
+
+    def test_cli(self):
+        Tracer(function).dump(self.path, target_args=dict(num=100))
+
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            status = main(['analyze', self.path, '--related', 'in-descending-order'])
+        self.assertEqual(status, 0)
+        self.assertIn('<< Target traces >>', stream.getvalue())
+
+        output = os.path.join(self.tempdir.name, 'result.json')
+        status = main(['analyze', self.path, '--format', 'json', '--exclude', '*', '-o', output])
+        self.assertEqual(status, 0)
+        with open(output) as f:
+            self.assertEqual(json.load(f)['qualname'], 'function')
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(main(['analyze', os.path.join(self.tempdir.name, 'missing')]), 1)
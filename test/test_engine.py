@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import functools
+import tempfile
+import threading
+import contextlib
+import tracemalloc
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.tracer import Tracer, analyze_dump, trace
+from malloc_tracer.engine import *
+
+
+SCALE = 1000
+
+
+def decorate(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def make_list(num):
+    return [0] * num
+
+
+@decorate
+def function(num, scale=SCALE):
+    a = bytearray(num * scale)
+    b = [str(i) for i in range(num)]
+    c = make_list(num)
+    return len(a) + len(b) + len(c)
+
+
+def make_function(scale):
+    def closure(num):
+        buf = bytearray(num * scale)
+        return len(buf)
+    return closure
+
+
+def allocate_until(size, started, release):
+    buf = bytearray(size)
+    started.set()
+    release.wait(10)
+    return len(buf)
+
+
+def generator(num):
+    yield bytearray(num)
+
+
+class Target(object):
+
+    def method(self, num):
+        buf = bytearray(num)
+        return len(buf)
+
+
+SOURCE = '''def sourceless(num):
+    buf = bytearray(num)
+
+    return len(buf)
+'''
+
+
+class TestEngine(TestCase):
+
+    def test_trace(self):
+        tracer = HookTracer(function, enable_line_probe=True, nframe=5)
+        self.assertEqual(tracer.metadata.code_lines[0], function.__wrapped__.__code__.co_firstlineno)
+        ret, capture = tracer._call(kwargs=dict(num=1000))
+        self.assertEqual(ret, 1000 * SCALE + 2000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        result = tracer.run(target_args=dict(num=1000))
+        lines = {line.contents.strip(): line for line in result.target_lines}
+        line = lines['a = bytearray(num * scale)']
+        self.assertGreaterEqual(line.size, 1000 * SCALE)
+        self.assertGreaterEqual(line.peak, 1000 * SCALE)
+        self.assertEqual(line.hits, 1)
+        self.assertGreater(lines['b = [str(i) for i in range(num)]'].count, 1000)
+        # The callee is attributed to the line of the target.
+        line = lines['c = make_list(num)']
+        self.assertIsNone(line.size)
+        self.assertGreaterEqual(line.inclusive, 1000 * 8)
+        self.assertEqual(result.target_lines[0].contents.strip(), '@decorate')
+
+
+    def test_bind(self):
+        tracer = HookTracer(function, enable_line_probe=True)
+        hooked, call, probe = tracer._bind()
+        self.assertIs(hooked.__wrapped__, function)
+        self.assertEqual(hooked(num=10), 10 * SCALE + 20)
+        self.assertIsNotNone(call.snapshot)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(probe.line_churn[3][1], 1)
+
+        # The decorators are stripped, so the innermost function is called.
+        tracer = HookTracer(function, strip_decorators=True)
+        self.assertIs(tracer._bind(untraced=True)[0], function.__wrapped__)
+        result = tracer.run(target_args=dict(num=1000))
+        self.assertGreaterEqual(result.target_lines[2].size, 1000 * SCALE)
+
+        with contextlib.redirect_stdout(None):
+            trace(function, target_args=dict(num=10), tracer_class=HookTracer)
+
+    def test_without_line_probe(self):
+        # The snapshot is taken while the locals of the target are alive.
+        result = HookTracer(make_function(100)).run(target_args=dict(num=1000))
+        self.assertGreaterEqual(result.target_lines[1].size, 100 * 1000)
+        self.assertIsNone(result.target_lines[1].peak)
+
+    def test_line_timer(self):
+        tracer = HookTracer(function, enable_line_timer=True)
+        result = tracer.run(target_args=dict(num=100))
+        lines = {line.contents.strip(): line for line in result.target_lines}
+        self.assertGreater(lines['b = [str(i) for i in range(num)]'].time, 0)
+
+    def test_method(self):
+        target = Target()
+        for function_or_method in (target.method, Target.method):
+            tracer = HookTracer(function_or_method)
+            if function_or_method is Target.method:
+                result = tracer.run(target_args=dict(self=target, num=1000))
+            else:
+                result = tracer.run(target_args=dict(num=1000))
+            self.assertEqual(result.qualname, 'Target.method')
+            self.assertGreaterEqual(result.target_lines[1].size, 1000)
+
+    def test_patterns(self):
+        # The target is the original code, which the patterns would otherwise filter out.
+        tracer = HookTracer(make_function(100), nframe=5)
+        for patterns in (
+            dict(exclude_patterns={os.path.dirname(os.path.abspath(__file__)) + '/*'}),
+            dict(include_patterns={'*/site-packages/*'}),
+        ):
+            result = tracer.run(target_args=dict(num=1000), **patterns)
+            self.assertGreaterEqual(result.target_size, 100 * 1000)
+            self.assertGreaterEqual(result.target_lines[1].size, 100 * 1000)
+
+    def test_shared_tracer(self):
+        tracer = HookTracer(allocate_until, enable_line_probe=True)
+        started, release = threading.Event(), threading.Event()
+        results = list()
+        thread = threading.Thread(target=lambda: results.append(tracer.run(
+            target_args=dict(size=1000000, started=started, release=release)
+        )))
+        thread.start()
+        try:
+            self.assertTrue(started.wait(10))
+            with self.assertRaises(RuntimeError):
+                tracer.run(target_args=dict(size=1000, started=threading.Event(), release=release))
+        finally:
+            release.set()
+            thread.join(10)
+
+        self.assertGreaterEqual(results[0].target_lines[1].size, 1000000)
+        result = tracer.run(target_args=dict(size=1000, started=started, release=release))
+        self.assertLess(result.target_lines[1].size, 2000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_sourceless(self):
+        namespace = dict()
+        exec(compile(SOURCE, '<generated>', 'exec'), namespace)
+        tracer = HookTracer(namespace['sourceless'], enable_line_probe=True)
+        result = tracer.run(target_args=dict(num=1000))
+        self.assertEqual(len(result.target_lines), 4)
+        self.assertEqual(result.target_lines[1].contents, '')
+        self.assertGreaterEqual(result.target_lines[1].size, 1000)
+        self.assertEqual(result.target_lines[1].hits, 1)
+
+    def test_dump(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'trace.dump')
+            tracer = HookTracer(function, nframe=5)
+            tracer.dump(path, target_args=dict(num=1000))
+            result = analyze_dump(path)
+
+        self.assertEqual(len(result.target_lines), len(tracer.metadata.source_lines))
+        self.assertGreaterEqual(result.target_lines[2].size, 1000 * SCALE)
+
+    def test_unsupported(self):
+        with self.assertRaises(TypeError):
+            HookTracer(generator)
+        with self.assertRaises(TypeError):
+            HookTracer(len)
+
+        # The wrapper does not call the target.
+        tracer = HookTracer(function)
+        tracer._function_or_method = make_list
+        with self.assertRaises(RuntimeError):
+            tracer.run(target_args=dict(num=10))
+        self.assertFalse(tracemalloc.is_tracing())
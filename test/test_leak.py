@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import os
+import tracemalloc
+from unittest import TestCase
+import sys
+sys.path.append('../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from malloc_tracer.tracer import Tracer
+from malloc_tracer.engine import HookTracer
+from malloc_tracer.scaling import Complexity
+from malloc_tracer.leak import *
+from malloc_tracer.report import render_leaks_text
+if sys.version_info >= (3, 5):
+    from coroutine_fixtures import coroutine_function
+
+
+CACHE = dict()
+LEAKED = list()
+
+
+def remember(size):
+    LEAKED.append(bytearray(size))
+
+
+def handle(size):
+    if size not in CACHE:
+        CACHE[size] = bytearray(50000)
+    temporary = [str(i) for i in range(1000)]
+    remember(size)
+    return bytearray(len(temporary))
+
+
+class TestLeak(TestCase):
+
+    def tearDown(self):
+        CACHE.clear()
+        del LEAKED[:]
+
+    def test_find_leaks(self):
+        tracer = Tracer(handle, nframe=5)
+        leak_result = find_leaks(tracer, target_args=dict(size=2000), keep_results=True)
+        self.assertEqual(len(leak_result), 10)
+        self.assertEqual(len(LEAKED), 10)
+
+        # Cached once.
+        line = leak_result.lines[2]
+        self.assertEqual(line.contents.strip(), 'CACHE[size] = bytearray(50000)')
+        self.assertEqual(line.complexity, Complexity.CONSTANT)
+        self.assertEqual(line.per_call, 0)
+        self.assertGreaterEqual(line.values[-1], 50000)
+        # Freed by every call.
+        self.assertIsNone(leak_result.lines[3].values[-1])
+        # Kept by the caller.
+        line = leak_result.lines[5]
+        self.assertEqual(line.complexity, Complexity.LINEAR)
+        self.assertGreaterEqual(line.per_call, 1000)
+        self.assertLess(line.per_call, 1100)
+
+        # Retained by a callee.
+        line = leak_result.related[0]
+        self.assertEqual(line.lineno, remember.__code__.co_firstlineno + 1)
+        self.assertGreaterEqual(line.per_call, 2000)
+        self.assertLess(line.per_call, 2100)
+
+        self.assertEqual(leak_result.leaks()[0], line)
+        self.assertGreaterEqual(leak_result.per_call, 3000)
+        self.assertLess(leak_result.per_call, 3300)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        result = LeakResult.from_dict(leak_result.to_dict())
+        self.assertEqual(result.leaks(), leak_result.leaks())
+
+        stream = io.StringIO()
+        render_leaks_text(leak_result, file=stream)
+        self.assertIn('LEAKED.append(bytearray(size))', stream.getvalue())
+
+    def test_hook_tracer(self):
+        CACHE[2000] = bytearray(50000)
+        leak_result = find_leaks(HookTracer(handle), target_args=dict(size=2000), iterations=5)
+        self.assertEqual(len(LEAKED), 5)
+        # The cache was filled before, and the return values are dropped.
+        leaks = leak_result.leaks()
+        self.assertEqual(len(leaks), 1)
+        self.assertEqual(leaks[0].lineno, remember.__code__.co_firstlineno + 1)
+        # The interpreter may cache its data of a code on the first traced call, which is
+        # retained once: the monitoring data on 3.12+, the frame of a comprehension before 3.11.
+        self.assertTrue(all(line.per_call == 0 for line in leak_result.lines))
+        for line in leak_result.lines[2:]:
+            if 'temporary =' not in line.contents:
+                self.assertIsNone(line.values[-1])
+
+        # The target itself retains the memory.
+        leak_result = find_leaks(Tracer(remember), target_args=dict(size=2000), iterations=5)
+        self.assertEqual(leak_result.complexity, Complexity.LINEAR)
+        self.assertGreaterEqual(leak_result.lines[1].per_call, 2000)
+
+    def test_outer_session(self):
+        tracemalloc.start()
+        try:
+            kept = [bytearray(1000) for _ in range(1000)]
+            leak_result = find_leaks(Tracer(remember), target_args=dict(size=2000))
+            self.assertLess(leak_result.results[-1].total_size, 100000)
+            self.assertGreaterEqual(leak_result.lines[1].per_call, 2000)
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertGreaterEqual(tracemalloc.get_traced_memory()[0], len(kept) * 1000)
+        finally:
+            tracemalloc.stop()
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            find_leaks(Tracer(handle), target_args=dict(size=10), iterations=3)
+        if sys.version_info >= (3, 5):
+            with self.assertRaises(TypeError):
+                find_leaks(Tracer(coroutine_function), target_args=dict(size=10))
+        self.assertFalse(tracemalloc.is_tracing())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import ast
+import contextlib
+import tracemalloc
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.multitracer import *
+from malloc_tracer.tracer import CodeBlockCollector
+from malloc_tracer.report import render_multi_text, RelatedTracesOutputMode
+
+
+def make_buffer(size):
+    return bytearray(size)
+
+
+class Service(object):
+
+    def __init__(self):
+        self.items = list()
+
+    def handle(self, size):
+        self.items.append(self.load(size))
+        return len(self.items)
+
+    def load(self, size):
+        buf = make_buffer(size)
+        return buf
+
+    @staticmethod
+    def idle():
+        return None
+
+
+class TestMultiTracer(TestCase):
+
+    def test_code_block_collector(self):
+        source = (
+            'def f():\n'
+            '    return [\n'
+            '        1,\n'
+            '    ]\n'
+            '\n'
+            'class C:\n'
+            '    @staticmethod\n'
+            '    def g():\n'
+            '        pass\n'
+        )
+        collector = CodeBlockCollector(source)
+        collector.visit(ast.parse(source))
+        self.assertEqual(dict(collector.code_blocks), {'f': (1, 4), 'C.g': (7, 9)})
+
+    def test_class(self):
+        tracer = MultiTracer(Service)
+        self.assertEqual(
+            tracer.qualnames,
+            ('Service.__init__', 'Service.handle', 'Service.load', 'Service.idle')
+        )
+
+        service = Service()
+
+        def workload():
+            for _ in range(10):
+                service.handle(10000)
+            Service.idle()
+
+        result = tracer.run(workload)
+        self.assertEqual(len(result), 4)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        totals = {total.qualname: total for total in result.totals}
+        load = totals['Service.load']
+        handle = totals['Service.handle']
+        self.assertGreaterEqual(load.inclusive_size, 100000)
+        # The buffers are allocated by the callee. The line of the call only
+        # allocates the interpreter's bookkeeping for it: the frame of the
+        # callee before Python 3.11, or its monitoring data on 3.12+.
+        self.assertLess(load.size, load.inclusive_size / 100)
+        self.assertGreaterEqual(handle.inclusive_size, load.inclusive_size)
+        self.assertLess(handle.size, 1000)
+        # Only the monitoring data of the function itself on Python 3.12+.
+        self.assertLess(totals['Service.idle'].inclusive_size, 1000)
+        self.assertEqual(result.totals[0].qualname, 'Service.handle')
+
+        line = result['Service.load'].target_lines[1]
+        self.assertEqual(line.contents.strip(), 'buf = make_buffer(size)')
+        self.assertGreaterEqual(line.inclusive, 100000)
+        self.assertEqual(line.callees[0].filepath, __file__)
+
+        self.assertTrue(any(trace.filepath == __file__ for trace in result.related_traces))
+        self.assertEqual(MultiTraceResult.from_dict(result.to_dict()).to_dict(), result.to_dict())
+
+        with contextlib.redirect_stdout(None):
+            render_multi_text(result, related_traces_output_mode=RelatedTracesOutputMode.IN_DESCENDING_ORDER)
+
+    def test_module(self):
+        tracer = MultiTracer(sys.modules[__name__], nframe=1)
+        self.assertIn('make_buffer', tracer.qualnames)
+        self.assertIn('Service.load', tracer.qualnames)
+
+        with tracer:
+            buffers = [make_buffer(1000) for _ in range(10)]
+        result = tracer.result()
+        line = result['make_buffer'].target_lines[1]
+        self.assertGreaterEqual(line.size, 10000)
+        self.assertIsNone(line.inclusive)
+        self.assertEqual(len(buffers), 10)
+
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            MultiTracer(make_buffer)
+        tracer = MultiTracer(Service)
+        with self.assertRaises(RuntimeError):
+            tracer.result()
+        with self.assertRaises(RuntimeError):
+            tracer.stop()
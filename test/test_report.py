@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import contextlib
+from html.parser import HTMLParser
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.result import TraceResult, TargetLine, RelatedTrace
+from malloc_tracer.report import *
+from malloc_tracer.writers import *
+
+
+def make_result():
+    return TraceResult(
+        qualname='func',
+        filepath=__file__,
+        lineno=10,
+        target_lines=[
+            TargetLine(10, 'def func(x):'),
+            TargetLine(11, '    l = [x | 1 for x in "<&>"]', size=4096, count=4),
+            TargetLine(12, '    return `l`', size=1024, count=1),
+        ],
+        related_traces=[
+            RelatedTrace(__file__, 1, 512, 2),
+            RelatedTrace(__file__, 3, 2048, 1),
+        ],
+        total_size=8192,
+        total_count=8
+    )
+
+
+class CountingStream(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.num_writes = 0
+
+    def write(self, s):
+        self.num_writes += 1
+        return super().write(s)
+
+
+class TestWriters(TestCase):
+
+    def test_report_writer(self):
+        stream = CountingStream()
+        with ReportWriter(stream) as writer:
+            for index in range(1000):
+                print(index, file=writer)
+            self.assertEqual(stream.num_writes, 0)
+        self.assertEqual(stream.num_writes, 1)
+        self.assertEqual(stream.getvalue().splitlines()[-1], '999')
+
+        stream = CountingStream()
+        with ReportWriter(stream, buffer_size=10) as writer:
+            print('0123456789', file=writer)
+            self.assertEqual(stream.num_writes, 1)
+
+    def test_no_stdout(self):
+        with contextlib.redirect_stdout(None):
+            render_text(make_result())
+            render(make_result(), format='html')
+
+    def test_source_cache(self):
+        sources = SourceCache()
+        self.assertEqual(sources.getline(__file__, 1), '#!/usr/bin/env python3\n')
+        self.assertEqual(sources.getline(__file__, 100000), '')
+        self.assertEqual(sources.getline('<missing>', 1), '')
+        self.assertIs(sources.getlines(__file__), sources.getlines(__file__))
+
+
+class TestRenderers(TestCase):
+
+    def test_text(self):
+        stream = CountingStream()
+        render(
+            make_result(),
+            file=stream,
+            related_traces_output_mode=RelatedTracesOutputMode.FOR_EACH_FILE
+        )
+        self.assertEqual(stream.num_writes, 1)
+        self.assertIn('#!/usr/bin/env python3', stream.getvalue())
+
+    def test_markdown(self):
+        stream = io.StringIO()
+        render_markdown(
+            make_result(),
+            related_traces_output_mode=RelatedTracesOutputMode.IN_DESCENDING_ORDER,
+            file=stream
+        )
+        lines = stream.getvalue().splitlines()
+        self.assertIn('| 11 | 4.0 KiB | `     l = [x \\| 1 for x in "<&>"] ` |', lines)
+        self.assertIn('| 12 | 1.0 KiB | ``     return `l` `` |', lines)
+        self.assertIn('| **2** | **5.0 KiB** |  |', lines)
+        related = [line for line in lines if 'usr/bin/env' in line]
+        self.assertEqual(len(related), 1)
+        self.assertEqual(lines[-1], 'Total allocated size: 8.0 KiB (raw 8192 B)')
+
+    def test_html(self):
+        stream = io.StringIO()
+        render(
+            make_result(),
+            format='html',
+            file=stream,
+            related_traces_output_mode=RelatedTracesOutputMode.FOR_EACH_FILE
+        )
+        page = stream.getvalue()
+        self.assertTrue(page.startswith('<!DOCTYPE html>'))
+        self.assertIn('&quot;&lt;&amp;&gt;&quot;', page)
+        self.assertIn('rgba(255, 64, 0, 0.80)', page)
+        self.assertEqual(page.count('<table>'), 2)
+        HTMLParser().feed(page)
+
+    def test_register_renderer(self):
+        def render_qualname(result, file=None):
+            print(result.qualname, file=file)
+
+        register_renderer('qualname', render_qualname)
+        stream = io.StringIO()
+        render(make_result(), format='qualname', file=stream)
+        self.assertEqual(stream.getvalue(), 'func\n')
+
+        with self.assertRaises(ValueError):
+            render(make_result(), format='pdf')
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import csv
+import json
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.result import *
+from malloc_tracer.result import make_spread
+
+
+def make_result():
+    return TraceResult(
+        qualname='function',
+        filepath='/path/to/module.py',
+        lineno=10,
+        target_lines=[
+            TargetLine(10, 'def function(num):'),
+            TargetLine(11, '    l = list(range(num))', 1024, 2, 2048, 1024),
+            TargetLine(12, '    return l', None, None, 64, 0),
+        ],
+        related_traces=[
+            RelatedTrace('/path/to/other.py', 3, 512, 1),
+        ],
+        total_size=2048,
+        total_count=4
+    )
+
+
+class TestTraceResult(TestCase):
+
+    def test_properties(self):
+        result = make_result()
+        self.assertEqual(result.qualname, 'function')
+        self.assertEqual(result.target_size, 1024)
+        self.assertEqual(result.target_count, 2)
+        self.assertEqual(len(result.traced_lines), 1)
+        self.assertTrue(result.has_line_stats)
+        self.assertIsInstance(result.target_lines, tuple)
+        self.assertIsInstance(result.related_traces[0], RelatedTrace)
+
+    def test_immutable(self):
+        result = make_result()
+        with self.assertRaises(AttributeError):
+            result.total_size = 0
+        with self.assertRaises(AttributeError):
+            result.target_lines[1].size = 0
+
+    def test_json(self):
+        result = make_result()
+        self.assertEqual(TraceResult.from_json(result.to_json()), result)
+
+        stream = io.StringIO()
+        result.to_json(stream)
+        self.assertEqual(json.loads(stream.getvalue()), result.to_dict())
+
+    def test_json_with_callees(self):
+        result = TraceResult(
+            qualname='function',
+            filepath='/path/to/module.py',
+            lineno=10,
+            target_lines=[
+                TargetLine(10, 'def function(num):'),
+                TargetLine(11, '    l = make(num)', inclusive=1024, callees=[
+                    RelatedTrace('/path/to/other.py', 3, 1024, 2),
+                ]),
+            ],
+            related_traces=[],
+            total_size=1024,
+            total_count=2
+        )
+        self.assertTrue(result.has_inclusive)
+        other = TraceResult.from_json(result.to_json())
+        self.assertEqual(other, result)
+        self.assertIsInstance(other.target_lines[1].callees[0], RelatedTrace)
+
+    def test_from_runs(self):
+        results = list()
+        for size in (1024, 4096, 2048):
+            results.append(TraceResult(
+                qualname='function',
+                filepath='/path/to/module.py',
+                lineno=10,
+                target_lines=[
+                    TargetLine(10, 'def function(num):'),
+                    TargetLine(11, '    l = list(range(num))', size, 2),
+                    TargetLine(12, '    return l', 32, 1, None if size == 4096 else 64),
+                    TargetLine(13, '    # Not recorded.'),
+                ],
+                related_traces=[RelatedTrace('/path/to/other.py', 3, size // 2, 1)],
+                total_size=size + 32,
+                total_count=3
+            ))
+
+        result = TraceResult.from_runs(results)
+        self.assertEqual(result.num_runs, 3)
+        self.assertEqual(result.total_size, 2048 + 32)
+        self.assertEqual(result.target_lines[1].size, 2048)
+        self.assertEqual(result.target_lines[1].spread['size'], Spread(1024, 2048, 4096))
+        self.assertEqual(result.related_traces[0].size, 1024)
+        # The run which recorded nothing for the line has none of it.
+        self.assertEqual(result.target_lines[2].spread['peak'], Spread(0, 64, 64))
+        self.assertIsNone(result.target_lines[3].spread)
+        self.assertIsNone(make_spread([None, None]))
+        self.assertEqual(
+            [line.lineno for line in result.unstable_lines()],
+            [11, 12]
+        )
+        self.assertEqual(len(result.unstable_lines(tolerance=2.0)), 0)
+        self.assertEqual(TraceResult.from_json(result.to_json()), result)
+        self.assertIs(TraceResult.from_runs(results[:1]), results[0])
+
+    def test_from_runs_allocated_once(self):
+        results = list()
+        for index in range(3):
+            # The cache is filled by the first run only.
+            size = 100089 if index == 0 else None
+            results.append(TraceResult(
+                qualname='function',
+                filepath='/path/to/module.py',
+                lineno=10,
+                target_lines=[
+                    TargetLine(10, 'def function(num):'),
+                    TargetLine(11, '    CACHE.setdefault(num, bytearray(100000))', size, size and 2),
+                ],
+                related_traces=[],
+                total_size=size or 0,
+                total_count=size and 2 or 0
+            ))
+
+        result = TraceResult.from_runs(results)
+        line = result.target_lines[1]
+        self.assertEqual(line.size, 0)
+        self.assertEqual(line.count, 0)
+        self.assertEqual(line.spread['size'], Spread(0, 0, 100089))
+        self.assertIsNone(line.time)
+        self.assertNotIn('time', line.spread)
+        self.assertEqual([line.lineno for line in result.unstable_lines()], [11])
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in make_result().to_ndjson().splitlines()]
+        self.assertEqual(records[0]['kind'], 'result')
+        self.assertEqual(records[0]['total_size'], 2048)
+        self.assertEqual([record['kind'] for record in records[1:]], ['target'] * 3 + ['related'])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(make_result().to_csv())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1]['size'], '1024')
+        self.assertEqual(rows[1]['filepath'], '/path/to/module.py')
+        self.assertEqual(rows[3]['kind'], 'related')
+        self.assertEqual(rows[3]['contents'], '')
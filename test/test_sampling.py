@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import math as mathematics  # Avoid conflict with the tracer module.
+import tracemalloc
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.sampling import *
+from malloc_tracer.tracer import Tracer, TraceRecorder
+
+
+@sampling(every=2)
+def function(base, num):
+    l = [mathematics.pow(base, i) for i in range(num)]
+    return l
+
+
+@sampling(every=1, enable_line_probe=True, tracer_class=Tracer)
+def instrumented(num):
+    l = list(range(num))
+    return len(l)
+
+
+COUNTER = 0
+
+
+@sampling(every=2)
+def count():
+    global COUNTER
+    COUNTER += 1
+    return COUNTER
+
+
+class Klass(object):
+
+    @sampling(rate=1.0, enable_line_probe=True)
+    def method(self, num):
+        l = list(range(num))
+        return len(l)
+
+
+class TestSampling(TestCase):
+
+    def setUp(self):
+        function.sampler.profile.reset()
+        Klass.method.sampler.profile.reset()
+        instrumented.sampler.profile.reset()
+
+    def test_every(self):
+        for _ in range(5):
+            self.assertEqual(len(function(2, num=100)), 100)
+
+        sampler = function.sampler
+        self.assertEqual(sampler.profile.num_samples, 2)
+
+        result = sampler.dump()
+        self.assertEqual(result.qualname, 'function')
+        self.assertEqual(result.target_lines[0].contents, '@sampling(every=2)')
+        self.assertGreater(result.target_lines[2].size, 0)
+
+    def test_method_with_line_probe(self):
+        instance = Klass()
+        for _ in range(3):
+            self.assertEqual(instance.method(1000), 1000)
+
+        result = Klass.method.sampler.dump()
+        self.assertEqual(Klass.method.sampler.profile.num_samples, 3)
+        self.assertTrue(result.has_line_stats)
+        self.assertEqual(result.has_churn, hasattr(tracemalloc, 'reset_peak'))
+        self.assertEqual(result.target_lines[2].hits, 1)
+
+    def test_tracer(self):
+        for _ in range(2):
+            self.assertEqual(instrumented(1000), 1000)
+
+        result = instrumented.sampler.dump()
+        self.assertEqual(instrumented.sampler.profile.num_samples, 2)
+        self.assertTrue(result.target_lines[0].contents.startswith('@sampling('))
+        self.assertGreaterEqual(result.target_lines[2].size, 1000 * 8)
+        self.assertEqual(result.target_lines[2].hits, 1)
+
+    def test_globals(self):
+        # The sampled calls see and update the globals of the module.
+        global COUNTER
+        COUNTER = 0
+        self.assertEqual([count() for _ in range(6)], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(COUNTER, 6)
+        self.assertEqual(count.sampler.profile.num_samples, 3)
+
+    def test_not_sampled(self):
+        sampler = Sampler(function.__wrapped__, rate=0.0)
+        for _ in range(3):
+            if sampler.should_sample():
+                sampler.call((2, 10), dict())
+        self.assertIsNone(sampler.dump())
+
+    def test_interval(self):
+        sampler = Sampler(function.__wrapped__, interval=3600.0)
+        for _ in range(3):
+            if sampler.should_sample():
+                sampler.call((2, 10), dict())
+        self.assertEqual(sampler.profile.num_samples, 1)
+
+    def test_bounded_related_traces(self):
+        profile = SamplingProfile(max_related_traces=2)
+        for index in range(10):
+            recorder = TraceRecorder()
+            recorder.add_trace('file{}.py'.format(index), 1, index, 1)
+            profile.add(recorder, None, index, 1)
+        recorder, _, _, _ = profile.average()
+        self.assertLessEqual(len(recorder.list_all_related_trace()), 4)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Sampler(function.__wrapped__)
+        with self.assertRaises(ValueError):
+            Sampler(function.__wrapped__, rate=0.5, every=2)
+        with self.assertRaises(ValueError):
+            Sampler(function.__wrapped__, rate=2.0)
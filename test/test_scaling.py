@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import math
+import contextlib
+import tracemalloc
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.scaling import *
+from malloc_tracer.report import render_scaling_text
+
+
+def function(num):
+    buf = bytearray(1000)
+    l = [0] * num
+    m = [[0] * (num // 8) for _ in range(num // 8)]
+    return len(buf) + len(l) + len(m)
+
+
+class TestScaling(TestCase):
+
+    def test_geometric_sizes(self):
+        self.assertEqual(geometric_sizes(1, 16), [1, 2, 4, 8, 16])
+        self.assertEqual(geometric_sizes(10, 1000, 10), [10, 100, 1000])
+        with self.assertRaises(ValueError):
+            geometric_sizes(1, 16, 1)
+
+    def test_fit_growth(self):
+        sizes = geometric_sizes()
+        cases = (
+            (Complexity.CONSTANT, [1000 for n in sizes]),
+            (Complexity.CONSTANT, [1000 + 64 * (i % 2) for i, n in enumerate(sizes)]),
+            (Complexity.LINEAR, [8 * n + 56 for n in sizes]),
+            (Complexity.LINEARITHMIC, [int(40 * n * math.log(n)) + 500 for n in sizes]),
+            (Complexity.QUADRATIC, [n * n for n in sizes]),
+        )
+        for expected, values in cases:
+            complexity, _, _ = fit_growth(sizes, values)
+            self.assertEqual(complexity, expected)
+
+        with self.assertRaises(ValueError):
+            fit_growth([1, 2], [1, 2])
+
+    def test_scaling(self):
+        sizes = geometric_sizes(256, 2**13)
+        result = scaling(function, lambda n: dict(num=n), sizes)
+        self.assertEqual(len(result), len(sizes))
+
+        complexities = [line.complexity for line in result.lines[1:4]]
+        self.assertEqual(
+            complexities,
+            [Complexity.CONSTANT, Complexity.LINEAR, Complexity.QUADRATIC]
+        )
+        exceeding = result.exceeding(Complexity.LINEAR)
+        self.assertEqual([line.lineno for line in exceeding], [result.lines[3].lineno])
+        self.assertEqual(len(result.exceeding(Complexity.QUADRATIC)), 0)
+
+        other = ScalingResult.from_dict(result.to_dict())
+        self.assertEqual(other.lines, result.lines)
+
+        with contextlib.redirect_stdout(None):
+            render_scaling_text(result, expected=Complexity.LINEAR)
+
+    def test_probe_fields(self):
+        sizes = geometric_sizes(256, 2**12)
+        result = scaling(
+            function,
+            lambda n: dict(num=n),
+            sizes,
+            enable_line_probe=True,
+            field='peak'
+        )
+        self.assertEqual(result.field, 'peak')
+        self.assertEqual(result.lines[2].complexity, Complexity.LINEAR)
+
+        if not hasattr(tracemalloc, 'reset_peak'):
+            with self.assertRaises(ValueError):
+                scaling(
+                    function,
+                    lambda n: dict(num=n),
+                    sizes,
+                    enable_line_probe=True,
+                    field='churn'
+                )
+
+        with self.assertRaises(ValueError):
+            scaling(function, lambda n: dict(num=n), sizes, field='peak')
+        with self.assertRaises(ValueError):
+            scaling(function, lambda n: dict(num=n), sizes, field='inclusive')
+        with self.assertRaises(ValueError):
+            scaling(function, lambda n: dict(num=n), sizes, field='time')
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import contextlib
+import tracemalloc
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.tracer import Tracer
+from malloc_tracer.scaling import Complexity
+from malloc_tracer.stream import *
+from malloc_tracer.report import render_stream_text
+
+
+def streaming(num):
+    for _ in range(num):
+        row = bytearray(1000)
+        yield row
+
+
+def buffering(num):
+    rows = list()
+    for _ in range(num):
+        rows.append(bytearray(1000))
+        yield rows[-1]
+    return len(rows)
+
+
+class TestStream(TestCase):
+
+    def test_stream(self):
+        tracer = Tracer(streaming, enable_line_probe=True, nframe=5)
+        kept = list()
+        with TracedStream(tracer, target_args=dict(num=50)) as rows:
+            for row in rows:
+                self.assertEqual(len(row), 1000)
+                # The caller is charged what it keeps, not the generator.
+                kept.append(bytearray(5000))
+        stream_result = rows.result()
+
+        self.assertEqual(stream_result.num_items, 50)
+        self.assertEqual(stream_result.num_dropped, 0)
+        self.assertGreaterEqual(stream_result.items[-1].delta, 1000)
+        self.assertLess(stream_result.items[-1].delta, 1200)
+
+        first = streaming.__code__.co_firstlineno
+        lines = {line[0]: line for line in stream_result.lines()}
+        self.assertEqual(lines[first + 2][1], 50)
+        self.assertEqual(stream_result.contents(first + 2).strip(), 'row = bytearray(1000)')
+
+        # The traces of the caller are left out.
+        self.assertLess(stream_result.result.total_size, 5000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        result = StreamResult.from_json(stream_result.to_json())
+        self.assertEqual(result.items, stream_result.items)
+        self.assertEqual(len(result.to_csv().splitlines()), 51)
+        with contextlib.redirect_stdout(None):
+            render_stream_text(stream_result)
+
+    def test_growth(self):
+        growths = dict()
+        for function in (streaming, buffering):
+            with TracedStream(Tracer(function), target_args=dict(num=100)) as rows:
+                for _ in rows:
+                    pass
+            growths[function] = rows.result().growth()
+
+        self.assertEqual(growths[streaming][0], Complexity.CONSTANT)
+        complexity, _, slope = growths[buffering]
+        self.assertEqual(complexity, Complexity.LINEAR)
+        self.assertGreaterEqual(slope, 1000)
+        self.assertLess(slope, 1200)
+
+    def test_close(self):
+        tracer = Tracer(buffering, enable_line_probe=True)
+        rows = TracedStream(tracer, target_args=dict(num=1000), capacity=5)
+        for _, _ in zip(range(10), rows):
+            pass
+        stream_result = rows.result()
+        self.assertEqual(stream_result.num_items, 10)
+        self.assertEqual(len(stream_result), 5)
+        self.assertEqual(list(rows), [])
+        self.assertFalse(tracemalloc.is_tracing())
+
+        stream = io.StringIO()
+        render_stream_text(stream_result, num_items=3, file=stream)
+        self.assertIn('10 items (5 oldest dropped)', stream.getvalue())
+
+        rows = TracedStream(tracer, target_args=dict(num=10))
+        with self.assertRaises(ValueError):
+            rows.result()
+
+        with self.assertRaises(TypeError):
+            TracedStream(Tracer(render_stream_text))
+
+    def test_run(self):
+        # The call exhausts the generator.
+        tracer = Tracer(buffering)
+        ret, _ = tracer._call(kwargs=dict(num=10))
+        self.assertEqual(ret, 10)
+        result = tracer.run(target_args=dict(num=100))
+        self.assertGreaterEqual(result.target_size, 100 * 1000)
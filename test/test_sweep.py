@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import csv
+import contextlib
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.sweep import *
+from malloc_tracer.engine import HookTracer
+from malloc_tracer.report import render_sweep_text
+
+
+def function(num):
+    l = list(range(num))
+    return len(l)
+
+
+class TestSweep(TestCase):
+
+    def test_sweep(self):
+        configurations = [dict(num=num) for num in (10, 1000, 100000)]
+        result = sweep(function, configurations, max_workers=2)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(list(result.configurations), configurations)
+
+        rows = result.matrix()
+        self.assertEqual(len(rows), 3)
+        lineno, contents, values = rows[1]
+        self.assertEqual(contents, '    l = list(range(num))')
+        self.assertLess(values[0], values[1])
+        self.assertLess(values[1], values[2])
+
+        self.assertEqual(SweepResult.from_dict(result.to_dict()).matrix(), rows)
+
+        table = list(csv.reader(io.StringIO(result.to_csv())))
+        self.assertEqual(len(table), 4)
+        self.assertEqual(len(table[0]), 5)
+
+        with contextlib.redirect_stdout(None):
+            render_sweep_text(result)
+
+    def test_mismatch(self):
+        with self.assertRaises(ValueError):
+            SweepResult([dict()], [])
+
+    def test_hook_tracer(self):
+        configurations = [dict(num=num) for num in (10, 100000)]
+        result = sweep(function, configurations, max_workers=2, tracer_class=HookTracer)
+        lineno, contents, values = result.matrix()[1]
+        self.assertEqual(lineno, function.__code__.co_firstlineno + 1)
+        self.assertLess(values[0], values[1])
+        self.assertGreaterEqual(values[1], 100000 * 8)
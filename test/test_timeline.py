@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import json
+import time
+import contextlib
+from unittest import TestCase
+import sys
+sys.path.append('../')
+from malloc_tracer.tracer import Tracer
+from malloc_tracer.engine import HookTracer
+from malloc_tracer.timeline import *
+from malloc_tracer.report import render_timeline_text
+
+
+def function(num):
+    chunks = [bytearray(100000) for _ in range(num)]
+    time.sleep(0.05)
+    del chunks
+    time.sleep(0.05)
+    return num
+
+
+class TestTimeline(TestCase):
+
+    def test_timeline(self):
+        stream = io.StringIO()
+        timeline = Tracer(function).timeline(
+            target_args=dict(num=100),
+            interval=0.005,
+            file=stream
+        )
+        self.assertGreater(len(timeline), 2)
+        self.assertEqual(timeline.num_dropped, 0)
+        self.assertEqual(len(stream.getvalue().splitlines()), timeline.num_samples)
+        self.assertEqual(json.loads(stream.getvalue().splitlines()[0])['lineno'], timeline.samples[0].lineno)
+
+        samples = timeline.samples
+        self.assertEqual(list(samples), sorted(samples, key=lambda sample: sample.time))
+        first = function.__code__.co_firstlineno
+        by_line = {lineno: current for lineno, _, current in timeline.lines()}
+        self.assertGreaterEqual(by_line[first + 2], 100 * 100000)
+        self.assertLess(by_line[first + 4], 100000)
+
+        peak = timeline.peaks(1)[0]
+        self.assertEqual(peak.lineno, first + 2)
+        self.assertEqual(timeline.contents(peak.lineno).strip(), 'time.sleep(0.05)')
+
+        self.assertEqual(Timeline.from_json(timeline.to_json()).samples, samples)
+        self.assertEqual(len(timeline.to_csv().splitlines()), len(samples) + 1)
+        with contextlib.redirect_stdout(None):
+            render_timeline_text(timeline)
+
+    def test_hook_tracer(self):
+        timeline = HookTracer(function).timeline(target_args=dict(num=100), interval=0.005)
+        first = function.__code__.co_firstlineno
+        peak = timeline.peaks(1)[0]
+        self.assertEqual(peak.lineno, first + 2)
+        self.assertGreaterEqual(peak.current, 100 * 100000)
+        self.assertEqual(timeline.contents(peak.lineno).strip(), 'time.sleep(0.05)')
+
+    def test_ring_buffer(self):
+        timeline = Tracer(function).timeline(target_args=dict(num=1), interval=0.001, capacity=2)
+        self.assertEqual(len(timeline), 2)
+        self.assertGreater(timeline.num_dropped, 0)
+
+        with self.assertRaises(ValueError):
+            TimelineSampler(thread_id=0, filename='', interval=0)
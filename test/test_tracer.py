@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import math as mathematics  # Avoid conflict with the tracer module.
+import os
 import contextlib
-from unittest import TestCase
+import ctypes
+import importlib
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, skipUnless
 import sys
 sys.path.append('../')
 from malloc_tracer.tracer import *
+from malloc_tracer.tracer import INSTRUMENTATION_CACHE, DUMMY_SRC_NAME, make_filters
+from malloc_tracer.tracer import relabel_code
+from malloc_tracer.tracer import LineTimer, calibrate_line_timer
+from malloc_tracer.report import render_text
+from malloc_tracer.domains import register_domain
 
 
 def function(base, num):
@@ -17,6 +29,84 @@ def function2(base=mathematics.e):
     return mathematics.pow(base, 2)
 
 
+def function3(num):
+    l = [i for i in range(num)]
+    del l
+    for _ in range(2):
+        l = list(range(num))
+    return len(l)
+
+
+def function4(num):
+    l = make_list(num)
+    return len(l)
+
+
+def function5(num):
+    total = 0
+    for _ in range(num):
+        buf = bytearray(10000)
+        total += len(buf)
+    return total
+
+
+# Report a buffer of another allocator to tracemalloc, as NumPy does.
+FOREIGN_DOMAIN = 12345
+FOREIGN_ADDRESS = 0xdead0000
+
+
+def function_without_allocation(num):
+    x = 1
+    for _ in range(num):
+        y = x + 1
+    return y
+
+
+def function6(num, track_buffer):
+    l = list(range(num))
+    track_buffer(FOREIGN_DOMAIN, FOREIGN_ADDRESS, 4096)
+    return len(l)
+
+
+# Allocate memory which tracemalloc cannot see, as C extensions do.
+def function7(size, libc):
+    address = libc.malloc(size)
+    ctypes.memset(address, 1, size)
+    return address
+
+
+def make_list(num):
+    return list(range(num))
+
+
+BARRIER = threading.Barrier(2)
+
+
+def allocate(size):
+    BARRIER.wait()
+    buf = bytearray(size)
+    BARRIER.wait()
+    return len(buf)
+
+
+def make_buffer(size):
+    buf = bytearray(size)
+    return len(buf)
+
+
+def allocate_until(size, started, release):
+    buf = bytearray(size)
+    started.set()
+    release.wait(10)
+    return len(buf)
+
+
+def trace_nested(size, results):
+    buf = bytearray(size)
+    results.append(Tracer(make_buffer, enable_line_probe=True).run(target_args=dict(size=size)))
+    return len(buf)
+
+
 class Klass(object):
 
     CONSTANT = 10
@@ -300,3 +390,367 @@ class TestTracer(TestCase):
                 include_patterns={'*.py'},
                 exclude_patterns={'*/site-packages/*'}
             )
+
+    def test_line_probe(self):
+        tracer = Tracer(
+            function3,
+            enable_line_probe=True
+        )
+        with contextlib.redirect_stdout(None):
+            tracer.trace(
+                target_args=dict(num=10000),
+                related_traces_output_mode=RelatedTracesOutputMode.FOR_EACH_FILE
+            )
+
+        _, line_stats = tracer._take_snapshot(target_args=dict(num=10000))
+        peak, delta = line_stats[2]
+        self.assertGreater(peak, 0)
+        self.assertGreater(delta, 0)
+        peak, delta = line_stats[3]
+        self.assertLess(delta, 0)
+        self.assertNotIn(1, line_stats)
+        self.assertIn(5, line_stats)
+
+    def test_line_probe_overhead(self):
+        # The readings of the probe are not charged to the statements.
+        tracer = Tracer(function_without_allocation, enable_line_probe=True)
+        result = tracer.run(target_args=dict(num=100))
+        churn = 0 if hasattr(tracemalloc, 'reset_peak') else None
+        for index in (1, 4):
+            line = result.target_lines[index]
+            self.assertEqual((line.peak, line.delta, line.churn), (0, 0, churn), line.contents)
+        # The iterator of the loop is freed after the last execution of its body.
+        line = result.target_lines[3]
+        self.assertEqual((line.peak, line.churn, line.hits), (0, churn, 100))
+        self.assertFalse(any(
+            trace.filepath == Tracer.__init__.__code__.co_filename
+            for trace in result.related_traces
+        ))
+
+    @skipUnless(hasattr(tracemalloc, 'reset_peak'), 'The churn requires tracemalloc.reset_peak.')
+    def test_churn(self):
+        tracer = Tracer(function5, enable_line_probe=True)
+        result = tracer.run(target_args=dict(num=100))
+        self.assertTrue(result.has_churn)
+
+        line = result.target_lines[3]
+        self.assertEqual(line.contents.strip(), 'buf = bytearray(10000)')
+        self.assertEqual(line.hits, 100)
+        self.assertGreaterEqual(line.churn, 100 * 10000)
+        self.assertLess(line.size, 2 * 10000)
+        self.assertEqual(result.target_lines[1].hits, 1)
+        with contextlib.redirect_stdout(None):
+            render_text(result)
+
+        self.assertFalse(Tracer(function5).run(target_args=dict(num=1)).has_churn)
+
+    # The functions are public since Python 3.7.
+    @skipUnless(hasattr(ctypes.pythonapi, 'PyTraceMalloc_Track'), 'requires PyTraceMalloc_Track')
+    def test_domains(self):
+        track_buffer = ctypes.pythonapi.PyTraceMalloc_Track
+        track_buffer.argtypes = (ctypes.c_uint, ctypes.c_size_t, ctypes.c_size_t)
+        untrack_buffer = ctypes.pythonapi.PyTraceMalloc_Untrack
+        untrack_buffer.argtypes = (ctypes.c_uint, ctypes.c_size_t)
+
+        register_domain(FOREIGN_DOMAIN, 'Foreign')
+        tracer = Tracer(function6)
+        target_args = dict(num=1000, track_buffer=track_buffer)
+        try:
+            result = tracer.run(target_args=target_args)
+        finally:
+            untrack_buffer(FOREIGN_DOMAIN, FOREIGN_ADDRESS)
+        self.assertTrue(result.has_domains)
+        self.assertEqual(result.domain_names, ('Python', 'Foreign'))
+
+        lines = result.target_lines
+        self.assertEqual(lines[2].domains, {'Foreign': 4096})
+        self.assertEqual(lines[2].size, 4096)
+        self.assertEqual(lines[1].domains['Python'], lines[1].size)
+        self.assertNotIn('Foreign', lines[1].domains)
+        with contextlib.redirect_stdout(None):
+            render_text(result)
+
+        try:
+            result = tracer.run(target_args=target_args, exclude_domains={FOREIGN_DOMAIN})
+        finally:
+            untrack_buffer(FOREIGN_DOMAIN, FOREIGN_ADDRESS)
+        self.assertFalse(result.has_domains)
+        self.assertIsNone(result.target_lines[2].size)
+
+        try:
+            result = tracer.run(target_args=target_args, include_domains={FOREIGN_DOMAIN})
+        finally:
+            untrack_buffer(FOREIGN_DOMAIN, FOREIGN_ADDRESS)
+        self.assertIsNone(result.target_lines[1].size)
+        self.assertEqual(result.target_lines[2].size, 4096)
+
+        self.assertFalse(Tracer(function5).run(target_args=dict(num=1)).has_domains)
+
+    @skipUnless(os.path.exists('/proc/self/statm'), 'requires procfs')
+    def test_native_probe(self):
+        libc = ctypes.CDLL(None)
+        libc.malloc.restype = ctypes.c_void_p
+        libc.malloc.argtypes = (ctypes.c_size_t, )
+        libc.free.argtypes = (ctypes.c_void_p, )
+
+        size = 16 * 1024 * 1024
+        tracer = Tracer(function7, enable_native_probe=True)
+        address, capture = tracer._call(kwargs=dict(size=size, libc=libc))
+        libc.free(address)
+        self.assertIsNotNone(capture.line_stats)
+
+        recorder, total_size, total_count = tracer._record(capture)
+        result = tracer._make_result(
+            recorder=recorder,
+            line_stats=capture.line_stats,
+            total_size=total_size,
+            total_count=total_count,
+            line_native=capture.line_native
+        )
+        self.assertTrue(result.has_native)
+        self.assertTrue(result.has_line_stats)
+
+        lines = result.target_lines
+        self.assertEqual(lines[2].contents.strip(), 'ctypes.memset(address, 1, size)')
+        self.assertGreaterEqual(lines[2].native, size // 2)
+        self.assertLess(lines[2].delta, 1024)
+        self.assertIn(lines[2], result.untraced_lines())
+        with contextlib.redirect_stdout(None):
+            render_text(result)
+
+        self.assertFalse(Tracer(function5).run(target_args=dict(num=1)).has_native)
+        with self.assertRaises(ValueError):
+            Tracer(function5, enable_native_probe=True, native_metric='pss')
+
+    def test_line_timer(self):
+        tracer = Tracer(function5, enable_line_timer=True)
+        result = tracer.run(target_args=dict(num=10000))
+        self.assertTrue(result.has_time)
+        self.assertFalse(result.has_line_stats)
+
+        lines = result.target_lines
+        self.assertIsNone(lines[0].time)
+        self.assertGreater(lines[3].time, lines[1].time)
+        self.assertGreaterEqual(lines[3].size, 10000)
+        with contextlib.redirect_stdout(None):
+            render_text(result)
+
+        self.assertGreaterEqual(calibrate_line_timer(), 0)
+        timer = LineTimer(overhead=0)
+        timer.mark(1)
+        timer.mark(2)
+        timer.mark(1)
+        timer.end()
+        self.assertEqual(sorted(timer.line_times), [1, 2])
+
+    def test_line_probe_disabled(self):
+        tracer = Tracer(function3)
+        _, line_stats = tracer._take_snapshot(target_args=dict(num=10))
+        self.assertIsNone(line_stats)
+
+    def test_run(self):
+        tracer = Tracer(function3)
+        result = tracer.run(target_args=dict(num=10000))
+        self.assertEqual(result.qualname, 'function3')
+        self.assertEqual(result.lineno, function3.__code__.co_firstlineno)
+        self.assertEqual(len(result.target_lines), 6)
+        self.assertEqual(result.target_lines[0].contents, 'def function3(num):')
+        self.assertGreater(result.target_size, 0)
+        self.assertGreaterEqual(result.total_size, result.target_size)
+        self.assertFalse(result.has_line_stats)
+        with contextlib.redirect_stdout(None):
+            render_text(result, related_traces_output_mode=RelatedTracesOutputMode.FOR_EACH_FILE)
+
+    def test_inclusive(self):
+        tracer = Tracer(function4, nframe=5)
+        result = tracer.run(target_args=dict(num=10000))
+        self.assertTrue(result.has_inclusive)
+
+        line = result.target_lines[1]
+        self.assertEqual(line.contents.strip(), 'l = make_list(num)')
+        self.assertIsNone(line.size)
+        self.assertGreater(line.inclusive, 10000)
+        callee = line.callees[0]
+        self.assertEqual(callee.filepath, __file__)
+        self.assertEqual(callee.lineno, make_list.__code__.co_firstlineno + 1)
+        self.assertGreaterEqual(callee.size, 10000 * 8)
+        # On Python 3.12+, once sys.monitoring was used, as by the hook engine,
+        # the interpreter allocates the monitoring data of a code object when
+        # it is first called, which is charged to the line of its definition.
+        self.assertEqual(sum(callee.size for callee in line.callees), line.inclusive)
+        self.assertLessEqual(len(line.callees), 2)
+        with contextlib.redirect_stdout(None):
+            render_text(result)
+
+        result = Tracer(function4).run(target_args=dict(num=10000))
+        self.assertFalse(result.has_inclusive)
+
+    def test_repeat(self):
+        tracer = Tracer(function3, enable_line_probe=True)
+        result = tracer.run(target_args=dict(num=10000), repeat=3, warmup=1)
+        self.assertEqual(result.num_runs, 3)
+
+        line = result.target_lines[4]
+        spread = line.spread['size']
+        self.assertLessEqual(spread.min, spread.median)
+        self.assertLessEqual(spread.median, spread.max)
+        self.assertEqual(line.size, spread.median)
+        self.assertIn('peak', line.spread)
+        self.assertIsNone(result.target_lines[0].spread)
+        with contextlib.redirect_stdout(None):
+            render_text(result)
+
+        self.assertIsNone(tracer.run(target_args=dict(num=10)).target_lines[4].spread)
+        with self.assertRaises(ValueError):
+            tracer.run(target_args=dict(num=10), repeat=0)
+
+    def test_instrumentation_cache(self):
+        INSTRUMENTATION_CACHE.clear()
+        Tracer(function)
+        Tracer(function)
+        Tracer(function, enable_line_probe=True)
+        info = INSTRUMENTATION_CACHE.info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.currsize, 2)
+
+        INSTRUMENTATION_CACHE.maxsize = 1
+        self.assertEqual(len(INSTRUMENTATION_CACHE), 1)
+        INSTRUMENTATION_CACHE.maxsize = 128
+
+    def test_instrumentation_cache_invalidation(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            filepath = os.path.join(dirpath, 'cached_module.py')
+            with open(filepath, 'w') as f:
+                f.write('def target():\n    return [0] * 10\n')
+
+            sys.path.insert(0, dirpath)
+            try:
+                module = importlib.import_module('cached_module')
+            finally:
+                sys.path.remove(dirpath)
+                sys.modules.pop('cached_module', None)
+
+            tracer = Tracer(module.target)
+            self.assertEqual(tracer._source_lines[1], '    return [0] * 10\n')
+
+            with open(filepath, 'w') as f:
+                f.write('def target():\n    return [1] * 10\n')
+            mtime = os.stat(filepath).st_mtime + 10
+            os.utime(filepath, (mtime, mtime))
+
+            tracer = Tracer(module.target)
+            self.assertEqual(tracer._source_lines[1], '    return [1] * 10\n')
+
+    def test_filters(self):
+        include_filter, exclude_filter = make_filters(
+            include_patterns={'*.py', '*.pyx'},
+            exclude_patterns={'*/site-packages/*'}
+        )
+        self.assertTrue(include_filter._match_frame('/path/to/module.py', 1))
+        self.assertFalse(include_filter._match_frame('/path/to/module.c', 1))
+        self.assertTrue(include_filter._match_frame(DUMMY_SRC_NAME, 1))
+        self.assertFalse(exclude_filter._match_frame('/lib/site-packages/module.py', 1))
+        self.assertTrue(exclude_filter._match_frame('/path/to/module.py', 1))
+        self.assertTrue(exclude_filter._match_frame(DUMMY_SRC_NAME, 1))
+        self.assertEqual(make_filters(), [])
+
+    def test_run_with_patterns(self):
+        tracer = Tracer(function3)
+        result = tracer.run(
+            target_args=dict(num=10000),
+            include_patterns={'*/no/such/dir/*'}
+        )
+        self.assertEqual(result.related_traces, ())
+        self.assertGreater(result.target_size, 0)
+        self.assertGreaterEqual(result.total_size, result.target_size)
+
+    def test_relabel_code(self):
+        code = compile('def f():\n    return [i for i in range(3)]\n', DUMMY_SRC_NAME, 'exec')
+        relabeled = relabel_code(code, '<tracer-src-0>')
+        self.assertEqual(relabeled.co_filename, '<tracer-src-0>')
+        nested = [const for const in relabeled.co_consts if hasattr(const, 'co_filename')]
+        self.assertEqual([const.co_filename for const in nested], ['<tracer-src-0>'])
+        namespace = dict()
+        exec(relabeled, namespace)
+        self.assertEqual(namespace['f'](), [0, 1, 2])
+
+    def test_concurrent_tracers(self):
+        sizes = (10000, 100000)
+        tracers = [Tracer(allocate) for _ in sizes]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(tracer.run, target_args=dict(size=size))
+                for tracer, size in zip(tracers, sizes)
+            ]
+            results = [future.result(timeout=10) for future in futures]
+
+        for result, size in zip(results, sizes):
+            line = result.target_lines[2]
+            self.assertEqual(line.contents.strip(), 'buf = bytearray(size)')
+            self.assertGreaterEqual(line.size, size)
+            self.assertLess(line.size, size + 1024)
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertNotIn('SNAPSHOT', sys.modules['malloc_tracer.tracer'].__dict__)
+
+    def test_shared_tracer(self):
+        # A call of a shared tracer would be charged the allocations of the other one.
+        tracer = Tracer(allocate_until, nframe=5)
+        started, release = threading.Event(), threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                tracer.run,
+                target_args=dict(size=1000000, started=started, release=release)
+            )
+            try:
+                self.assertTrue(started.wait(10))
+                with self.assertRaises(RuntimeError):
+                    tracer.run(target_args=dict(size=1000, started=threading.Event(), release=release))
+            finally:
+                release.set()
+            result = future.result(timeout=10)
+
+        self.assertGreaterEqual(result.target_lines[1].size, 1000000)
+        # The tracer traces again once the call returned.
+        result = tracer.run(target_args=dict(size=1000, started=started, release=release))
+        self.assertGreaterEqual(result.target_lines[1].size, 1000)
+        self.assertLess(result.target_lines[1].size, 2000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_outer_session(self):
+        # The application traces memory before the call.
+        tracemalloc.start()
+        try:
+            kept = [bytearray(1000) for _ in range(1000)]
+            current, peak = tracemalloc.get_traced_memory()
+
+            tracer = Tracer(make_buffer, enable_line_probe=True)
+            result = tracer.run(target_args=dict(size=10000))
+            line = result.target_lines[1]
+            self.assertGreaterEqual(line.size, 10000)
+            self.assertGreaterEqual(line.peak, 10000)
+            # The peak of the application is not reset, so the churn is not recorded.
+            self.assertFalse(result.has_churn)
+            self.assertEqual(line.hits, 1)
+            # The traces of the application are left out, but left alone.
+            self.assertLess(result.total_size, 100000)
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertGreaterEqual(tracemalloc.get_traced_memory()[1], peak)
+            self.assertGreaterEqual(tracemalloc.get_traced_memory()[0], len(kept) * 1000)
+        finally:
+            tracemalloc.stop()
+
+    def test_nested_tracers(self):
+        results = list()
+        tracer = Tracer(trace_nested, enable_line_probe=True, nframe=5)
+        outer = tracer.run(target_args=dict(size=100000, results=results))
+        inner = results[0]
+
+        self.assertGreaterEqual(inner.target_lines[1].size, 100000)
+        self.assertGreaterEqual(inner.target_lines[1].peak, 100000)
+        # The buffer of the outer call is not charged to the inner one.
+        self.assertLess(inner.total_size, 200000)
+        self.assertGreaterEqual(outer.target_lines[1].size, 100000)
+        self.assertGreaterEqual(outer.target_lines[2].peak, 100000)
+        self.assertFalse(tracemalloc.is_tracing())